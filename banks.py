@@ -0,0 +1,81 @@
+import string
+
+
+LOADING = "loading"
+READY = "ready"
+RUNNING = "running"
+DONE = "done"
+
+
+class Bank:
+    """A group of fixture slots that is loaded, flashed and unloaded together"""
+
+    def __init__(self, name, slots):
+        self.name = name
+        self.slots = list(slots)
+        self.state = LOADING
+        self.tasks = []
+        self.passed = 0
+        self.failed = 0
+
+    @property
+    def label(self):
+        return f"Bank {self.name} (slots {self.slots[0]}-{self.slots[-1]})"
+
+
+class BankScheduler:
+    """
+    Splits the fixture slots into banks. While one bank is flashed, the
+    operator reloads another and marks it ready. The moment the running
+    bank is done, the next ready bank starts, so the fixture never idles.
+    """
+
+    def __init__(self, slot_count=8, bank_count=2):
+        per_bank = -(-slot_count // bank_count)
+        self.banks = [
+            Bank(string.ascii_uppercase[i], range(i * per_bank + 1, min((i + 1) * per_bank, slot_count) + 1))
+            for i in range(bank_count)
+        ]
+        self.ready_order = []  # banks marked ready, first in first out
+        self.running = None
+
+    def mark_ready(self, bank, tasks):
+        bank.tasks = list(tasks)
+        bank.passed = bank.failed = 0
+        bank.state = READY
+        self.ready_order.append(bank)
+
+    def record(self, slot, success):
+        bank = self.running
+        if bank is None or slot not in bank.slots:
+            return
+        if success:
+            bank.passed += 1
+        else:
+            bank.failed += 1
+
+    def finish_running(self):
+        """The running bank has no jobs left, returns it (or None)"""
+        bank = self.running
+        if bank is not None:
+            bank.state = DONE
+            self.running = None
+        return bank
+
+    def start_next(self):
+        """Next ready bank as the running one, returns its tasks ([] if none is ready)"""
+        if self.running is not None or not self.ready_order:
+            return []
+        bank = self.ready_order.pop(0)
+        bank.state = RUNNING
+        self.running = bank
+        return bank.tasks
+
+    def cancel(self):
+        """Stop batch: the running and ready banks go back to loading, returns them"""
+        banks = [bank for bank in [self.running] + self.ready_order if bank is not None]
+        for bank in banks:
+            bank.state = LOADING
+        self.running = None
+        self.ready_order = []
+        return banks
@@ -0,0 +1,154 @@
+import argparse
+import subprocess
+import threading
+import time
+
+from cancellation import CancelToken, Cancelled
+from fixture import program_bootloader, program_bootloaders
+
+
+# How a batch walks through its DUTs
+DUT_MAJOR = "dut"  # each DUT end to end, its bootloader right before its web stage
+STAGE_MAJOR = "stage"  # bootloaders of every slot back to back, then the web stages
+OVERLAP = "overlap"  # DUT by DUT, the next slot is programmed during the web stage and reboot wait of the current one
+BATCH_ORDERS = (DUT_MAJOR, STAGE_MAJOR, OVERLAP)
+
+
+def same_mux(fixture, slot, other):
+    """True when both slots are routed by the same physical mux"""
+    return fixture.port_for(slot).port is fixture.port_for(other).port
+
+
+def interleave(fixture, items, key=lambda item: item):
+    """Items (slots, or tasks with key giving their slot) round-robin over the muxes: 1, 5, 2, 6, ..."""
+    columns = []
+    for item in items:
+        column = next((column for column in columns if same_mux(fixture, key(column[0]), key(item))), None)
+        if column is None:
+            columns.append([item])
+        else:
+            column.append(item)
+    ordered = []
+    while any(columns):
+        for column in columns:
+            if column:
+                ordered.append(column.pop(0))
+    return ordered
+
+
+def overlap_slot(fixture, slot, queued):
+    """
+    Slot to program while slot is in its web stage, or None. Selecting an
+    SWD channel powers off every DUT of that mux, so only the next queued
+    slot qualifies, and only when it is on another mux.
+    """
+    if queued and not same_mux(fixture, slot, queued[0]):
+        return queued[0]
+    return None
+
+
+def failed_result(error):
+    """CompletedProcess for a programming run that raised, the web stage reports it as a bootloader failure"""
+    return subprocess.CompletedProcess("flash.bat", 1, "", str(error))
+
+
+def run_batch(order, fixture, slots, program_for, web_stage, cancel_token=None, settle=1.0):
+    """
+    Reference scheduler of the batch orders, the GUI runs the same orders on its worker pool.
+    program_for(group) returns program(cancel_token) of the group's probe,
+    web_stage(slot, bootloader_result) runs the rest of the DUT.
+    Returns {slot: web_stage result or exception}.
+    """
+    cancel_token = cancel_token or CancelToken()
+    results = {}
+
+    def program(slot):
+        group = fixture.group_for(slot)
+        try:
+            return program_bootloader(group.port, slot, program_for(group), cancel_token, settle)
+        except Cancelled:
+            raise
+        except Exception as e:
+            return failed_result(e)
+
+    def web(slot, bootloader_result):
+        try:
+            results[slot] = web_stage(slot, bootloader_result)
+        except Exception as e:
+            results[slot] = e
+
+    if order == STAGE_MAJOR:
+        bootloaders = program_bootloaders(fixture, slots, program_for, cancel_token, settle=settle)
+        for slot in slots:
+            cancel_token.check()
+            result = bootloaders.get(slot)
+            web(slot, result if not isinstance(result, Exception) else failed_result(result))
+        return results
+
+    if order == OVERLAP:
+        slots = interleave(fixture, slots)
+    ahead = {}  # slot -> (thread, [result]) programmed during the previous web stage
+    for index, slot in enumerate(slots):
+        cancel_token.check()
+        if slot in ahead:
+            thread, holder = ahead.pop(slot)
+            thread.join()
+            result = holder[0] if holder else failed_result("cancelled")
+        else:
+            result = program(slot)
+        following = overlap_slot(fixture, slot, slots[index + 1:]) if order == OVERLAP else None
+        if following is not None:
+            holder = []
+            thread = threading.Thread(target=lambda s=following, h=holder: h.append(program(s)), daemon=True)
+            thread.start()
+            ahead[following] = (thread, holder)
+        web(slot, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the batch orders on the simulator")
+    parser.add_argument("--duts", type=int, default=8, help="DUTs per batch, one per slot")
+    parser.add_argument("--muxes", type=int, default=1, help="split the slots over this many muxes/probes")
+    parser.add_argument("--latency", type=float, default=0.3, help="scale factor for all simulated latencies")
+    parser.add_argument("--settle", type=float, default=0.05, help="mux settle delay of the scheduler in seconds")
+    parser.add_argument("--orders", default=",".join(BATCH_ORDERS), help="comma separated orders to run")
+    args = parser.parse_args()
+
+    from fixture import Fixture, FixtureGroup
+    from mux import MuxPort
+    from simulator import Simulator, automate_device_without_browser
+
+    timings = {}
+    for order in [item.strip() for item in args.orders.split(",") if item.strip()]:
+        simulator = Simulator(slot_count=args.duts, latency_scale=args.latency, mux_count=args.muxes)
+        specs = simulator.fixture_groups() or [{"name": "mux", "mux_port": simulator.mux.port, "probe": "",
+                                                "slots": list(range(1, args.duts + 1))}]
+        muxes = {mux.port: MuxPort(mux) for mux in simulator.muxes}
+        fixture = Fixture([FixtureGroup(spec["name"], muxes[spec["mux_port"]], spec["slots"], spec["probe"])
+                           for spec in specs])
+
+        def program_for(group, simulator=simulator):
+            programmer = simulator.programmer_for(group.probe)
+            return lambda cancel_token: programmer("sim_bootloader.bin", cancel_token)
+
+        def web_stage(slot, bootloader_result, simulator=simulator, fixture=fixture):
+            return automate_device_without_browser(
+                f"BENCH{slot:04d}", "sim_bootloader.bin", lambda ok: None, lambda ok: None,
+                fixture.port_for(slot), slot, simulator.programmer_for(fixture.probe_for(slot)),
+                device_ip=simulator.device.host, device_port=simulator.device.port,
+                bootloader_result=bootloader_result)
+
+        started = time.monotonic()
+        results = run_batch(order, fixture, list(range(1, args.duts + 1)), program_for, web_stage,
+                            settle=args.settle)
+        elapsed = time.monotonic() - started
+        failed = [slot for slot, result in results.items() if isinstance(result, Exception)]
+        timings[order] = elapsed
+        print(f"{order:8} {elapsed:7.2f} s  {elapsed / args.duts:5.2f} s/DUT  "
+              f"{len(results) - len(failed)} passed, {len(failed)} failed"
+              + (f"  x{timings[DUT_MAJOR] / elapsed:.2f} vs {DUT_MAJOR}" if DUT_MAJOR in timings else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+import shutil
+import time
+
+
+# Root folder that holds one Chrome profile per device UI version
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_cache")
+
+# Storage that must not leak from one DUT to the next (login session etc.)
+# The HTTP cache is left alone so the SPA bundle is reused, reads of
+# per-device data go through no_cache_url() instead.
+SESSION_STORAGE_TYPES = "cookies,local_storage,session_storage,indexeddb,websql"
+
+
+def firmware_key(*paths):
+    """
+    Build a cache key from the content of the given files (bootloader, firmware).
+    Same files -> same key, so the device UI cache is reused.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if not path:
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def profile_dir_for(version_key, root=CACHE_ROOT):
+    """
+    Return the Chrome user-data-dir for this device UI version.
+    Profiles for other versions are deleted so the cache is invalidated
+    whenever the firmware changes.
+    """
+    safe_key = re.sub(r"[^A-Za-z0-9._-]", "_", str(version_key)) or "default"
+    os.makedirs(root, exist_ok=True)
+
+    for name in os.listdir(root):
+        if name != safe_key:
+            print(f"Removing stale browser cache: {name}")
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    profile_dir = os.path.join(root, safe_key)
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def add_cache_arguments(options, profile_dir):
+    """Point Chrome at the shared profile so static assets come from disk cache"""
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    options.add_argument("--disk-cache-size=104857600")
+    options.add_argument("--no-first-run")
+    options.add_argument("--no-default-browser-check")
+
+
+def no_cache_url(url):
+    """
+    url with a unique query, so the shared HTTP cache cannot answer it.
+    Every DUT is at the same IP, a cached config.json would be the previous DUT's.
+    """
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}_={time.time_ns()}"
+
+
+def clear_device_session(driver, origin="http://192.168.0.100"):
+    """Drop cookies/local storage of the previous DUT but keep the HTTP cache"""
+    try:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+            "origin": origin,
+            "storageTypes": SESSION_STORAGE_TYPES,
+        })
+    except Exception as e:
+        print(f"Failed to clear device session: {e}")
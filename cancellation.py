@@ -0,0 +1,169 @@
+import os
+import subprocess
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised inside a DUT job once its cancellation token fired"""
+
+
+class BudgetExceeded(Exception):
+    """Raised when a DUT job ran out of its Deadline"""
+
+    def __init__(self, stage, budget):
+        super().__init__(f"Budget of {budget:.0f} s exceeded at stage {stage}")
+        self.stage = stage
+        self.budget = budget
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for one DUT job.
+    Waits use token.sleep(), blocking resources (browser, subprocess)
+    register a callback that tears them down when cancel() is called.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled("Cancelled by operator")
+
+    def sleep(self, seconds):
+        """time.sleep() that returns early with Cancelled"""
+        if self._event.wait(max(0, seconds)):
+            raise Cancelled("Cancelled by operator")
+
+    def on_cancel(self, callback):
+        """Run callback on cancel (immediately if already cancelled)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class Deadline:
+    """
+    Time budget of one DUT job, shared by all its stages.
+    Every wait is capped with cap(), and when the budget runs out the
+    token is cancelled so blocking calls (browser, subprocess) are torn down.
+    """
+
+    def __init__(self, budget, token):
+        self.budget = budget
+        self.token = token
+        self.stage = "start"
+        self.expired = False
+        self.expires = time.monotonic() + budget
+        self._timer = threading.Timer(budget, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        self.expired = True
+        self.token.cancel()
+
+    def enter(self, stage):
+        """Mark the start of a stage, returns its start time"""
+        self.check()
+        self.stage = stage
+        return time.monotonic()
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def is_over(self):
+        """True once the budget is used up, even if the timer has not fired yet"""
+        return self.expired or self.remaining() <= 0
+
+    def check(self):
+        if self.is_over():
+            raise BudgetExceeded(self.stage, self.budget)
+
+    def cap(self, timeout):
+        """timeout, but no longer than what is left of the budget"""
+        self.check()
+        return min(timeout, self.remaining())
+
+    def exceeded(self):
+        """BudgetExceeded for the current stage, to re-raise a failure caused by the deadline"""
+        return BudgetExceeded(self.stage, self.budget)
+
+    def stop(self):
+        self._timer.cancel()
+
+
+def kill_process_tree(process):
+    """Kill a Popen and everything it started (cmd.exe -> ST-LINK_CLI.exe)"""
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+            capture_output=True,
+        )
+    else:
+        process.kill()
+
+
+def run_cancellable(command, token, poll_interval=0.2, timeout=None, **kwargs):
+    """
+    subprocess.run(command, capture_output=True, text=True) that is killed
+    as soon as the token is cancelled, or after timeout seconds
+    (subprocess.TimeoutExpired).
+    """
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        **kwargs
+    )
+    kill = lambda: kill_process_tree(process)
+    token.on_cancel(kill)
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                if token.is_cancelled():
+                    kill_process_tree(process)
+                    process.communicate()
+                    raise Cancelled("Cancelled by operator")
+                if timeout is not None and time.monotonic() - started > timeout:
+                    kill_process_tree(process)
+                    stdout, stderr = process.communicate()
+                    raise subprocess.TimeoutExpired(command, timeout, stdout, stderr)
+    finally:
+        token.remove_callback(kill)
+
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
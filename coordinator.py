@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Coordinator:
+    """
+    Global work queue for several line PCs.
+    Stations lease DUT jobs, the lease size follows each station's measured throughput.
+    A lease belongs to one station, which renews it while it works on the jobs.
+    Leases that are not renewed for lease_timeout seconds go back to the queue.
+    """
+
+    def __init__(self, jobs, artifacts=None, lease_timeout=600):
+        self.lock = threading.Lock()
+        self.pending = list(jobs)
+        self.leased = {}  # job_id -> (station_id, job, lease time)
+        self.results = []
+        self.stations = {}  # station_id -> stats
+        self.lease_timeout = lease_timeout
+        self.artifacts = {}  # name -> (path, sha256)
+        for path in artifacts or []:
+            self.add_artifact(path)
+
+    def add_artifact(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.artifacts[os.path.basename(path)] = (path, digest.hexdigest())
+
+    def _station(self, station_id):
+        """Stats of a station, created on first contact (call with the lock held)"""
+        return self.stations.setdefault(station_id, {
+            "done": 0,
+            "failed": 0,
+            "avg_cycle": None,  # seconds per DUT, exponential moving average
+            "last_seen": time.time(),
+        })
+
+    def register(self, station_id):
+        with self.lock:
+            self._station(station_id)
+        return {"ok": True, "artifacts": {name: sha for name, (_, sha) in self.artifacts.items()},
+                "lease_timeout": self.lease_timeout}
+
+    def _requeue_expired(self):
+        now = time.time()
+        for job_id, (station_id, job, leased_at) in list(self.leased.items()):
+            if now - leased_at > self.lease_timeout:
+                print(f"Lease of job {job_id} by {station_id} expired, re-queued")
+                del self.leased[job_id]
+                self.pending.insert(0, job)
+
+    def _lease_size(self, station_id, max_jobs):
+        """Share of the remaining queue proportional to the station's throughput"""
+        rates = {}
+        for sid, stats in self.stations.items():
+            if time.time() - stats["last_seen"] > self.lease_timeout:
+                continue
+            rates[sid] = 1.0 / stats["avg_cycle"] if stats["avg_cycle"] else None
+
+        known = [rate for rate in rates.values() if rate]
+        default_rate = sum(known) / len(known) if known else 1.0
+        total_rate = sum(rate or default_rate for rate in rates.values())
+        share = (rates.get(station_id) or default_rate) / total_rate
+        return max(1, min(max_jobs, math.ceil(len(self.pending) * share)))
+
+    def lease(self, station_id, max_jobs):
+        with self.lock:
+            self._station(station_id)["last_seen"] = time.time()
+            self._requeue_expired()
+
+            if not self.pending:
+                return {"jobs": [], "done": not self.leased}
+
+            count = self._lease_size(station_id, max_jobs)
+            jobs, self.pending = self.pending[:count], self.pending[count:]
+            for job in jobs:
+                self.leased[job["job_id"]] = (station_id, job, time.time())
+            return {"jobs": jobs, "done": False}
+
+    def renew(self, station_id, job_ids):
+        """Extend the station's leases of job_ids, returns the ones it no longer holds"""
+        with self.lock:
+            self._station(station_id)["last_seen"] = time.time()
+            lost = []
+            for job_id in job_ids:
+                lease = self.leased.get(job_id)
+                if lease is None or lease[0] != station_id:
+                    lost.append(job_id)
+                else:
+                    self.leased[job_id] = (station_id, lease[1], time.time())
+            return {"ok": not lost, "lost": lost}
+
+    def _take_lease(self, station_id, job_id):
+        """
+        Job of a result from station_id, or an error message. A late report of an
+        expired lease is accepted while the job waits in the queue again, the
+        serial number is used up either way. (call with the lock held)
+        """
+        lease = self.leased.get(job_id)
+        if lease is not None:
+            if lease[0] != station_id:
+                return None, f"job {job_id} is leased by {lease[0]}"
+            del self.leased[job_id]
+            return lease[1], None
+        for index, job in enumerate(self.pending):
+            if job["job_id"] == job_id:
+                print(f"Late result of job {job_id} from {station_id}, taken out of the queue again")
+                return self.pending.pop(index), None
+        return None, f"job {job_id} is not leased"
+
+    def report(self, station_id, job_id, success, message="", duration=None):
+        with self.lock:
+            previous = next((r for r in self.results if r["job_id"] == job_id), None)
+            if previous is not None:
+                if previous["station_id"] == station_id:
+                    # Retried report whose answer was lost
+                    return {"ok": True, "duplicate": True}
+                return {"ok": False, "error": f"job {job_id} was already reported by {previous['station_id']}"}
+            job, error = self._take_lease(station_id, job_id)
+            if job is None:
+                return {"ok": False, "error": error}
+
+            stats = self._station(station_id)
+            stats["last_seen"] = time.time()
+            stats["done" if success else "failed"] += 1
+            if duration:
+                previous = stats["avg_cycle"]
+                stats["avg_cycle"] = duration if previous is None else 0.8 * previous + 0.2 * duration
+
+            self.results.append({
+                "job_id": job_id,
+                "station_id": station_id,
+                "serial_number": job.get("serial_number"),
+                "success": success,
+                "message": message,
+                "duration": duration,
+                "finished_at": time.time(),
+            })
+        return {"ok": True}
+
+    def status(self):
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "leased": len(self.leased),
+                "finished": len(self.results),
+                "failed": sum(1 for r in self.results if not r["success"]),
+                "stations": {sid: dict(stats) for sid, stats in self.stations.items()},
+            }
+
+
+def build_jobs(serial_prefix, serial_start, count, host_id_low=None, slots=8,
+               bootloader=None, firmware=None, firmware_version=None, serial_digits=6):
+    """One job per DUT, serial numbers and host ids assigned from contiguous ranges"""
+    jobs = []
+    for i in range(count):
+        jobs.append({
+            "job_id": i + 1,
+            "serial_number": f"{serial_prefix}{serial_start + i:0{serial_digits}d}",
+            "host_id": host_id_low + i if host_id_low is not None else None,
+            "slot_hint": (i % slots) + 1,
+            "bootloader": os.path.basename(bootloader) if bootloader else None,
+            "firmware": os.path.basename(firmware) if firmware else None,
+            "firmware_version": firmware_version,
+        })
+    return jobs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    coordinator = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._send_json(self.coordinator.status())
+        elif self.path.startswith("/artifact/"):
+            name = self.path[len("/artifact/"):]
+            if name not in self.coordinator.artifacts:
+                self._send_json({"error": "unknown artifact"}, 404)
+                return
+            path, sha = self.coordinator.artifacts[name]
+            with open(path, "rb") as f:
+                data = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-SHA256", sha)
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+        except ValueError:
+            self._send_json({"error": "invalid json"}, 400)
+            return
+
+        if self.path == "/register":
+            self._send_json(self.coordinator.register(request["station_id"]))
+        elif self.path == "/lease":
+            self._send_json(self.coordinator.lease(request["station_id"], int(request.get("max_jobs", 8))))
+        elif self.path == "/renew":
+            self._send_json(self.coordinator.renew(request["station_id"], list(request.get("job_ids", []))))
+        elif self.path == "/result":
+            self._send_json(self.coordinator.report(
+                request["station_id"],
+                request["job_id"],
+                bool(request.get("success")),
+                request.get("message", ""),
+                request.get("duration"),
+            ))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+
+def start_server(coordinator, host="127.0.0.1", port=8765):
+    """Serve the coordinator on a background thread, returns the server"""
+    handler = type("CoordinatorHandler", (_Handler,), {"coordinator": coordinator})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Coordinator listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distribute DUT jobs across station PCs")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="interface to listen on, 0.0.0.0 serves stations on other PCs (no authentication)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serial-prefix", default="SN")
+    parser.add_argument("--serial-start", type=int, default=1)
+    parser.add_argument("--count", type=int, default=40)
+    parser.add_argument("--host-id-low", type=int)
+    parser.add_argument("--bootloader")
+    parser.add_argument("--firmware")
+    parser.add_argument("--firmware-version")
+    parser.add_argument("--lease-timeout", type=float, default=600,
+                        help="seconds without renewal after which a leased job goes back to the queue")
+    parser.add_argument("--simulate", type=int, default=0, metavar="N",
+                        help="run N simulated stations on localhost")
+    args = parser.parse_args()
+
+    jobs = build_jobs(args.serial_prefix, args.serial_start, args.count, args.host_id_low,
+                      bootloader=args.bootloader, firmware=args.firmware,
+                      firmware_version=args.firmware_version)
+    artifacts = [path for path in (args.bootloader, args.firmware) if path]
+    coordinator = Coordinator(jobs, artifacts=artifacts, lease_timeout=args.lease_timeout)
+    server = start_server(coordinator, args.host, args.port)
+    # 0.0.0.0 is only a bind address, local clients connect over loopback
+    local_host = "127.0.0.1" if args.host == "0.0.0.0" else args.host
+    url = f"http://{local_host}:{server.server_address[1]}"
+
+    if args.simulate:
+        from station_agent import StationAgent, simulated_job_runner
+
+        agents = []
+        for i in range(args.simulate):
+            # Each simulated station is a bit slower than the previous one
+            runner = simulated_job_runner(cycle_time=0.2 * (i + 1), failure_rate=0.05)
+            agent = StationAgent(url, f"sim-{i + 1}", runner)
+            agents.append(threading.Thread(target=agent.run, daemon=True))
+        for thread in agents:
+            thread.start()
+        for thread in agents:
+            thread.join()
+        print(json.dumps(coordinator.status(), indent=2))
+        server.shutdown()
+        return
+
+    try:
+        while True:
+            time.sleep(5)
+            status = coordinator.status()
+            print(f"pending={status['pending']} leased={status['leased']} "
+                  f"finished={status['finished']} failed={status['failed']}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
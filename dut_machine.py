@@ -0,0 +1,300 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+
+from cancellation import BudgetExceeded, CancelToken, Cancelled
+from mux import RESET_CHANNEL, SLOT_COUNT, select_frame
+from stage_timings import DEFAULT_TIMEOUTS, DUT_BUDGET
+
+
+# DUT lifecycle, in order
+QUEUED = "queued"
+MUX_SELECT = "mux_select"
+BOOTLOADER = "bootloader"
+WAIT_DEVICE = "wait_device"
+SERVICE_SELECT = "service_select"
+READY = "ready"
+INJECT_SN = "inject_sn"
+UPLOAD = "upload"
+REBOOT = "reboot"
+VERIFY = "verify"
+DONE = "done"
+FAILED = "failed"
+
+STATES = (QUEUED, MUX_SELECT, BOOTLOADER, WAIT_DEVICE, SERVICE_SELECT, READY, INJECT_SN, UPLOAD, REBOOT, VERIFY,
+          DONE, FAILED)
+
+# Time spent in these states is recorded under the TimingHistory stage names
+STAGE_NAMES = {
+    BOOTLOADER: "bootloader",
+    READY: "readiness",
+    INJECT_SN: "set_serial",
+    UPLOAD: "upload",
+    REBOOT: "reboot",
+    VERIFY: "verify",
+}
+
+
+async def port_open(host, port, timeout=0.5):
+    """Single TCP probe as a coroutine"""
+    try:
+        _reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def http_request(host, port, method, path, body=None, content_type=None, timeout=5):
+    """Minimal HTTP/1.1 request (Connection: close), returns (status, body)"""
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            headers = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close"]
+            if body is not None:
+                headers.append(f"Content-Length: {len(body)}")
+                if content_type:
+                    headers.append(f"Content-Type: {content_type}")
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + (body or b""))
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, content = response.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        return status, content
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+class DutJob:
+    """Everything one state machine needs about its DUT"""
+
+    def __init__(self, serial_number, slot, firmware_path, port, program,
+                 timeouts=None, budget=DUT_BUDGET, context=None):
+        self.serial_number = serial_number
+        self.slot = slot
+        self.firmware_path = firmware_path
+        self.port = port  # mux port that routes this slot (MuxPort or fixture GroupPort)
+        # program(cancel_token) -> CompletedProcess, blocking (flash.bat or the simulator), as in fixture.py
+        self.program = program
+        self.timeouts = {stage: default for stage, (default, _floor) in DEFAULT_TIMEOUTS.items()}
+        self.timeouts.update(timeouts or {})
+        self.budget = budget
+        self.context = context  # caller's data, e.g. the GUI task
+        self.state = QUEUED
+
+
+class DutStateMachine:
+    """
+    One DUT as explicit states: mux select, bootloader, wait for the device,
+    service select, ready, inject SN, upload, reboot, verify. Waits are
+    coroutines, so hundreds of DUTs waiting on locks, probes and timers cost
+    no threads. The budget only runs while the DUT holds its mux or the device,
+    not while it waits for them (in QUEUED and WAIT_DEVICE).
+    Every transition is reported as on_transition(job, state, previous, seconds, detail).
+    """
+
+    def __init__(self, job, core):
+        self.job = job
+        self.core = core
+        self._entered = time.monotonic()
+        self._budget_left = job.budget
+
+    def enter(self, state, detail=""):
+        previous = self.job.state
+        now = time.monotonic()
+        seconds = now - self._entered
+        self._entered = now
+        self.job.state = state
+        self.core.on_transition(self.job, state, previous, seconds, detail)
+
+    async def run(self):
+        job = self.job
+        core = self.core
+        mux_lock = core.mux_lock(job.port)
+        try:
+            # SWD stage: only this mux is busy, slots on other muxes program at the same time
+            async with mux_lock:
+                await self._within_budget(self._swd_stage())
+            # Bootloader timing and LED close here, the wait for the device is its own state
+            self.enter(WAIT_DEVICE)
+            # Web stage: every DUT answers on the same IP, one at a time
+            async with core.device_lock, mux_lock:
+                await self._within_budget(self._web_stage())
+            self.enter(DONE, "Successfully processed")
+        except asyncio.TimeoutError:
+            self.enter(FAILED, str(BudgetExceeded(job.state, job.budget)))
+        except asyncio.CancelledError:
+            self.enter(FAILED, "Cancelled by operator")
+        except Exception as e:
+            self.enter(FAILED, str(e))
+
+    async def _within_budget(self, coroutine):
+        """Run a stage with what is left of the budget, raises asyncio.TimeoutError once it is used up"""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(coroutine, self._budget_left)
+        finally:
+            self._budget_left -= time.monotonic() - started
+
+    async def _swd_stage(self):
+        job = self.job
+        self.enter(MUX_SELECT)
+        job.port.write(select_frame(RESET_CHANNEL))
+        await asyncio.sleep(self.core.settle)
+        job.port.write(select_frame(job.slot))
+        await asyncio.sleep(self.core.settle)
+
+        self.enter(BOOTLOADER)
+        try:
+            result = await self.program_bootloader()
+        finally:
+            job.port.write(select_frame(RESET_CHANNEL))
+        if "Programming Complete" not in result.stdout or "Verification...OK" not in result.stdout:
+            raise Exception("Bootloader upload failed")
+
+    async def _web_stage(self):
+        job = self.job
+        self.enter(SERVICE_SELECT)
+        await asyncio.sleep(self.core.settle)
+        job.port.write(select_frame(job.slot + SLOT_COUNT))
+        try:
+            self.enter(READY)
+            if not await self.wait_up(job.timeouts["readiness"]):
+                raise Exception("Device web server did not become ready in time")
+
+            self.enter(INJECT_SN)
+            form = urllib.parse.urlencode({"serialnumber": job.serial_number}).encode()
+            status, _ = await self.request("POST", "/factoryconfig", form, "application/x-www-form-urlencoded")
+            if status >= 400:
+                raise Exception(f"Setting the serial number failed (HTTP {status})")
+
+            self.enter(UPLOAD)
+            with open(job.firmware_path, "rb") as f:
+                firmware = f.read()
+            try:
+                status, _ = await self.request("POST", "/upload", firmware, "application/octet-stream",
+                                               timeout=job.timeouts["upload_total"])
+                if status >= 400:
+                    raise Exception(f"Firmware upload failed (HTTP {status})")
+            except (OSError, asyncio.IncompleteReadError):
+                # Device may drop the connection once the image is in
+                pass
+
+            self.enter(REBOOT)
+            if not await self.wait_down(job.timeouts["upload_total"]):
+                raise Exception("Device did not reboot after firmware upload")
+            if not await self.wait_up(job.timeouts["upload_total"]):
+                raise Exception("Device did not come back after firmware upload")
+
+            self.enter(VERIFY)
+            _, body = await self.request("GET", "/config.json")
+            serial_number = json.loads(body)["deviceInfo"]["serialNumber"]
+            if serial_number != job.serial_number:
+                raise Exception(f"Serial number mismatch, device reports {serial_number}")
+        finally:
+            job.port.write(select_frame(RESET_CHANNEL))
+
+    async def program_bootloader(self):
+        """Blocking programmer on a worker thread, its CancelToken follows the task's cancellation"""
+        token = CancelToken()
+        try:
+            return await asyncio.to_thread(self.job.program, token)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+        except Cancelled:
+            raise asyncio.CancelledError()
+
+    async def request(self, method, path, body=None, content_type=None, timeout=5):
+        return await http_request(self.core.host, self.core.port, method, path, body, content_type, timeout)
+
+    async def wait_up(self, timeout, poll_interval=0.1):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            try:
+                status, _ = await self.request("GET", "/config.json", timeout=0.5)
+                if status < 400:
+                    return True
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                pass
+            await asyncio.sleep(poll_interval)
+        return False
+
+    async def wait_down(self, timeout, poll_interval=0.1):
+        """True after two missed probes in a row (a busy server can miss one), False if it stayed up"""
+        end = time.monotonic() + timeout
+        missed = 0
+        while time.monotonic() < end:
+            missed = 0 if await port_open(self.core.host, self.core.port, poll_interval) else missed + 1
+            if missed >= 2:
+                return True
+            await asyncio.sleep(poll_interval)
+        return False
+
+
+class AsyncCore:
+    """
+    asyncio loop on its own thread that runs DUT state machines. The Qt side
+    submits jobs and receives transitions through on_transition, which is
+    called on the loop thread (emit a Qt signal from it to cross over).
+    """
+
+    def __init__(self, on_transition, host="192.168.0.100", port=80, settle=1.0):
+        self.on_transition = on_transition
+        self.host = host
+        self.port = port
+        self.settle = settle
+        self.loop = asyncio.new_event_loop()
+        self.device_lock = None
+        self._mux_locks = {}
+        self._tasks = set()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._create_locks(), self.loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _create_locks(self):
+        self.device_lock = asyncio.Lock()
+
+    def mux_lock(self, port):
+        """One lock per physical mux, a select on it reroutes every slot of that mux"""
+        key = id(getattr(port, "port", port))
+        if key not in self._mux_locks:
+            self._mux_locks[key] = asyncio.Lock()
+        return self._mux_locks[key]
+
+    def submit(self, job):
+        """Start the state machine of a job, returns a concurrent.futures.Future"""
+        job.state = QUEUED
+        return asyncio.run_coroutine_threadsafe(self._track(DutStateMachine(job, self).run()), self.loop)
+
+    async def _track(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        try:
+            await task
+        finally:
+            self._tasks.discard(task)
+
+    def cancel(self):
+        """Cancel every running and waiting DUT, each one ends in FAILED"""
+        def cancel_all():
+            for task in list(self._tasks):
+                task.cancel()
+        self.loop.call_soon_threadsafe(cancel_all)
+
+    @property
+    def active(self):
+        return len(self._tasks)
+
+    def stop(self):
+        self.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
@@ -0,0 +1,105 @@
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import zipfile
+from collections import deque
+
+from mux import describe_frame
+
+
+EVIDENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evidence")
+
+
+class MuxFrameLog:
+    """MuxPort listener that keeps the last frames for failure evidence"""
+
+    def __init__(self, size=50):
+        self.frames = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __call__(self, direction, data):
+        with self._lock:
+            self.frames.append((time.time(), direction, bytes(data)))
+
+    def dump(self):
+        with self._lock:
+            frames = list(self.frames)
+        lines = []
+        for timestamp, direction, data in frames:
+            kind, slot = describe_frame(data)
+            stamp = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}"
+            lines.append(f"{stamp} {direction} {data.hex(' ')}  {kind}{f' slot {slot}' if slot else ''}")
+        return "\n".join(lines) + "\n"
+
+
+def capture_browser(driver):
+    """Screenshot, DOM and browser logs of a live driver, whatever can still be read"""
+    files = {}
+    steps = {
+        "screenshot.png": driver.get_screenshot_as_png,
+        "dom.html": lambda: driver.page_source,
+        "url.txt": lambda: driver.current_url,
+        "console.json": lambda: json.dumps(driver.get_log("browser"), indent=1),
+        "network.json": lambda: json.dumps(driver.get_log("performance"), indent=1),
+    }
+    for name, step in steps.items():
+        try:
+            files[name] = step()
+        except Exception as e:
+            files[name + ".error.txt"] = f"{type(e).__name__}: {e}"
+    return files
+
+
+def capture_failure(error, driver=None, programmer_output=None):
+    """Evidence collected on the worker thread right after a failure, cheap reads only"""
+    files = {
+        "error.txt": "".join(traceback.format_exception(type(error), error, error.__traceback__)),
+    }
+    if driver is not None:
+        files.update(capture_browser(driver))
+    if programmer_output is not None:
+        files["stlink.txt"] = f"{programmer_output.stdout or ''}\n--- stderr ---\n{programmer_output.stderr or ''}"
+    return files
+
+
+class EvidenceWriter:
+    """
+    Writes failure evidence as one zip per DUT on a background thread,
+    so the next DUT can start while the previous failure is compressed.
+    """
+
+    def __init__(self, output_dir=EVIDENCE_DIR):
+        self.output_dir = output_dir
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, name, files):
+        """Queue files ({name: str | bytes}) for writing, returns the zip path right away"""
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{safe_name}.zip")
+        self._queue.put((path, files))
+        return path
+
+    def _run(self):
+        while True:
+            path, files = self._queue.get()
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                with zipfile.ZipFile(path + ".tmp", "w", zipfile.ZIP_DEFLATED) as archive:
+                    for name, content in files.items():
+                        archive.writestr(name, content)
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                print(f"Could not write evidence {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=10):
+        """Wait until everything submitted so far is on disk"""
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < end:
+            time.sleep(0.05)
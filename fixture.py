@@ -0,0 +1,167 @@
+import threading
+import time
+
+from cancellation import CancelToken, Cancelled
+from mux import RESET_CHANNEL, SLOT_COUNT, select_frame
+
+
+def probe_address(probe):
+    """ST-LINK_CLI connect option of a probe: '' (the only one), an index (ID=n) or a serial (SN=...)"""
+    probe = str(probe or "").strip()
+    if not probe or probe.upper().startswith(("ID=", "SN=")):
+        return probe
+    if probe.isdigit():
+        return f"ID={probe}"
+    return f"SN={probe}"
+
+
+class GroupPort:
+    """
+    Mux port of one fixture group addressed with station slot numbers.
+    Select frames of the group's slots are rewritten to the mux channel
+    (SWD channel n, service channel n + 8), everything else passes through.
+    """
+
+    def __init__(self, port, channels):
+        self.port = port
+        self.channels = dict(channels)  # slot -> channel on this mux
+        # Held by whatever switches this mux (DUT job, bootloader stage, presence probe),
+        # a select reroutes, and powers off, every slot of the mux
+        self.mux_lock = threading.RLock()
+
+    def write(self, data):
+        data = bytes(data)
+        if len(data) == 4 and data[0] == 0x41 and data[3] == 0x0D and data[2] != RESET_CHANNEL:
+            channel = data[2]
+            if channel in self.channels:
+                data = select_frame(self.channels[channel])
+            elif channel - SLOT_COUNT in self.channels:
+                data = select_frame(self.channels[channel - SLOT_COUNT] + SLOT_COUNT)
+        return self.port.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+
+class FixtureGroup:
+    """Slots behind one mux and one ST-LINK probe"""
+
+    def __init__(self, name, port, slots, probe=""):
+        self.name = name
+        self.slots = list(slots)
+        self.probe = probe
+        self.port = GroupPort(port, {slot: index + 1 for index, slot in enumerate(self.slots)})
+
+    def __repr__(self):
+        return f"FixtureGroup({self.name}, slots {self.slots}, probe {self.probe or 'default'})"
+
+
+class Fixture:
+    """
+    Mux/probe pairs of the station. A single group with all slots and the
+    default probe is the classic one-mux setup. With several groups, the
+    SWD bootloader stage of slots in different groups runs at the same time.
+    """
+
+    def __init__(self, groups):
+        self.groups = list(groups)
+        # Groups on one mux would map their slots onto the same channels and be run as if parallel
+        muxes = {}
+        for group in self.groups:
+            other = muxes.setdefault(id(group.port.port), group)
+            if other is not group:
+                raise ValueError(f"Fixture groups {other.name} and {group.name} share a mux port, "
+                                 f"list all slots of a mux in one group")
+        slots = [slot for group in self.groups for slot in group.slots]
+        if len(set(slots)) != len(slots):
+            raise ValueError("A slot is listed in more than one fixture group")
+
+    @classmethod
+    def single(cls, port, slot_count=SLOT_COUNT):
+        return cls([FixtureGroup("mux", port, range(1, slot_count + 1))])
+
+    @property
+    def parallel(self):
+        return len(self.groups) > 1
+
+    def group_for(self, slot):
+        for group in self.groups:
+            if slot in group.slots:
+                return group
+        raise KeyError(f"Slot {slot} is not on any mux of the fixture")
+
+    def port_for(self, slot):
+        return self.group_for(slot).port
+
+    def probe_for(self, slot):
+        return self.group_for(slot).probe
+
+    def close(self):
+        for group in self.groups:
+            if group.port.is_open:
+                group.port.close()
+
+
+def flash_command(bat_file, image, stlink_cli=None, probe=""):
+    """flash.bat call for one image, with the ST-LINK_CLI path and probe when given"""
+    command = f'"{bat_file}" "{image}"'
+    address = probe_address(probe)
+    if stlink_cli or address:
+        command += f' "{stlink_cli or ""}"'
+    if address:
+        command += f' {address}'
+    return command
+
+
+def program_bootloader(port, slot, program, cancel_token, settle=1.0):
+    """Route SWD to the slot and run program(cancel_token), the mux is switched off again afterwards"""
+    port.write(select_frame(RESET_CHANNEL))
+    cancel_token.sleep(settle)
+    port.write(select_frame(slot))
+    cancel_token.sleep(settle)
+    try:
+        return program(cancel_token)
+    finally:
+        port.write(select_frame(RESET_CHANNEL))
+
+
+def program_bootloaders(fixture, slots, program_for, cancel_token=None, on_result=None, settle=1.0):
+    """
+    Bootloader stage of many slots, one thread per fixture group: slots of
+    the same group go one after the other, groups run side by side.
+    program_for(group) returns the program(cancel_token) callable of the group's probe.
+    on_result(slot, result, seconds) is called from the group threads,
+    result is the CompletedProcess or the exception. Returns {slot: result}.
+    """
+    cancel_token = cancel_token or CancelToken()
+    results = {}
+    lock = threading.Lock()
+
+    def run_group(group, group_slots):
+        program = program_for(group)
+        for slot in group_slots:
+            if cancel_token.is_cancelled():
+                return
+            started = time.monotonic()
+            try:
+                with group.port.mux_lock:
+                    result = program_bootloader(group.port, slot, program, cancel_token, settle)
+            except Cancelled:
+                return
+            except Exception as e:
+                result = e
+            with lock:
+                results[slot] = result
+            if on_result:
+                on_result(slot, result, time.monotonic() - started)
+
+    threads = []
+    for group in fixture.groups:
+        group_slots = [slot for slot in slots if slot in group.slots]
+        if group_slots:
+            threads.append(threading.Thread(target=run_group, args=(group, group_slots), daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -1,9 +1,14 @@
 @echo off
+REM Usage: flash.bat <image> [ST-LINK_CLI.exe path] [probe: ID=<index> or SN=<serial>]
+set "STLINK_CLI=%~2"
+set "PROBE=%~3"
+if "%STLINK_CLI%"=="" set "STLINK_CLI=C:\Program Files (x86)\STMicroelectronics\STM32 ST-LINK Utility\ST-LINK Utility\ST-LINK_CLI.exe"
+
 REM Mass erase
-"C:\Program Files (x86)\STMicroelectronics\STM32 ST-LINK Utility\ST-LINK Utility\ST-LINK_CLI.exe" -c SWD -ME
+"%STLINK_CLI%" -c %PROBE% SWD -ME
 
 
 REM Program firmware
-"C:\Program Files (x86)\STMicroelectronics\STM32 ST-LINK Utility\ST-LINK Utility\ST-LINK_CLI.exe" -c SWD -P "%~1" 0x08000000 -V -Rst
+"%STLINK_CLI%" -c %PROBE% SWD -P "%~1" 0x08000000 -V -Rst
 
 @REM pause
@@ -1,16 +1,21 @@
 import serial
 import serial.tools.list_ports
 import sys
+import os
 import time
 import subprocess
 import json
 import socket
 import time
+import argparse
+import contextlib
+import threading
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QMessageBox, QScrollArea, QFileDialog, QComboBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                             QMessageBox, QScrollArea, QFileDialog, QComboBox,
+                             QCheckBox)
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 
 
 from selenium import webdriver
@@ -20,17 +25,54 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
+import page_actions
+from upload_monitor import UploadMonitor, enable_network_events
+from cancellation import CancelToken, Cancelled, Deadline, run_cancellable
+from stage_timings import TimingHistory, DEFAULT_TIMEOUTS, DUT_BUDGET, STAGE_ORDER
+from station_agent import StationAgent
+from simulator import Simulator, automate_device_without_browser
+from profiling import JobProfiler, EventLoopLagMonitor
+from metrics import StationMetrics
+from mux import SLOT_COUNT, MuxEventDecoder, MuxPort
+from throughput import ThroughputTracker, format_duration
+from station_config import CONFIG_FILE, load_station_config
+from process_watchdog import BrowserWatchdog
+from evidence import EvidenceWriter, MuxFrameLog, capture_failure
+from scanner import DEFAULT_SERIAL_PATTERN, SerialScanner, validate_serial
+from banks import BankScheduler, LOADING, READY, RUNNING, DONE
+from presence import probe_slots, stlink_probe
+from slot_health import SlotHealth
+from mes import MesUploader
+from mux_trace import MuxTrace
+from fixture import Fixture, FixtureGroup, flash_command, program_bootloaders
+import dut_machine
+from batch_order import DUT_MAJOR, OVERLAP, STAGE_MAJOR, interleave, overlap_slot
+from http_replay import HttpReplay, NetworkRecorder, ReplayDiverged, derive_script, load_script, read_json, save_script
+from notifications import NotificationPanel
+from browser_cache import firmware_key, profile_dir_for, add_cache_arguments, clear_device_session, no_cache_url
 
-class AutomationThread(QThread):
-    """Thread for running automate_device"""
+
+class AutomationSignals(QObject):
+    """Signals shared by every AutomationJob, created and connected once per app"""
     finished = pyqtSignal(str, bool, str)  # serial_number, success, message
     progress = pyqtSignal(str)  # progress message
     bootloader_status = pyqtSignal(int, bool)  # True = success, False = fail
     serial_verify_status = pyqtSignal(int, bool)  # True = match, False = mismatch
+    stage_timing = pyqtSignal(int, str, float)  # cycle_number, stage, seconds
+    presence = pyqtSignal(object)  # {slot: DUT present} from PresenceProbeJob
+    bootloaders_done = pyqtSignal(object)  # {slot: CompletedProcess} from ParallelBootloaderJob
+    ahead_done = pyqtSignal(object)  # {slot: CompletedProcess} of the slot programmed ahead (overlap order)
+    dut_state = pyqtSignal(object, str, str, float, str)  # DutJob, state, previous state, seconds in it, detail
+    coordinator_error = pyqtSignal(str)  # rejected report or lost lease, from the coordinator threads
+
 
+class AutomationJob(QRunnable):
+    """One DUT run of automate_device on the shared QThreadPool"""
 
-    def __init__(self, row_index, serial_number, bootloader_path, firmware_path, bat_file, driver_path, chromefortestbinary_path, cycle_number, serial_port):
+    def __init__(self, signals, cancel_token, row_index, serial_number, bootloader_path, firmware_path, bat_file, driver_path, chromefortestbinary_path, cycle_number, serial_port, profile_dir=None, timeouts=None, automate_function=None, automate_kwargs=None, profiler=None):
         super().__init__()
+        self.signals = signals
+        self.cancel_token = cancel_token
         self.serial_number = serial_number
         self.bootloader_path = bootloader_path
         self.firmware_path = firmware_path
@@ -40,48 +82,355 @@ class AutomationThread(QThread):
         self.cycle_number = cycle_number
         self.serial_port = serial_port
         self.row_index = row_index
+        self.profile_dir = profile_dir
+        self.timeouts = timeouts
+        # Simulator mode swaps in stand-ins through these
+        self.automate_function = automate_function or automate_device
+        self.automate_kwargs = automate_kwargs or {}
+        self.profiler = profiler
 
     
     def run(self):
-        """Run the automation in a separate thread"""
+        """Run the automation on a pool thread"""
+        signals = self.signals
         try:
             # DON'T send serial data here anymore - it's now handled inside automate_device
-            self.progress.emit(f"Starting automation for {self.serial_number}...")
+            signals.progress.emit(f"Starting automation for {self.serial_number}...")
             
             # Run automation (serial commands are now sent inside this function)
-            automate_device(
+            run_automation = lambda: self.automate_function(
                 serial_number=self.serial_number,
                 bootloader_path=self.bootloader_path,
                 firmware_path=self.firmware_path,
                 bat_file=self.bat_file,
                 driver_path=self.driver_path,
                 chromefortestbinary_path=self.chromefortestbinary_path,
-                bootloader_callback=lambda ok: self.bootloader_status.emit(self.row_index, ok),
-                serial_verify_callback=lambda ok: self.serial_verify_status.emit(self.row_index, ok),
+                bootloader_callback=lambda ok: signals.bootloader_status.emit(self.row_index, ok),
+                serial_verify_callback=lambda ok: signals.serial_verify_status.emit(self.row_index, ok),
                 serial_port=self.serial_port,  # Pass serial_port
-                cycle_number=self.cycle_number  # Pass cycle_number
+                cycle_number=self.cycle_number,  # Pass cycle_number
+                profile_dir=self.profile_dir,
+                progress_callback=signals.progress.emit,
+                stage_callback=lambda stage, seconds: signals.stage_timing.emit(self.cycle_number, stage, seconds),
+                timeouts=self.timeouts,
+                cancel_token=self.cancel_token,
+                **self.automate_kwargs
             )
+            # The mux stays ours for the whole DUT, a probe on it would power off the DUT in its web stage
+            with getattr(self.serial_port, "mux_lock", None) or contextlib.nullcontext():
+                if self.profiler:
+                    self.profiler.run(f"{self.serial_number}_slot{self.cycle_number}", run_automation)
+                else:
+                    run_automation()
             
-            self.finished.emit(self.serial_number, True, "Successfully processed")
+            signals.finished.emit(self.serial_number, True, "Successfully processed")
             
         except Exception as e:
-            self.finished.emit(self.serial_number, False, str(e))
+            message = str(e)
+            if getattr(e, "evidence", None):
+                message += f" (evidence: {e.evidence})"
+            signals.finished.emit(self.serial_number, False, message)
+
+class PresenceProbeJob(QRunnable):
+    """Slot presence probe before a batch, holds each mux's lock so it never switches a mux a DUT job is using"""
+
+    def __init__(self, signals, cancel_token, fixture, slots, probe_for):
+        super().__init__()
+        self.signals = signals
+        self.cancel_token = cancel_token
+        self.fixture = fixture
+        self.slots = slots
+        self.probe_for = probe_for
+
+    def run(self):
+        try:
+            present = {}
+            for group in self.fixture.groups:
+                group_slots = [slot for slot in self.slots if slot in group.slots]
+                if group_slots:
+                    with group.port.mux_lock:
+                        present.update(probe_slots(group.port, group_slots, self.probe_for(group), self.cancel_token))
+        except Cancelled:
+            present = {slot: False for slot in self.slots}
+        except Exception as e:
+            print(f"Presence probe failed, running all slots: {e}")
+            present = {}
+        self.signals.presence.emit(present)
+
+
+class ParallelBootloaderJob(QRunnable):
+    """Bootloader stage of a whole batch, slots on different mux/probe pairs are programmed at the same time"""
+
+    def __init__(self, signals, cancel_token, fixture, slots, program_for, done=None):
+        super().__init__()
+        self.signals = signals
+        self.cancel_token = cancel_token
+        self.fixture = fixture
+        self.slots = slots
+        self.program_for = program_for
+        self.done = done or signals.bootloaders_done
+
+    def on_result(self, slot, result, seconds):
+        if isinstance(result, Exception):
+            self.signals.progress.emit(f"Bootloader of slot {slot} failed: {result}")
+            return
+        self.signals.progress.emit(f"Bootloader of slot {slot} done in {seconds:.1f} s")
+        self.signals.stage_timing.emit(slot, "bootloader", seconds)
+
+    def run(self):
+        results = program_bootloaders(self.fixture, self.slots, self.program_for, self.cancel_token, self.on_result)
+        for slot, result in results.items():
+            if isinstance(result, Exception):
+                results[slot] = subprocess.CompletedProcess("flash.bat", 1, "", str(result))
+        self.done.emit(results)
+
+
+class ThroughputPanel(QWidget):
+    """Live cycle time, DUTs/hour, ETA and current stage per slot, read from a ThroughputTracker"""
+
+    def __init__(self, tracker, parent=None):
+        super().__init__(parent)
+        self.tracker = tracker
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 0, 10, 0)
+
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size: 11px; font-weight: bold; color: #333;")
+        self.stage_label = QLabel()
+        self.stage_label.setStyleSheet("font-size: 11px; color: #666;")
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.stage_label)
+
+        # Only the elapsed times change between events, once a second is enough
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.remaining = 0
+        self.refresh()
+
+    def start(self):
+        self.timer.start()
+        self.refresh()
+
+    def stop(self):
+        self.timer.stop()
+        self.refresh()
+
+    def refresh(self):
+        tracker = self.tracker
+        per_hour = tracker.duts_per_hour
+        self.summary_label.setText(
+            f"Done {tracker.finished} ({tracker.failed} failed)  |  "
+            f"Avg cycle {format_duration(tracker.avg_cycle)}  |  "
+            f"{f'{per_hour:.0f}' if per_hour else '--'} DUT/h  |  "
+            f"Queue {self.remaining}, ETA {format_duration(tracker.eta(self.remaining))}"
+        )
+
+        parts = [f"DUT {slot}: {stage} {format_duration(seconds)}"
+                 for slot, stage, seconds in tracker.current_stages()]
+        slowest = tracker.slowest_stage()
+        if slowest:
+            parts.append(f"Slowest stage: {slowest[0]} ({slowest[1]:.1f} s avg)")
+        self.stage_label.setText("  |  ".join(parts) or "Idle")
+
+
+class BankPanel(QWidget):
+    """Load / ready / running state of every fixture bank, with its Ready button"""
+
+    STATE_STYLE = {
+        LOADING: ("Loading - scan serials, then Ready", "#666"),
+        READY: ("Ready - starts when the fixture is free", "#2196F3"),
+        RUNNING: ("Running", "#FF9800"),
+        DONE: ("Done - unload and reload", "#4CAF50"),
+    }
+
+    def __init__(self, scheduler, on_ready, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 0, 10, 0)
+        self.rows = []
+
+        for bank in scheduler.banks:
+            row = QHBoxLayout()
+            name_label = QLabel(bank.label)
+            name_label.setStyleSheet("font-size: 12px; font-weight: bold;")
+            name_label.setMinimumWidth(150)
+            state_label = QLabel()
+            ready_btn = QPushButton("Ready")
+            ready_btn.setMaximumWidth(80)
+            ready_btn.clicked.connect(lambda checked, b=bank: on_ready(b))
+            row.addWidget(name_label)
+            row.addWidget(state_label)
+            row.addStretch()
+            row.addWidget(ready_btn)
+            layout.addLayout(row)
+            self.rows.append((bank, state_label, ready_btn))
+        self.refresh()
+
+    def refresh(self):
+        for bank, state_label, ready_btn in self.rows:
+            text, color = self.STATE_STYLE[bank.state]
+            if bank.state in (RUNNING, DONE):
+                text += f" {bank.passed + bank.failed}/{len(bank.tasks)}, {bank.failed} failed"
+            state_label.setText(text)
+            state_label.setStyleSheet(f"font-size: 11px; color: {color};")
+            ready_btn.setEnabled(bank.state in (LOADING, DONE))
+
 
 class SerialNumberApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, coordinator_url=None, station_id=None, simulator=None, simulate_browser=True, profile_mode=None, metrics_port=9464, station_config=None, bank_count=None, record_http_script=None, async_core=False, batch_order=None):
         super().__init__()
-        
-        # Initialize serial port as None
+
+        # Tool paths, device IP and mux port from station_config.json (discovered and cached)
+        self.station_config = station_config or load_station_config()
+
+        # Prometheus metrics on localhost, fed from the job signals and mux writes
+        self.metrics = StationMetrics()
+        self.mux_listeners = [self.metrics.on_mux_frame]
+
+        # Failure evidence (screenshot, DOM, logs, ST-LINK output, mux frames) zipped in the background
+        self.mux_frame_log = MuxFrameLog()
+        self.mux_listeners.append(self.mux_frame_log)
+
+        # Every mux write/read with a monotonic timestamp, flushed to traces/ at batch end for replay
+        self.mux_trace = MuxTrace()
+        self.mux_listeners.append(self.mux_trace)
+        self.evidence_writer = EvidenceWriter()
+        if metrics_port:
+            try:
+                self.metrics.serve(metrics_port)
+            except OSError as e:
+                print(f"Metrics endpoint not started: {e}")
+
+        # Kills browser trees that outlive their DUT job or grow too big, and leftovers of earlier runs
+        self.watchdog = BrowserWatchdog(on_leak=self.metrics.on_browser_leak)
+        self.watchdog.reap_orphans(self.browser_executables())
+        self.watchdog.start()
+
+        # Optional profiling of every DUT job and of the Qt main thread
+        self.profiler = None
+        self.lag_monitor = None
+        if profile_mode:
+            self.profiler = JobProfiler(mode=profile_mode)
+            self.lag_monitor = EventLoopLagMonitor(parent=self)
+            self.lag_monitor.start()
+        
+        # Simulator mode: virtual mux, programmer and device web server instead of hardware
+        self.simulator = simulator
+        self.automate_function = automate_device
+        self.automate_kwargs = {
+            "device_ip": self.station_config["device_ip"],
+            "stlink_cli": self.station_config["stlink_cli"] or None,
+            "budget": self.station_config["dut_budget"],
+        }
+        if simulator:
+            self.automate_kwargs = simulator.automate_kwargs()
+            self.automate_kwargs["budget"] = self.station_config["dut_budget"]
+            if not simulate_browser:
+                self.automate_function = automate_device_without_browser
+        self.automate_kwargs["evidence_callback"] = self.save_evidence
+        if self.automate_function is automate_device:
+            self.automate_kwargs["watchdog"] = self.watchdog
+
+        # Web stage as plain HTTP requests derived from a recorded browser session, the browser is the fallback
+        self.http_script = None
+        script_path = self.station_config.get("http_script")
+        if record_http_script and self.automate_function is automate_device:
+            self.automate_kwargs["record_script"] = record_http_script
+        elif script_path and os.path.exists(script_path) and self.automate_function is automate_device:
+            self.http_script = HttpReplay(load_script(script_path))
+            self.automate_kwargs["http_script"] = self.http_script
+        
+        # Optional multi-station mode: jobs are leased from coordinator.py
+        self.station_agent = None
+        self.leased_jobs = {}  # serial_number -> coordinator job
+        if coordinator_url:
+            self.station_agent = StationAgent(coordinator_url, station_id or socket.gethostname())
+        self.station_id = station_id or socket.gethostname()
+
+        # Every DUT result goes to the MES through a local durable queue, never blocking a cycle
+        self.mes = None
+        if self.station_config.get("mes_url"):
+            self.mes = MesUploader(self.station_config["mes_url"])
+            self.mes.start()
+
+        # Initialize serial port as None, the fixture maps slots to mux/probe pairs once connected
         self.serial_port = None
-        self.current_thread = None
+        self.fixture = None
+        self.current_job = None
+        self.cancel_token = None
+        self.ahead_task = None  # overlap order: queued task whose bootloader runs during the current web stage
+        self.ahead_token = None  # set while its job runs, even after ahead_task was dropped from the queue
+        self.waiting_for_bootloader = False
+
+        # One long-lived worker, jobs are queued on it instead of a new QThread per DUT.
+        # The second thread only programs the next slot ahead in the overlap batch order.
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.automation_signals = AutomationSignals()
+        self.automation_signals.progress.connect(self.on_automation_progress)
+        self.automation_signals.finished.connect(self.on_automation_finished)
+        self.automation_signals.bootloader_status.connect(self.update_bootloader_status)
+        self.automation_signals.serial_verify_status.connect(self.update_serial_verify_status)
+        self.automation_signals.stage_timing.connect(self.on_stage_timing)
+        self.automation_signals.presence.connect(self.on_presence)
+        self.automation_signals.bootloaders_done.connect(self.on_bootloaders_done)
+        self.automation_signals.ahead_done.connect(self.on_ahead_done)
+        self.automation_signals.dut_state.connect(self.on_dut_state)
+        self.automation_signals.coordinator_error.connect(self.on_coordinator_error)
+        self.automation_signals.stage_timing.connect(self.metrics.on_stage_timing)
+        self.throughput = ThroughputTracker()
+        self.automation_signals.stage_timing.connect(self.throughput.stage_done)
+        # Leased jobs are renewed while they wait and run, so the coordinator does not hand them out again
+        self.lease_timer = QTimer(self)
+        self.lease_timer.timeout.connect(self.renew_leases)
         self.automation_queue = []
         self.is_processing = False
 
+        # DUT state machines as coroutines on an asyncio loop thread, all slots in flight at once.
+        # Drives the device's plain HTTP API, so only the browserless path can use it.
+        self.async_core = None
+        self.async_jobs = []
+        if async_core or self.station_config.get("async_core"):
+            if self.automate_function is automate_device:
+                print("Async core needs the browserless path (--simulate --sim-no-browser), using the worker pool")
+            else:
+                self.async_core = dut_machine.AsyncCore(self.automation_signals.dut_state.emit,
+                                                        host=self.automate_kwargs["device_ip"],
+                                                        port=self.automate_kwargs.get("device_port", 80),
+                                                        settle=self.simulator.mux.settle if self.simulator else 1.0)
+
+        # Streaming intake from a keyboard-wedge or serial-port barcode scanner
+        self.serial_pattern = self.station_config.get("serial_pattern") or DEFAULT_SERIAL_PATTERN
+        self.stream_files = None
+        self.stream_profile_dir = None
+        self.scanner = None
+
+        # Fixture lid / start button events arrive on the mux port, tasks wait here during the presence probe
+        self.mux_events = MuxEventDecoder()
+        self.pending_tasks = []
+
+        # Fixture banks: one bank is flashed while the operator reloads the other
+        bank_count = bank_count or self.station_config.get("banks") or 1
+        self.banks = BankScheduler(SLOT_COUNT, bank_count) if bank_count > 1 else None
+
+        # Stage durations from earlier runs, used to calibrate timeouts per slot
+        self.timing_history = TimingHistory()
+
+        # Outcome per slot across batches, slots with a drifting failure rate or latency get quarantined
+        self.slot_health = SlotHealth()
+
+        self.batch_results = []
+        self.batch_start = time.monotonic()
+        self.job_started = time.monotonic()
+        self.current_task = None
+
         self.bootloader_indicators = []
         self.serial_verify_indicators = []
 
         
-        self.setWindowTitle("Serial Number Input")
+        self.setWindowTitle("Serial Number Input" + (" [SIMULATION]" if simulator else ""))
         self.setGeometry(100, 100, 700, 750)
         
         # Store single record in memory
@@ -235,6 +584,7 @@ class SerialNumberApp(QMainWindow):
         
         # Create 8 input fields with buttons
         self.serial_inputs = []
+        self.slot_labels = []
  
         self.bootloader_buttons = []  # Track bootloader buttons
         self.firmware_buttons = []    # Track firmware buttons
@@ -250,6 +600,8 @@ class SerialNumberApp(QMainWindow):
             input_field = QLineEdit()
             input_field.setPlaceholderText(f"Enter serial number {i}")
             input_field.setStyleSheet("padding: 5px; font-size: 12px;")
+            # Keyboard-wedge scanners type the serial and press Enter
+            input_field.returnPressed.connect(lambda idx=i: self.on_serial_entered(idx))
             
             # Add for bootloader button for each field
             bootloader_btn = QPushButton("For bootloader")
@@ -329,6 +681,7 @@ class SerialNumberApp(QMainWindow):
 
             scroll_layout.addLayout(field_layout)
             self.serial_inputs.append(input_field)
+            self.slot_labels.append(label)
             self.bootloader_indicators.append(boot_led)
             self.serial_verify_indicators.append(sn_led)
             self.bootloader_buttons.append(bootloader_btn)
@@ -340,6 +693,45 @@ class SerialNumberApp(QMainWindow):
         scroll.setWidget(scroll_content)
         main_layout.addWidget(scroll)
 
+        # Streaming intake: every scanned serial is queued right away instead of on Upload
+        self.streaming_checkbox = QCheckBox("Streaming intake - start each DUT as soon as its serial is scanned")
+        self.streaming_checkbox.setStyleSheet("font-size: 11px; padding: 0 10px;")
+        main_layout.addWidget(self.streaming_checkbox)
+
+        self.auto_start_checkbox = QCheckBox("Start when the fixture lid closes or the start button is pressed")
+        self.auto_start_checkbox.setStyleSheet("font-size: 11px; padding: 0 10px;")
+        self.auto_start_checkbox.setChecked(bool(self.station_config.get("auto_start")))
+        main_layout.addWidget(self.auto_start_checkbox)
+
+        self.skip_quarantined_checkbox = QCheckBox("Skip quarantined slots (failure rate or stage times drifted)")
+        self.skip_quarantined_checkbox.setStyleSheet("font-size: 11px; padding: 0 10px;")
+        self.skip_quarantined_checkbox.setChecked(bool(self.station_config.get("skip_quarantined")))
+        main_layout.addWidget(self.skip_quarantined_checkbox)
+
+        # DUT by DUT, all bootloaders first, or the next slot programmed while the current one reboots
+        order_layout = QHBoxLayout()
+        order_label = QLabel("Batch order:")
+        order_label.setStyleSheet("font-size: 11px; padding: 0 10px;")
+        self.batch_order_combo = QComboBox()
+        self.batch_order_combo.addItem("DUT by DUT", DUT_MAJOR)
+        self.batch_order_combo.addItem("All bootloaders first, then the web stages", STAGE_MAJOR)
+        self.batch_order_combo.addItem("Program the next slot while the current one reboots (other mux)", OVERLAP)
+        self.batch_order_combo.setCurrentIndex(
+            max(self.batch_order_combo.findData(batch_order or self.station_config.get("batch_order")), 0))
+        order_layout.addWidget(order_label)
+        order_layout.addWidget(self.batch_order_combo)
+        order_layout.addStretch()
+        main_layout.addLayout(order_layout)
+
+        self.mux_event_timer = QTimer(self)
+        self.mux_event_timer.setInterval(100)
+        self.mux_event_timer.timeout.connect(self.poll_mux_events)
+        self.mux_event_timer.start()
+
+        if self.banks:
+            self.bank_panel = BankPanel(self.banks, self.mark_bank_ready)
+            main_layout.addWidget(self.bank_panel)
+
         # Button layout
         button_layout = QHBoxLayout()
         
@@ -394,9 +786,62 @@ class SerialNumberApp(QMainWindow):
         """)
         reset_btn.clicked.connect(self.send_reset_command)
         
+        # Stop batch button
+        stop_btn = QPushButton("Stop Batch")
+        stop_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #FF9800;
+                color: white;
+                padding: 10px;
+                font-size: 14px;
+                border: none;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #F57C00;
+            }
+        """)
+        stop_btn.clicked.connect(self.stop_batch)
+
+        # Release quarantine button, after the fixture channel was repaired
+        release_btn = QPushButton("Release Slots")
+        release_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #607D8B;
+                color: white;
+                padding: 10px;
+                font-size: 14px;
+                border: none;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #455A64;
+            }
+        """)
+        release_btn.clicked.connect(self.release_quarantine)
+        
         button_layout.addWidget(save_btn)
+        if self.station_agent:
+            lease_btn = QPushButton("Lease Jobs")
+            lease_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #2196F3;
+                    color: white;
+                    padding: 10px;
+                    font-size: 14px;
+                    border: none;
+                    border-radius: 5px;
+                }
+                QPushButton:hover {
+                    background-color: #0b7dda;
+                }
+            """)
+            lease_btn.clicked.connect(self.lease_jobs)
+            button_layout.addWidget(lease_btn)
+        button_layout.addWidget(stop_btn)
         button_layout.addWidget(clear_btn)
         button_layout.addWidget(reset_btn)
+        button_layout.addWidget(release_btn)
         main_layout.addLayout(button_layout)
         
         # Status label
@@ -404,32 +849,59 @@ class SerialNumberApp(QMainWindow):
         self.status_label.setStyleSheet("font-size: 11px; color: #666; padding: 5px;")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(self.status_label)
+
+        # Live cycle time / ETA of the running batch
+        self.throughput_panel = ThroughputPanel(self.throughput)
+        main_layout.addWidget(self.throughput_panel)
+
+        # Failures and batch summaries go here instead of modal dialogs
+        self.notifications = NotificationPanel()
+        main_layout.addWidget(self.notifications)
+
+        if self.mes:
+            self.mes_label = QLabel()
+            self.mes_label.setStyleSheet("font-size: 11px; color: #666; padding: 0 10px;")
+            main_layout.addWidget(self.mes_label)
+            self.mes_rejected_seen = 0
+            self.mes_timer = QTimer(self)
+            self.mes_timer.setInterval(2000)
+            self.mes_timer.timeout.connect(self.refresh_mes_status)
+            self.mes_timer.start()
+            self.refresh_mes_status()
+
+        for slot, reason in self.slot_health.quarantined().items():
+            self.show_quarantine(slot, reason)
+            self.notifications.failure(f"Slot {slot} is quarantined: {reason}")
+
+        if self.station_config.get("scanner_port"):
+            self.start_scanner(self.station_config["scanner_port"])
     
 
     def refresh_ports(self):
         """Refresh the list of available COM ports"""
         self.port_combo.clear()
+        if self.simulator:
+            self.port_combo.addItem("SIM - Virtual multiplexer", "SIM")
         ports = serial.tools.list_ports.comports()
         
         if ports:
             for port in ports:
                 self.port_combo.addItem(f"{port.device} - {port.description}", port.device)
-        else:
+        elif not self.simulator:
             self.port_combo.addItem("No COM ports found")
+
+        # Preselect the mux port of the station config
+        index = self.port_combo.findData(self.station_config.get("mux_port"))
+        if index >= 0 and not self.simulator:
+            self.port_combo.setCurrentIndex(index)
     
     def connect_serial(self):
         """Connect to the selected COM port"""
         if self.port_combo.currentData():
             try:
                 port = self.port_combo.currentData()
-                self.serial_port = serial.Serial(
-                    port=port,
-                    baudrate=19200,
-                    parity=serial.PARITY_NONE,
-                    stopbits=serial.STOPBITS_ONE,
-                    bytesize=serial.EIGHTBITS,
-                    timeout=1
-                )
+                self.serial_port = self.open_mux(self.simulator.mux.port if port == "SIM" else port)
+                self.fixture = self.build_fixture(self.serial_port)
                 
                 # Update UI
                 self.connection_status.setText("● Connected")
@@ -442,15 +914,68 @@ class SerialNumberApp(QMainWindow):
                 QMessageBox.information(self, "Connected", f"Successfully connected to {port}")
                 
             except Exception as e:
+                if self.serial_port and self.serial_port.is_open:
+                    self.serial_port.close()
                 QMessageBox.critical(self, "Connection Error", f"Failed to connect to {port}\n\nError: {str(e)}")
                 print(f"Connection error: {str(e)}")
         else:
             QMessageBox.warning(self, "No Port", "Please select a COM port!")
     
+    def open_mux(self, port):
+        """MuxPort of a mux COM port (or a virtual mux of the simulator)"""
+        sim_mux = next((mux for mux in self.simulator.muxes if mux.port == port), None) if self.simulator else None
+        if sim_mux:
+            sim_mux.is_open = True
+            mux_serial = sim_mux
+        else:
+            mux_serial = serial.Serial(
+                port=port,
+                baudrate=19200,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                bytesize=serial.EIGHTBITS,
+                timeout=1
+            )
+        # Every mux frame goes through the listeners (metrics, ...)
+        return MuxPort(mux_serial, self.mux_listeners)
+
+    def build_fixture(self, primary):
+        """
+        Mux/probe groups of the "fixture" config, e.g. [{"mux_port": "COM5", "probe": "SN=...", "slots": [5, 6, 7, 8]}].
+        Groups without a mux_port use the selected port, each mux may be used by one group only (ValueError).
+        No groups: one mux and the default probe for all slots.
+        """
+        specs = self.station_config.get("fixture") or (self.simulator.fixture_groups() if self.simulator else [])
+        if not specs:
+            return Fixture.single(primary, len(self.serial_inputs))
+        ports = {primary.port.port: primary}
+        groups = []
+        for index, spec in enumerate(specs):
+            name = spec.get("mux_port") or primary.port.port
+            if name not in ports:
+                ports[name] = self.open_mux(name)
+            groups.append(FixtureGroup(spec.get("name") or f"mux{index + 1}", ports[name], spec["slots"], spec.get("probe", "")))
+        try:
+            fixture = Fixture(groups)
+        except ValueError:
+            for port in ports.values():
+                if port is not primary:
+                    port.close()
+            raise
+        print("Fixture: " + ", ".join(map(repr, fixture.groups)))
+        return fixture
+
+    def mux_for(self, slot):
+        """Port that routes this slot, select frames use the station slot number"""
+        return self.fixture.port_for(slot) if self.fixture else self.serial_port
+
     def disconnect_serial(self):
         """Disconnect from the serial port"""
         if self.serial_port and self.serial_port.is_open:
             try:
+                if self.fixture:
+                    self.fixture.close()
+                    self.fixture = None
                 self.serial_port.close()
                 
                 # Update UI
@@ -553,7 +1078,7 @@ class SerialNumberApp(QMainWindow):
             data_bytes = bytes(data)
             
             if self.serial_port and self.serial_port.is_open:
-                self.serial_port.write(data_bytes)
+                self.mux_for(field_number).write(data_bytes)
                 self.status_label.setText(f"Sent data for bootloader {field_number}")
                 self.status_label.setStyleSheet("font-size: 11px; color: #FF9800; padding: 5px;")
             else:
@@ -574,7 +1099,7 @@ class SerialNumberApp(QMainWindow):
             data_bytes = bytes(data)
             
             if self.serial_port and self.serial_port.is_open:
-                self.serial_port.write(data_bytes)
+                self.mux_for(field_number).write(data_bytes)
                 self.status_label.setText(f"Sent data for firmware {field_number}")
                 self.status_label.setStyleSheet("font-size: 11px; color: #FF9800; padding: 5px;")
             else:
@@ -597,7 +1122,8 @@ class SerialNumberApp(QMainWindow):
             
             # Send via serial port
             if self.serial_port and self.serial_port.is_open:
-                self.serial_port.write(data_bytes)
+                for port in {id(group.port.port): group.port for group in self.fixture.groups}.values():
+                    port.write(data_bytes)
                 print(f"Sent reset command: {' '.join([f'0x{b:02X}' for b in data_bytes])}")
                 
                 # Update status label
@@ -616,7 +1142,85 @@ class SerialNumberApp(QMainWindow):
                 f"Failed to send reset command\n\nError: {str(e)}"
             )
     
+    def lease_jobs(self):
+        """Fill the serial fields and file paths with jobs leased from the coordinator"""
+        try:
+            self.station_agent.register()
+            jobs, done = self.station_agent.lease(max_jobs=len(self.serial_inputs))
+        except Exception as e:
+            self.notifications.failure(f"Coordinator not reachable: {e}")
+            return
+
+        if not jobs:
+            self.notifications.info("Coordinator queue is empty" if done else "No jobs available yet")
+            return
+
+        try:
+            bootloader = self.station_agent.artifact_path(jobs[0].get("bootloader"))
+            firmware = self.station_agent.artifact_path(jobs[0].get("firmware"))
+        except Exception as e:
+            self.notifications.failure(f"Failed to fetch artifacts: {e}")
+            return
+        if bootloader:
+            self.bootloader_path.setText(bootloader)
+        if firmware:
+            self.firmware_path.setText(firmware)
+
+        self.leased_jobs = {}
+        for input_field in self.serial_inputs:
+            input_field.clear()
+        for input_field, job in zip(self.serial_inputs, jobs):
+            input_field.setText(job["serial_number"])
+            self.leased_jobs[job["serial_number"]] = job
+        self.lease_timer.start(int((self.station_agent.lease_timeout or 600) / 3 * 1000))
+        self.notifications.info(f"Leased {len(jobs)} job(s) from coordinator")
+
+    def renew_leases(self):
+        """Extend the coordinator leases of the jobs not reported yet, without blocking the UI"""
+        jobs = list(self.leased_jobs.values())
+        if not jobs:
+            self.lease_timer.stop()
+            return
+
+        def send():
+            try:
+                lost = self.station_agent.renew(jobs)
+            except Exception as e:
+                print(f"Failed to renew coordinator leases: {e}")
+                return
+            serials = [job["serial_number"] for job in jobs if job["job_id"] in lost]
+            if serials:
+                self.automation_signals.coordinator_error.emit(
+                    f"Coordinator lease lost for {', '.join(serials)}, the jobs may run on another station")
+
+        threading.Thread(target=send, daemon=True).start()
+
+    def on_coordinator_error(self, message):
+        self.notifications.failure(message)
+
+    def report_to_coordinator(self, serial_number, success, message):
+        """Send a DUT result to the coordinator without blocking the UI"""
+        job = self.leased_jobs.pop(serial_number, None)
+        if not self.station_agent or job is None:
+            return
+        duration = time.monotonic() - self.job_started
+
+        def send():
+            try:
+                self.station_agent.report(job, success, message, duration)
+            except Exception as e:
+                self.automation_signals.coordinator_error.emit(f"Failed to report {serial_number} to coordinator: {e}")
+
+        threading.Thread(target=send, daemon=True).start()
+
     def save_serial_numbers(self):
+        if self.streaming_checkbox.isChecked():
+            # Queue whatever was typed but not yet confirmed with Enter
+            for slot, input_field in enumerate(self.serial_inputs, 1):
+                if input_field.text().strip() and not input_field.isReadOnly():
+                    self.on_serial_entered(slot)
+            return
+
         # Collect all serial numbers
         serial_data = {}
         empty_count = 0
@@ -642,11 +1246,11 @@ class SerialNumberApp(QMainWindow):
         self.status_label.setText(f"✓ Saved {len(serial_data)} serial number(s)")
         self.status_label.setStyleSheet("font-size: 11px; color: #4CAF50; padding: 5px;")
         
-        msg = f"Serial numbers saved temporarily!\n\nEntries saved: {len(serial_data)}"
+        msg = f"Serial numbers saved: {len(serial_data)}"
         if empty_count > 0:
-            msg += f"\nEmpty fields: {empty_count}"
+            msg += f", empty fields: {empty_count}"
         
-        QMessageBox.information(self, "Success", msg)
+        self.notifications.info(msg)
         
         self.upload_package()
     
@@ -660,6 +1264,8 @@ class SerialNumberApp(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             for input_field in self.serial_inputs:
                 input_field.clear()
+                input_field.setReadOnly(False)
+                input_field.setStyleSheet("padding: 5px; font-size: 12px;")
                 for row_idx, _ in enumerate(self.bootloader_indicators):
 
                     self.bootloader_indicators[row_idx].setStyleSheet("""
@@ -702,8 +1308,171 @@ class SerialNumberApp(QMainWindow):
             self.firmware_path.setText(filename)
             print(f"Firmware selected: {filename}")
     
+    def begin_batch(self):
+        """Reset the results and throughput panel for a new batch"""
+        self.batch_results = []
+        self.batch_start = time.monotonic()
+        self.throughput.reset()
+        self.throughput_panel.start()
+
+    def on_serial_entered(self, slot):
+        """Enter in a serial field (typed or keyboard-wedge scan)"""
+        input_field = self.serial_inputs[slot - 1]
+        if self.streaming_checkbox.isChecked() and not input_field.isReadOnly():
+            serial_number = validate_serial(input_field.text(), self.serial_pattern)
+            if serial_number is None:
+                input_field.setStyleSheet("padding: 5px; font-size: 12px; border: 2px solid #f44336;")
+                self.notifications.failure(f"Slot {slot}: '{input_field.text().strip()}' is not a valid serial number")
+                input_field.selectAll()
+                return
+            input_field.setText(serial_number)
+            if not self.enqueue_slot(slot, serial_number):
+                return
+            input_field.setReadOnly(True)
+            input_field.setStyleSheet("padding: 5px; font-size: 12px; background-color: #E8F5E9;")
+
+        # Next empty field gets the focus for the next scan
+        for next_field in self.serial_inputs[slot:]:
+            if not next_field.text().strip():
+                next_field.setFocus()
+                break
+
+    def start_scanner(self, port):
+        try:
+            self.scanner = SerialScanner(port, parent=self)
+            self.scanner.scanned.connect(self.on_scanner_input)
+            self.scanner.error.connect(self.notifications.failure)
+            self.scanner.start()
+            self.notifications.info(f"Barcode scanner on {port}")
+        except serial.SerialException as e:
+            self.scanner = None
+            self.notifications.failure(f"Barcode scanner on {port} not available: {e}")
+
+    def on_scanner_input(self, text):
+        """Line from the serial-port scanner: goes into the first empty field"""
+        for slot, input_field in enumerate(self.serial_inputs, 1):
+            if not input_field.text().strip():
+                input_field.setText(text.strip())
+                self.on_serial_entered(slot)
+                return
+        self.notifications.failure(f"Scanned {text.strip()} but all slots are filled")
+
+    def enqueue_slot(self, slot, serial_number):
+        """Queue one DUT of the streaming intake, starting the worker if it is idle"""
+        bootloader = self.bootloader_path.text()
+        firmware = self.firmware_path.text()
+        if not bootloader or not firmware:
+            self.notifications.failure("Select the bootloader and firmware files before scanning")
+            return False
+        if not self.serial_port or not self.serial_port.is_open:
+            self.notifications.failure("Serial port is not connected! Please connect first.")
+            return False
+
+        pending = list(self.automation_queue) + list(self.pending_tasks)
+        if self.is_processing and self.current_task:
+            pending.append(self.current_task)
+        pending.extend(job.context for job in self.async_jobs)
+        if any(task['cycle_number'] == slot for task in pending):
+            self.notifications.failure(f"Slot {slot} is still queued")
+            return False
+        if any(task['serial_number'] == serial_number for task in pending):
+            self.notifications.failure(f"{serial_number} is already queued")
+            return False
+
+        if not self.is_processing:
+            self.begin_batch()
+        self.automation_queue.append({
+            'key': f"serial_{slot}",
+            'serial_number': serial_number,
+            'cycle_number': slot,
+            'bootloader': bootloader,
+            'firmware': firmware,
+            'profile_dir': self.profile_dir_for_files(bootloader, firmware)
+        })
+        self.notifications.info(f"Queued {serial_number} on slot {slot}")
+
+        if self.is_processing and self.async_core:
+            self.run_async_batch()
+        elif self.is_processing:
+            self.throughput_panel.remaining = len(self.automation_queue)
+            self.throughput_panel.refresh()
+        else:
+            self.process_next_in_queue()
+        return True
+
+    def profile_dir_for_files(self, bootloader, firmware):
+        """Browser profile for these files, the firmware hash is only computed when they change"""
+        if self.stream_files != (bootloader, firmware):
+            self.stream_files = (bootloader, firmware)
+            self.stream_profile_dir = profile_dir_for(firmware_key(bootloader, firmware))
+        return self.stream_profile_dir
+
+    def mark_bank_ready(self, bank):
+        """Ready button of a bank: its boards are loaded and its serials scanned"""
+        bootloader = self.bootloader_path.text()
+        firmware = self.firmware_path.text()
+        if not bootloader or not firmware:
+            self.notifications.failure("Select the bootloader and firmware files first")
+            return
+        if not self.serial_port or not self.serial_port.is_open:
+            self.notifications.failure("Serial port is not connected! Please connect first.")
+            return
+
+        tasks = []
+        for slot in bank.slots:
+            input_field = self.serial_inputs[slot - 1]
+            text = input_field.text().strip()
+            if not text:
+                continue
+            serial_number = validate_serial(text, self.serial_pattern)
+            if serial_number is None:
+                self.notifications.failure(f"Slot {slot}: '{text}' is not a valid serial number")
+                return
+            tasks.append({
+                'key': f"serial_{slot}",
+                'serial_number': serial_number,
+                'cycle_number': slot,
+                'bootloader': bootloader,
+                'firmware': firmware,
+                'profile_dir': self.profile_dir_for_files(bootloader, firmware)
+            })
+        if not tasks:
+            self.notifications.failure(f"{bank.label} has no serial numbers")
+            return
+
+        for slot in bank.slots:
+            self.serial_inputs[slot - 1].setReadOnly(True)
+        self.banks.mark_ready(bank, tasks)
+        self.notifications.info(f"{bank.label} ready with {len(tasks)} DUT(s)")
+        self.bank_panel.refresh()
+        if not self.is_processing:
+            self.process_next_in_queue()
+
+    def advance_banks(self):
+        """Queue is empty: close the running bank and switch to the next ready one without a gap"""
+        finished = self.banks.finish_running()
+        if finished:
+            self.show_batch_summary()
+            for slot in finished.slots:
+                # Fields are free for the next boards, the LEDs keep the result until the slot runs again
+                input_field = self.serial_inputs[slot - 1]
+                input_field.clear()
+                input_field.setReadOnly(False)
+            self.notifications.info(f"{finished.label} done - unload and reload it")
+
+        tasks = self.banks.start_next()
+        if tasks:
+            self.begin_batch()
+            self.automation_queue.extend(tasks)
+        self.bank_panel.refresh()
+        return finished
+
     def upload_package(self):
         """Prepare and start automation queue"""
+        if self.is_processing:
+            # A second batch would replace the queue of the running one
+            self.notifications.failure("A batch is already running, stop it or wait until it is done")
+            return
         print("=" * 50)
         print("Uploading package")
         print(f"Total Entries: {self.saved_data['total_entries']}")
@@ -727,22 +1496,145 @@ class SerialNumberApp(QMainWindow):
             QMessageBox.warning(self, "Serial Error", "Serial port is not connected! Please connect first.")
             return
         
-        # Build automation queue
-        self.automation_queue = []
-        cycle_number = 0x01
-        
+        # Shared browser cache for the device UI, keyed by bootloader + firmware
+        profile_dir = profile_dir_for(firmware_key(bootloader, firmware))
+
+        # Build automation queue, the slot is the field the serial was entered in
+        tasks = []
         for key, serial_number in self.saved_data['data'].items():
-            self.automation_queue.append({
+            tasks.append({
                 'key': key,
                 'serial_number': serial_number,
-                'cycle_number': cycle_number,
+                'cycle_number': int(key.split("_")[1]),
                 'bootloader': bootloader,
-                'firmware': firmware
+                'firmware': firmware,
+                'profile_dir': profile_dir
             })
-            cycle_number += 1
         
-        # Start processing queue
+        # Empty slots are found by the presence probe and skipped
+        self.start_with_presence_check(tasks)
+
+    def presence_probe(self):
+        """probe_for(group) giving the probe callable for probe_slots, None when there is no way to probe"""
+        if self.simulator:
+            return lambda group: self.simulator.programmer_for(group.probe).probe
+        if self.station_config.get("stlink_cli"):
+            return lambda group: stlink_probe(self.station_config["stlink_cli"], probe=group.probe)
+        return None
+
+    def start_with_presence_check(self, tasks):
+        probe = self.presence_probe()
+        if probe is None:
+            self.start_queue(tasks)
+            return
+        self.pending_tasks = tasks
+        self.is_processing = True
+        self.status_label.setText("⏳ Checking which slots hold a DUT...")
+        self.status_label.setStyleSheet("font-size: 11px; color: #2196F3; padding: 5px;")
+        self.cancel_token = CancelToken()
+        # A slot with several queued DUTs (simulated load) is probed once
+        slots = list(dict.fromkeys(task['cycle_number'] for task in tasks))
+        self.thread_pool.start(PresenceProbeJob(self.automation_signals, self.cancel_token, self.fixture, slots, probe))
+
+    def on_presence(self, present):
+        tasks = [task for task in self.pending_tasks if present.get(task['cycle_number'], True)]
+        skipped = [task['cycle_number'] for task in self.pending_tasks if not present.get(task['cycle_number'], True)]
+        self.pending_tasks = []
+        self.is_processing = False
+        if self.cancel_token and self.cancel_token.is_cancelled():
+            self.status_label.setText("⏹ Batch stopped")
+            return
+        if skipped:
+            self.notifications.info(f"No DUT in slot(s) {', '.join(map(str, skipped))} - skipped")
+        self.start_queue(tasks)
+
+    def start_queue(self, tasks):
+        self.begin_batch()
+        # DUTs scanned in while the presence probe ran stay queued behind the batch
+        slots = {task['cycle_number'] for task in tasks}
+        tasks = list(tasks) + [task for task in self.automation_queue if task['cycle_number'] not in slots]
+        self.automation_queue = list(tasks)
+        order = self.batch_order_combo.currentData()
+        if self.fixture and len(tasks) > 1 and not self.async_core:
+            if order == STAGE_MAJOR:
+                self.start_parallel_bootloaders(tasks)
+                return
+            if order == OVERLAP:
+                # Every next DUT on another mux, so its bootloader can run during the current web stage
+                self.automation_queue = interleave(self.fixture, tasks, key=lambda task: task['cycle_number'])
+        self.process_next_in_queue()
+
+    def bootloader_program_for(self, bootloader_path):
+        """program_for(group) of program_bootloaders: flash.bat (or the simulator) with the group's probe"""
+        def program_for(group):
+            if self.simulator:
+                programmer = self.simulator.programmer_for(group.probe)
+                return lambda cancel_token: programmer(bootloader_path, cancel_token)
+            command = flash_command(self.station_config["bat_file"], bootloader_path,
+                                    self.station_config["stlink_cli"] or None, group.probe)
+            timeout = DEFAULT_TIMEOUTS["bootloader"][0]
+            return lambda cancel_token: run_cancellable(command, cancel_token, timeout=timeout, shell=True)
+        return program_for
+
+    def start_parallel_bootloaders(self, tasks):
+        """Bootloader stage of all slots first, one probe per mux at the same time, then the web stages one by one"""
+        bootloaders = {task['bootloader'] for task in tasks}
+        slots = [task['cycle_number'] for task in tasks]
+        if len(bootloaders) != 1 or len(set(slots)) != len(slots):
+            # Each slot is programmed right before its own web stage
+            self.process_next_in_queue()
+            return
+        self.is_processing = True
+        self.status_label.setText(f"⏳ Programming bootloaders on {len(self.fixture.groups)} probe(s)...")
+        self.status_label.setStyleSheet("font-size: 11px; color: #2196F3; padding: 5px;")
+        self.cancel_token = CancelToken()
+        self.thread_pool.start(ParallelBootloaderJob(
+            self.automation_signals, self.cancel_token, self.fixture, slots,
+            self.bootloader_program_for(bootloaders.pop())))
+
+    def on_ahead_done(self, results):
+        """Slot programmed during the previous DUT's web stage"""
+        task, self.ahead_task = self.ahead_task, None
+        self.ahead_token = None
+        if task is not None and task['cycle_number'] in results:
+            task['bootloader_result'] = results[task['cycle_number']]
+        if self.waiting_for_bootloader:
+            self.waiting_for_bootloader = False
+            self.process_next_in_queue()
+
+    def on_bootloaders_done(self, results):
+        for task in self.automation_queue:
+            if task['cycle_number'] in results:
+                task['bootloader_result'] = results[task['cycle_number']]
+        if self.cancel_token and self.cancel_token.is_cancelled():
+            self.is_processing = False
+            self.status_label.setText("⏹ Batch stopped")
+            return
         self.process_next_in_queue()
+
+    def poll_mux_events(self):
+        """Read fixture events (lid, start button) the mux sends between our commands"""
+        port = self.serial_port
+        if not port or not port.is_open:
+            return
+        try:
+            waiting = port.in_waiting
+            if not waiting:
+                return
+            events = self.mux_events.feed(port.read(waiting))
+        except Exception as e:
+            print(f"Reading mux events failed: {e}")
+            return
+
+        for event in events:
+            print(f"Fixture event: {event}")
+            if event not in ("lid_closed", "start_button") or not self.auto_start_checkbox.isChecked():
+                continue
+            if self.is_processing:
+                self.notifications.info(f"Fixture {event.replace('_', ' ')} ignored, batch is running")
+                continue
+            self.notifications.info(f"Fixture {event.replace('_', ' ')} - starting batch")
+            self.save_serial_numbers()
     
 
 
@@ -785,14 +1677,80 @@ class SerialNumberApp(QMainWindow):
                 }
             """)
 
+    def show_quarantine(self, slot, reason):
+        label = self.slot_labels[slot - 1]
+        if reason:
+            label.setStyleSheet("font-size: 12px; color: #f44336; font-weight: bold;")
+            label.setToolTip(f"Quarantined: {reason}")
+        else:
+            label.setStyleSheet("font-size: 12px;")
+            label.setToolTip("")
+
+    def release_quarantine(self):
+        """Operator repaired the fixture: quarantined slots start over with a clean history"""
+        slots = list(self.slot_health.quarantined())
+        if not slots:
+            self.notifications.info("No slot is quarantined")
+            return
+        self.slot_health.release(timing_history=self.timing_history)
+        self.slot_health.save()
+        self.timing_history.save()
+        for slot in slots:
+            self.show_quarantine(slot, None)
+        self.notifications.info(f"Released slot(s) {', '.join(map(str, slots))}")
+
+    def skip_quarantined(self):
+        """Drop queued tasks of quarantined slots, so a bad channel does not burn a DUT timeout every cycle"""
+        if not self.skip_quarantined_checkbox.isChecked():
+            return
+        quarantined = self.slot_health.quarantined()
+        skipped = [task for task in self.automation_queue if task['cycle_number'] in quarantined]
+        if not skipped:
+            return
+        self.automation_queue = [task for task in self.automation_queue if task['cycle_number'] not in quarantined]
+        if self.ahead_task is not None and self.ahead_task['cycle_number'] in quarantined:
+            # Its job winds down on its own, on_ahead_done finds nothing to attach the result to
+            self.ahead_task = None
+            self.ahead_token.cancel()
+        for task in skipped:
+            slot = task['cycle_number']
+            self.notifications.failure(f"Skipped {task['serial_number']}: slot {slot} is quarantined ({quarantined[slot]})")
+            self.serial_inputs[slot - 1].setReadOnly(False)
+
     def process_next_in_queue(self):
+        bank_finished = None
+        self.skip_quarantined()
+        if not self.automation_queue and self.banks:
+            bank_finished = self.advance_banks()
+            self.skip_quarantined()
+
         if not self.automation_queue:
             print("\n" + "=" * 50)
             print("All automation tasks completed!")
             print("=" * 50)
-            self.status_label.setText("✓ All tasks completed")
-            self.status_label.setStyleSheet("font-size: 11px; color: #4CAF50; padding: 5px;")
             self.is_processing = False
+            self.throughput_panel.remaining = 0
+            self.throughput_panel.stop()
+            if not bank_finished:
+                self.show_batch_summary()
+            self.watchdog.reap_orphans(self.browser_executables())
+            self.timing_history.save()
+            self.slot_health.save()
+            self.mux_trace.flush()
+            if self.profiler:
+                self.profiler.merge()
+            if self.lag_monitor:
+                print(f"Max Qt event loop lag: {self.lag_monitor.max_lag * 1000:.0f} ms, "
+                      f"{len(self.lag_monitor.stalls)} stall(s) logged")
+            return
+
+        if self.async_core:
+            self.run_async_batch()
+            return
+
+        if self.automation_queue[0] is self.ahead_task:
+            # Its bootloader is still being programmed on the other mux, on_bootloaders_done continues
+            self.waiting_for_bootloader = True
             return
         
         # Get next task
@@ -801,6 +1759,12 @@ class SerialNumberApp(QMainWindow):
         
         # Reset indicators for this row
         row_idx = task['cycle_number'] - 1
+        self.current_task = task
+        self.job_started = time.monotonic()
+        self.metrics.job_started(task['cycle_number'])
+        self.throughput.job_started(task['cycle_number'])
+        self.throughput_panel.remaining = len(self.automation_queue)
+        self.throughput_panel.refresh()
         self.bootloader_indicators[row_idx].setStyleSheet("""
             background-color: #999;
             border-radius: 9px;
@@ -818,34 +1782,146 @@ class SerialNumberApp(QMainWindow):
         self.status_label.setText(f"⏳ Processing {task['serial_number']}...")
         self.status_label.setStyleSheet("font-size: 11px; color: #2196F3; padding: 5px;")
         
-        # Create and start thread
-        self.current_thread = AutomationThread(
+        # Queue the job on the worker pool, with a fresh cancellation token
+        self.cancel_token = CancelToken()
+        self.current_job = AutomationJob(
+            signals=self.automation_signals,
+            cancel_token=self.cancel_token,
             serial_number=task['serial_number'],
             bootloader_path=task['bootloader'],
             firmware_path=task['firmware'],
-            bat_file=r"D:\MULTIPROGRAMMER\flash.bat",
-            driver_path=r"D:\MULTIPROGRAMMER\chromedriver-win64\chromedriver-win64\chromedriver.exe",
-            chromefortestbinary_path = r"D:\MULTIPROGRAMMER\chrome-win64\chrome-win64\chrome.exe",
+            bat_file=self.station_config["bat_file"],
+            driver_path=self.station_config["driver_path"],
+            chromefortestbinary_path=self.station_config["chrome_path"],
             cycle_number=task['cycle_number'],
-            serial_port=self.serial_port,
-            row_index=task['cycle_number'] - 1 
+            serial_port=self.mux_for(task['cycle_number']),
+            row_index=task['cycle_number'] - 1,
+            profile_dir=task['profile_dir'],
+            timeouts=self.timing_history.timeouts_for(task['cycle_number']),
+            automate_function=self.automate_function,
+            automate_kwargs={**self.automate_kwargs, **self.fixture_kwargs(task)},
+            profiler=self.profiler
         )
         
-        # Connect signals
-        self.current_thread.progress.connect(self.on_automation_progress)
-        self.current_thread.finished.connect(self.on_automation_finished)
-        self.current_thread.bootloader_status.connect(self.update_bootloader_status)
-        self.current_thread.serial_verify_status.connect(self.update_serial_verify_status)
-        
-        # Start thread
-        self.current_thread.start()
+        self.thread_pool.start(self.current_job)
+        self.program_ahead(task)
     
+    def program_ahead(self, task):
+        """Overlap order: program the next queued slot on the second thread while this DUT runs its web stage"""
+        if self.batch_order_combo.currentData() != OVERLAP or not self.fixture or not self.automation_queue:
+            return
+        if self.ahead_token is not None:
+            # The previous ahead job is still running, one at a time next to the DUT job
+            return
+        following = self.automation_queue[0]
+        if following.get('bootloader_result') is not None \
+                or overlap_slot(self.fixture, task['cycle_number'], [following['cycle_number']]) is None:
+            return
+        self.ahead_task = following
+        self.ahead_token = CancelToken()
+        self.thread_pool.start(ParallelBootloaderJob(
+            self.automation_signals, self.ahead_token, self.fixture, [following['cycle_number']],
+            self.bootloader_program_for(following['bootloader']), done=self.automation_signals.ahead_done))
+
+    def fixture_kwargs(self, task):
+        """Probe (and simulated programmer) of the task's slot, and its bootloader result if already programmed"""
+        kwargs = {}
+        if self.fixture and self.fixture.parallel:
+            probe = self.fixture.probe_for(task['cycle_number'])
+            kwargs["probe"] = probe
+            if self.simulator:
+                kwargs["programmer"] = self.simulator.programmer_for(probe)
+        if task.get('bootloader_result') is not None:
+            kwargs["bootloader_result"] = task['bootloader_result']
+        return kwargs
+
+    def run_async_batch(self):
+        """Hand the queue to the async core, its state transitions come back through on_dut_state"""
+        # One DUT per slot in flight, a slot's next DUT waits for the next round
+        busy = {job.slot for job in self.async_jobs}
+        tasks = []
+        for task in list(self.automation_queue):
+            if task['cycle_number'] not in busy:
+                busy.add(task['cycle_number'])
+                tasks.append(task)
+                self.automation_queue.remove(task)
+        self.is_processing = True
+        self.cancel_token = CancelToken()
+        for task in tasks:
+            slot = task['cycle_number']
+            group = self.fixture.group_for(slot)
+            job = dut_machine.DutJob(task['serial_number'], slot, task['firmware'], group.port,
+                                     self.bootloader_program_for(task['bootloader'])(group),
+                                     timeouts=self.timing_history.timeouts_for(slot),
+                                     budget=self.station_config["dut_budget"], context=task)
+            self.bootloader_indicators[slot - 1].setStyleSheet("""
+                background-color: #999;
+                border-radius: 9px;
+                border: 1px solid #666;
+            """)
+            self.serial_verify_indicators[slot - 1].setStyleSheet("""
+                background-color: #999;
+                border-radius: 9px;
+                border: 1px solid #666;
+            """)
+            self.async_jobs.append(job)
+            self.async_core.submit(job)
+        self.throughput_panel.remaining = len(self.async_jobs) + len(self.automation_queue)
+        self.throughput_panel.refresh()
+        self.status_label.setText(f"⏳ {len(self.async_jobs)} DUT(s) in flight...")
+        self.status_label.setStyleSheet("font-size: 11px; color: #2196F3; padding: 5px;")
+
+    def on_dut_state(self, job, state, previous, seconds, detail):
+        """One state transition of an async DUT, drives the LEDs, stage timings and results"""
+        slot = job.slot
+        task = job.context
+        failed = state == dut_machine.FAILED
+        if previous in dut_machine.STAGE_NAMES and not failed:
+            self.automation_signals.stage_timing.emit(slot, dut_machine.STAGE_NAMES[previous], seconds)
+
+        if state == dut_machine.MUX_SELECT:
+            task['started'] = time.monotonic()
+            self.metrics.job_started(slot)
+            self.throughput.job_started(slot)
+            print(f"\nProcessing {task['key']}: {task['serial_number']} (Cycle 0x{slot:02X})")
+        elif state == dut_machine.SERVICE_SELECT:
+            self.status_label.setText(f"⏳ Processing {task['serial_number']}, "
+                                      f"{len(self.async_jobs)} DUT(s) in flight...")
+        if previous == dut_machine.BOOTLOADER:
+            self.update_bootloader_status(slot - 1, not failed)
+        elif previous == dut_machine.VERIFY:
+            self.update_serial_verify_status(slot - 1, not failed)
+
+        if state not in (dut_machine.DONE, dut_machine.FAILED):
+            return
+        self.async_jobs.remove(job)
+        self.current_task = task
+        self.job_started = task.get('started', time.monotonic())
+        self.record_result(job.serial_number, not failed, detail)
+        self.current_task = None
+        self.throughput_panel.remaining = len(self.async_jobs) + len(self.automation_queue)
+        if not self.async_jobs:
+            # Next bank or batch end
+            self.process_next_in_queue()
+
     def on_automation_progress(self, message):
         """Handle progress updates from automation thread"""
         print(message)
     
+    def on_stage_timing(self, cycle_number, stage, seconds):
+        """Record a measured stage duration for timeout calibration"""
+        print(f"DUT {cycle_number} stage {stage}: {seconds:.2f} s")
+        self.timing_history.record(stage, cycle_number, seconds)
+
     def on_automation_finished(self, serial_number, success, message):
         """Handle automation thread completion"""
+        self.record_result(serial_number, success, message)
+
+        # Process next item in queue
+        self.process_next_in_queue()
+
+    def record_result(self, serial_number, success, message):
+        """Status, counters and reports of the finished current_task"""
         if success:
             print(f"{serial_number} Successfully processed")
             self.status_label.setText(f"Completed {serial_number}")
@@ -854,19 +1930,140 @@ class SerialNumberApp(QMainWindow):
             print(f"Error processing {serial_number}: {message}")
             self.status_label.setText(f"Failed {serial_number}")
             self.status_label.setStyleSheet("font-size: 11px; color: #f44336; padding: 5px;")
-            QMessageBox.warning(
-                self,
-                "Processing Error",
-                f"Failed to process {serial_number}\n\nError: {message}"
-            )
-        
-        # Process next item in queue
-        self.process_next_in_queue()
+            self.notifications.failure(f"Failed {serial_number}: {message}")
+
+        self.batch_results.append((serial_number, success, message))
+        self.metrics.on_finished(self.current_task['cycle_number'], success)
+        self.throughput.job_finished(self.current_task['cycle_number'], success)
+        if self.banks:
+            self.banks.record(self.current_task['cycle_number'], success)
+            self.bank_panel.refresh()
+        self.check_slot_health(self.current_task['cycle_number'], success)
+        self.report_to_coordinator(serial_number, success, message)
+        self.report_to_mes(self.current_task, success, message)
+        self.check_http_script(success)
     
+    def check_http_script(self, success):
+        """Switch to the recorded script once a recording run passed, warn when the replay diverged"""
+        record_path = self.automate_kwargs.get("record_script")
+        if record_path and success and os.path.exists(record_path):
+            del self.automate_kwargs["record_script"]
+            self.http_script = HttpReplay(load_script(record_path))
+            self.automate_kwargs["http_script"] = self.http_script
+            self.notifications.info(f"HTTP script recorded to {record_path}, next DUTs run without the browser")
+        elif self.http_script and self.http_script.divergences:
+            self.notifications.failure(f"HTTP replay diverged on {self.http_script.divergences} of "
+                                       f"{self.http_script.replays} DUT(s), the browser took over")
+            self.http_script.divergences = 0
+            self.http_script.replays = 0
+
+    def report_to_mes(self, task, success, message):
+        """Queue the DUT record for the MES uploader, only a local SQLite insert on this thread"""
+        if not self.mes:
+            return
+        finished = time.time()
+        started = finished - (time.monotonic() - self.job_started)
+        self.mes.submit({
+            "serial_number": task['serial_number'],
+            "station_id": self.station_id,
+            "slot": task['cycle_number'],
+            "bootloader": os.path.basename(task['bootloader']),
+            "firmware": os.path.basename(task['firmware']),
+            "result": "pass" if success else "fail",
+            "message": message,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(finished)),
+        })
+        self.refresh_mes_status()
+
+    def refresh_mes_status(self):
+        backlog = self.mes.backlog
+        rejected = self.mes.rejected
+        if rejected > self.mes_rejected_seen:
+            self.notifications.failure(
+                f"MES rejected {rejected - self.mes_rejected_seen} result(s), kept as dead letters in {self.mes.queue.path}")
+            self.mes_rejected_seen = rejected
+        if self.mes.last_error:
+            self.mes_label.setText(f"MES unreachable, {backlog} result(s) queued locally ({self.mes.last_error})")
+            self.mes_label.setStyleSheet("font-size: 11px; color: #f44336; padding: 0 10px;")
+        else:
+            self.mes_label.setText(f"MES: {self.mes.sent} sent, backlog {backlog}, rejected {rejected}")
+            self.mes_label.setStyleSheet("font-size: 11px; color: #666; padding: 0 10px;")
+
+    def check_slot_health(self, slot, success):
+        """Record the outcome and warn once when the slot drifts into quarantine"""
+        was_quarantined = slot in self.slot_health.quarantined()
+        self.slot_health.record(slot, success)
+        reason = self.slot_health.check(slot, self.timing_history, STAGE_ORDER)
+        if reason and not was_quarantined:
+            self.show_quarantine(slot, reason)
+            self.notifications.failure(f"Slot {slot} quarantined: {reason} - check its pogo pins and cable")
+
+    def show_batch_summary(self):
+        """Summarise the finished batch in the status label and notification panel"""
+        summary, passed = self.notifications.batch_summary(self.batch_results, time.monotonic() - self.batch_start)
+        print(summary)
+        if passed:
+            self.status_label.setText(f"✓ {summary}")
+            self.status_label.setStyleSheet("font-size: 11px; color: #4CAF50; padding: 5px;")
+        else:
+            self.status_label.setText(f"⚠ {summary}")
+            self.status_label.setStyleSheet("font-size: 11px; color: #f44336; padding: 5px;")
+
+    def start_simulated_load(self, dut_count):
+        """Queue dut_count virtual DUTs round-robin over the slots (simulator only)"""
+        self.serial_port = self.open_mux(self.simulator.mux.port)
+        self.fixture = self.build_fixture(self.serial_port)
+        self.automation_queue = []
+        slot_count = len(self.serial_inputs)
+        firmware = self.simulator.firmware_file()
+        tasks = []
+        for i in range(dut_count):
+            cycle_number = (i % slot_count) + 1
+            tasks.append({
+                'key': f"sim_{i + 1}",
+                'serial_number': f"SIM{i + 1:06d}",
+                'cycle_number': cycle_number,
+                'bootloader': "sim_bootloader.bin",
+                'firmware': firmware,
+                'profile_dir': None
+            })
+        self.notifications.info(f"Simulated load: {dut_count} virtual DUTs queued")
+        # Same path as Upload Package: presence probe, then the selected batch order
+        self.start_with_presence_check(tasks)
+
+    def stop_batch(self):
+        """Drop the remaining queue and cancel the running DUT job"""
+        if not self.is_processing:
+            return
+        print("Stopping batch...")
+        self.automation_queue = []
+        if self.banks:
+            for bank in self.banks.cancel():
+                for slot in bank.slots:
+                    self.serial_inputs[slot - 1].setReadOnly(False)
+            self.bank_panel.refresh()
+        if self.cancel_token:
+            self.cancel_token.cancel()
+        if self.ahead_token:
+            self.ahead_token.cancel()
+        if self.async_core:
+            self.async_core.cancel()
+        self.status_label.setText("⏹ Stopping batch...")
+        self.status_label.setStyleSheet("font-size: 11px; color: #FF9800; padding: 5px;")
+
+    def save_evidence(self, name, files):
+        """Called on the worker thread, returns the path the zip will be written to"""
+        files["mux_frames.txt"] = self.mux_frame_log.dump()
+        return self.evidence_writer.submit(name, files)
+
+    def browser_executables(self):
+        return [self.station_config["driver_path"], self.station_config["chrome_path"]]
+
     def closeEvent(self, event):
         """Handle window close event"""
-        # Wait for current thread to finish
-        if self.current_thread and self.current_thread.isRunning():
+        # Cancel the running job and wait for the worker to wind down
+        if self.is_processing:
             reply = QMessageBox.question(
                 self,
                 "Task Running",
@@ -878,10 +2075,24 @@ class SerialNumberApp(QMainWindow):
                 event.ignore()
                 return
             
-            self.current_thread.terminate()
-            self.current_thread.wait()
+            self.stop_batch()
+        self.thread_pool.waitForDone(5000)
+        if self.async_core:
+            self.async_core.stop()
+
+        # Nothing started by this app may survive it
+        self.watchdog.stop()
+        self.evidence_writer.flush()
+        if self.mes:
+            self.mes.stop()
+        self.mux_trace.flush()
+        if self.scanner:
+            self.scanner.stop()
+        self.watchdog.reap_orphans(self.browser_executables())
         
         # Close serial port
+        if self.fixture:
+            self.fixture.close()
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             print("Serial port closed on exit")
@@ -889,7 +2100,7 @@ class SerialNumberApp(QMainWindow):
         event.accept()
 
 
-def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
+def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30, cancel_token=None):
     """
     Wait for the device's web server to be ready by attempting TCP connection
     Returns True if device is ready, False if timeout
@@ -909,7 +2120,11 @@ def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
         except:
             pass
         
-        time.sleep(0.5)  # Check every 0.5 seconds
+        # Check every 0.5 seconds
+        if cancel_token:
+            cancel_token.sleep(0.5)
+        else:
+            time.sleep(0.5)
     
     return False
 
@@ -924,31 +2139,78 @@ def automate_device(serial_number,
                     serial_verify_callback,
                     serial_port,
                     cycle_number,
+                    profile_dir=None,
+                    progress_callback=None,
+                    stage_callback=None,
+                    timeouts=None,
+                    cancel_token=None,
+                    device_ip="192.168.0.100",
+                    device_port=80,
+                    programmer=None,
+                    stlink_cli=None,
+                    watchdog=None,
+                    budget=DUT_BUDGET,
+                    evidence_callback=None,
+                    http_script=None,
+                    record_script=None,
+                    probe="",
+                    bootloader_result=None,
                     ):
 
     # bat_file = bat_file
     driver = None
+    watched_pid = None
+    upload_bootloader = None
+
+    # Calibrated timeouts from TimingHistory, hard-coded defaults for anything missing
+    timeouts = dict(timeouts or {})
+    for stage, (default, _floor) in DEFAULT_TIMEOUTS.items():
+        timeouts.setdefault(stage, default)
+
+    base_url = f"http://{device_ip}" if device_port == 80 else f"http://{device_ip}:{device_port}"
+    replay_params = {"serial_number": serial_number, "username": "admin", "password": "admin"}
+    recorder = None
+
+    # Every wait below goes through the token so "Stop batch" returns quickly
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    # One time budget for the whole DUT, every wait below is capped at what is left of it
+    deadline = Deadline(budget, cancel_token)
+
+    def quit_driver():
+        if driver is not None:
+            driver.quit()
+
+    def report_stage(stage, started):
+        cancel_token.check()
+        if stage_callback:
+            stage_callback(stage, time.monotonic() - started)
 
     try:
-        
-        data_bytes_before_bootloader = bytes([0x41, 0x01, 0xFF, 0x0D])
-        serial_port.write(data_bytes_before_bootloader)
-        time.sleep(1)
-        
-        # FIRST SERIAL COMMAND - Before bootloader upload
-        data_bootloader = [0x41, 0x01, cycle_number, 0x0D]
-        data_bytes_bootloader = bytes(data_bootloader)
-        serial_port.write(data_bytes_bootloader)
-        time.sleep(1)
-        
-        # Upload bootloader
-        command = f'"{bat_file}" "{bootloader_path}"'
-        upload_bootloader = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-        )
+        stage_start = None
+        if bootloader_result is not None:
+            # Already programmed by the parallel bootloader stage of a multi-probe fixture
+            upload_bootloader = bootloader_result
+        else:
+            data_bytes_before_bootloader = bytes([0x41, 0x01, 0xFF, 0x0D])
+            serial_port.write(data_bytes_before_bootloader)
+            cancel_token.sleep(1)
+        
+            # FIRST SERIAL COMMAND - Before bootloader upload
+            data_bootloader = [0x41, 0x01, cycle_number, 0x0D]
+            data_bytes_bootloader = bytes(data_bootloader)
+            serial_port.write(data_bytes_bootloader)
+            cancel_token.sleep(1)
+        
+            # Upload bootloader
+            stage_start = deadline.enter("bootloader")
+            if programmer is not None:
+                # Simulator or other stand-in for flash.bat
+                upload_bootloader = programmer(bootloader_path, cancel_token)
+            else:
+                command = flash_command(bat_file, bootloader_path, stlink_cli, probe)
+                upload_bootloader = run_cancellable(command, cancel_token, timeout=deadline.cap(timeouts["bootloader"]), shell=True)
         
         if upload_bootloader.stderr:
             print("STDERR:", upload_bootloader.stderr)
@@ -957,10 +2219,13 @@ def automate_device(serial_number,
         if not boot_ok:
             serial_verify_callback(False)
             raise Exception("Bootloader upload failed")
+        if stage_start is not None:
+            report_stage("bootloader", stage_start)
         
+        # Mux settle delays are not observable from here, they stay fixed
         data_bytes_before_firmware = bytes([0x41, 0x01, 0xFF, 0x0D])
         serial_port.write(data_bytes_before_firmware)
-        time.sleep(2)
+        cancel_token.sleep(2)
         
        
         # SECOND SERIAL COMMAND - Before web service/automation
@@ -969,69 +2234,118 @@ def automate_device(serial_number,
         serial_port.write(data_bytes_service)
         
         # CRITICAL FIX: Wait for device web server to actually be ready
-        if not wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
+        stage_start = deadline.enter("readiness")
+        if not wait_for_device_ready(ip=device_ip, port=device_port, timeout=deadline.cap(timeouts["readiness"]), cancel_token=cancel_token):
             raise Exception("Device web server did not become ready in time")
+        report_stage("readiness", stage_start)
 
-        # Now that device is confirmed ready, start browser
-        options = Options()
-        options.binary_location = chromefortestbinary_path
-        options.page_load_strategy = 'eager'
-        options.add_argument('--disable-gpu')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-extensions')
+        # A script derived from an earlier recorded run replaces the browser, any divergence falls back to it
+        replay_session = None
+        if http_script is not None:
+            stage_start = deadline.enter("http_replay")
+            try:
+                replay_session = http_script.run(
+                    base_url, replay_params, firmware_path, cancel_token,
+                    reboot_timeout=deadline.cap(timeouts["upload_total"]), progress_callback=progress_callback)
+                report_stage("http_replay", stage_start)
+            except ReplayDiverged as e:
+                print(f"{e}, falling back to the browser")
+                if progress_callback:
+                    progress_callback(f"{e}, falling back to the browser")
 
-        service = Service(driver_path)
-        driver = webdriver.Chrome(service=service, options=options)
+        if replay_session is None:
+            # Now that device is confirmed ready, start browser
+            stage_start = deadline.enter("browser_start")
+            options = Options()
+            options.binary_location = chromefortestbinary_path
+            options.page_load_strategy = 'eager'
+            options.add_argument('--disable-gpu')
+            options.add_argument('--no-sandbox')
+            options.add_argument('--disable-dev-shm-usage')
+            options.add_argument('--disable-extensions')
+            enable_network_events(options)
+            if profile_dir:
+                add_cache_arguments(options, profile_dir)
 
-        # Navigate to factory config page
-        driver.get("http://192.168.0.100/factoryconfig")
-        
-        # Wait for page to be fully loaded
-        WebDriverWait(driver, 5).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
-        )
+            service = Service(driver_path)
+            driver = webdriver.Chrome(service=service, options=options)
+            if record_script:
+                # Record mode: everything the SPA sends becomes the HTTP script for later DUTs
+                recorder = NetworkRecorder(driver)
+            if watchdog:
+                watched_pid = watchdog.track(service.process.pid, label=serial_number)
+            # Quitting the browser aborts whatever WebDriver call is blocking
+            cancel_token.on_cancel(quit_driver)
+            if profile_dir:
+                clear_device_session(driver, base_url)
+            report_stage("browser_start", stage_start)
 
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[name="serialnumber"]'))
-        )
-
-        
-        driver.find_element(By.CSS_SELECTOR, 'input[name="serialnumber"]').clear()
-        driver.find_element(By.CSS_SELECTOR, 'input[name="serialnumber"]').send_keys(serial_number)
-        driver.find_element(By.CSS_SELECTOR, 'input[type="submit"][value="Update"]').click()
-        time.sleep(0.5)
-        
-        driver.find_element(By.XPATH, '//button[text()="Exit to bootloader"]').click()
+            # Navigate to factory config page
+            stage_start = deadline.enter("page_load")
+            driver.get(f"{base_url}/factoryconfig")
         
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "Upload-FW"))
-        )
-        time.sleep(0.5)
-        
-        file_input = driver.find_element(By.ID, "Upload-FW")
-        file_input.send_keys(firmware_path)
-        driver.find_element(By.CSS_SELECTOR, "div.fws-btn.fws-btn-upload").click()
-        time.sleep(0.5)
-        
-        # The firmware upload and device reboot takes ~15 seconds - this is hardware limitation
-        WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Username"]'))
-        )
+            # Wait for page to be fully loaded
+            WebDriverWait(driver, deadline.cap(timeouts["page_load"])).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+            report_stage("page_load", stage_start)
+
+            # Set serial and submit in one script round trip
+            stage_start = deadline.enter("set_serial")
+            page_actions.set_serial_number(driver, serial_number, timeout=deadline.cap(timeouts["set_serial"]))
+            report_stage("set_serial", stage_start)
+        
+            # One stage timeout for both waits, the second one gets what the first left over
+            stage_start = deadline.enter("exit_to_bootloader")
+            stage_timeout = deadline.cap(timeouts["exit_to_bootloader"])
+            WebDriverWait(driver, stage_timeout).until(
+                EC.element_to_be_clickable((By.XPATH, '//button[text()="Exit to bootloader"]'))
+            ).click()
+        
+            WebDriverWait(driver, deadline.cap(max(0.0, stage_timeout - (time.monotonic() - stage_start)))).until(
+                EC.presence_of_element_located((By.ID, "Upload-FW"))
+            )
+            report_stage("exit_to_bootloader", stage_start)
+            cancel_token.sleep(0.5)
         
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Username"]').send_keys("admin")
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Password"]').send_keys("admin")
-        time.sleep(0.5)
-        driver.find_element(By.XPATH, '//span[text()="Login"]').click()
-        time.sleep(3)
+            deadline.enter("upload")
+            file_input = driver.find_element(By.ID, "Upload-FW")
+            file_input.send_keys(firmware_path)
+
+            # The firmware upload and device reboot takes ~15 seconds - this is hardware limitation.
+            # Follow upload -> flash write -> reboot through CDP so we move on as soon as login is back
+            upload_monitor = UploadMonitor(driver, ip=device_ip, port=device_port, progress_callback=progress_callback, cancel_token=cancel_token, recorder=recorder)
+            if recorder:
+                recorder.mark_upload()
+            upload_monitor.arm()
+            driver.find_element(By.CSS_SELECTOR, "div.fws-btn.fws-btn-upload").click()
+            for stage, seconds in upload_monitor.wait(timeout=deadline.cap(timeouts["upload_total"])).items():
+                if stage_callback:
+                    stage_callback("upload_total" if stage == "total" else stage, seconds)
+        
+            stage_start = deadline.enter("login")
+            page_actions.login(driver, replay_params["username"], replay_params["password"], timeout=deadline.cap(timeouts["login"]))
+            report_stage("login", stage_start)
         
         try:
-            driver.get("http://192.168.0.100/config.json")
-            time.sleep(0.5)
-            
-            json_text = driver.find_element(By.TAG_NAME, "body").text
-            data = json.loads(json_text)
-            serial_number_from_device = data["deviceInfo"]["serialNumber"]
+            # Read config.json as soon as the session allows it instead of a fixed 3 s sleep
+            stage_start = deadline.enter("verify")
+            verify_timeout = deadline.cap(timeouts["verify"])
+            while True:
+                try:
+                    if replay_session is not None:
+                        data = read_json(replay_session, base_url, "/config.json")
+                    else:
+                        driver.get(no_cache_url(f"{base_url}/config.json"))
+                        json_text = driver.find_element(By.TAG_NAME, "body").text
+                        data = json.loads(json_text)
+                    serial_number_from_device = data["deviceInfo"]["serialNumber"]
+                    break
+                except Exception:
+                    if (time.monotonic() - stage_start) > verify_timeout:
+                        raise
+                    cancel_token.sleep(0.25)
+            report_stage("verify", stage_start)
             
             print(f"Serial Number memory: {serial_number}")
             print(f"Serial Number from device: {serial_number_from_device}")
@@ -1042,24 +2356,121 @@ def automate_device(serial_number,
         except Exception as e:
             print(f"Failed to verify serial number: {e}")
             serial_verify_callback(False)
+            raise Exception(f"Serial number verification failed: {e}")
+
+        if not sn_match:
+            raise Exception(f"Serial number mismatch, device reports {serial_number_from_device}")
+
+        if recorder:
+            recorder.poll()
+            save_script(derive_script(recorder, base_url, replay_params, firmware_path), record_script)
+            print(f"HTTP script with {len(load_script(record_script)['steps'])} step(s) saved to {record_script}")
         
 
     except Exception as e:
+        # Snapshot while the browser is still open, compressing and writing happen in the background
+        evidence = None
+        if evidence_callback and (deadline.is_over() or not cancel_token.is_cancelled()):
+            live_driver = None if cancel_token.is_cancelled() else driver
+            evidence = evidence_callback(f"{serial_number}_slot{cycle_number}",
+                                         capture_failure(e, live_driver, upload_bootloader))
+        if deadline.is_over():
+            # The deadline cancelled the token, report where the time ran out
+            error = deadline.exceeded()
+            error.evidence = evidence
+            print(f"Automation error: {error}")
+            serial_verify_callback(False)
+            raise error from e
+        if cancel_token.is_cancelled():
+            # Browser errors after a cancel are only a side effect of quitting it
+            raise Cancelled("Cancelled by operator")
         print(f"Automation error: {e}")
         serial_verify_callback(False)
+        e.evidence = evidence
+        # Let AutomationJob report the failure to the queue
+        raise
     
     finally:
+        deadline.stop()
+        cancel_token.remove_callback(quit_driver)
         if driver is not None:
             try:
                 driver.quit()
-            except:
-                pass
+            except Exception as e:
+                print(f"driver.quit() failed: {e}")
+        if watched_pid:
+            # Whatever quit() left behind is killed by the watchdog after its grace period
+            watchdog.release(watched_pid)
 
 
 
 def main():
-    app = QApplication(sys.argv)
-    window = SerialNumberApp()
+    parser = argparse.ArgumentParser(description="Bootloader / firmware programming station")
+    parser.add_argument("--coordinator", help="URL of coordinator.py to lease jobs from")
+    parser.add_argument("--station-id", help="name reported to the coordinator (default: hostname)")
+    parser.add_argument("--simulate", action="store_true", help="run against a virtual mux, programmer and device")
+    parser.add_argument("--sim-failure-rate", type=float, default=0.0, help="per-step failure probability of virtual DUTs")
+    parser.add_argument("--sim-latency", type=float, default=1.0, help="scale factor for all simulated latencies")
+    parser.add_argument("--sim-empty-slots", default="", help="comma separated slots without a DUT")
+    parser.add_argument("--sim-no-browser", action="store_true", help="drive the virtual device over plain HTTP")
+    parser.add_argument("--sim-duts", type=int, default=0, help="queue this many virtual DUTs at startup")
+    parser.add_argument("--sim-muxes", type=int, default=1, help="split the virtual slots over this many muxes, each with its own probe")
+    parser.add_argument("--sim-settle", type=float, default=0.0, help="relay settle time of the virtual mux in seconds")
+    parser.add_argument("--sim-events", default="", help="scripted fixture events, e.g. 10:lid_closed,60:start_button")
+    parser.add_argument("--config", default=CONFIG_FILE, help="station config file (tool paths, device IP, mux port)")
+    parser.add_argument("--refresh-config", action="store_true", help="redo the tool discovery instead of using the cache")
+    parser.add_argument("--scanner-port", help="COM port of a serial barcode scanner for the streaming intake")
+    parser.add_argument("--mes-url", help="MES endpoint for DUT results, e.g. http://127.0.0.1:8766/results of mes.py")
+    parser.add_argument("--record-http-script", metavar="PATH",
+                        help="record the browser traffic of the next passing DUT as an HTTP script, later DUTs replay it")
+    parser.add_argument("--banks", type=int, help="split the fixture into this many banks that are reloaded while another one runs")
+    parser.add_argument("--async-core", action="store_true",
+                        help="run the DUTs as asyncio state machines, all slots in flight (needs --sim-no-browser)")
+    parser.add_argument("--batch-order", choices=[DUT_MAJOR, STAGE_MAJOR, OVERLAP],
+                        help="dut: each DUT end to end, stage: all bootloaders first, "
+                             "overlap: program the next slot (other mux) during the current web stage")
+    parser.add_argument("--metrics-port", type=int, default=9464,
+                        help="port of the Prometheus metrics endpoint on localhost, 0 disables it")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=["sample", "cprofile"],
+                        help="profile every DUT job (default sampler) and monitor Qt event loop lag")
+    args, qt_args = parser.parse_known_args()
+
+    simulator = None
+    if args.simulate:
+        empty_slots = {int(slot) for slot in args.sim_empty_slots.split(",") if slot.strip()}
+        simulator = Simulator(
+            failure_rate=args.sim_failure_rate,
+            latency_scale=args.sim_latency,
+            empty_slots=empty_slots,
+            settle=args.sim_settle,
+            mux_count=args.sim_muxes,
+        )
+        print(f"Simulation mode, virtual device on port {simulator.device.port}")
+        events = [item.split(":") for item in args.sim_events.split(",") if item.strip()]
+        simulator.mux.script([(float(delay), name.strip()) for delay, name in events])
+
+    station_config = load_station_config(args.config, refresh=args.refresh_config)
+    if args.scanner_port:
+        station_config["scanner_port"] = args.scanner_port
+    if args.mes_url:
+        station_config["mes_url"] = args.mes_url
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = SerialNumberApp(
+        coordinator_url=args.coordinator,
+        station_id=args.station_id,
+        simulator=simulator,
+        simulate_browser=not args.sim_no_browser,
+        profile_mode=args.profile,
+        metrics_port=args.metrics_port,
+        station_config=station_config,
+        bank_count=args.banks,
+        record_http_script=args.record_http_script,
+        async_core=args.async_core,
+        batch_order=args.batch_order,
+    )
+    if simulator and args.sim_duts:
+        QTimer.singleShot(0, lambda: window.start_simulated_load(args.sim_duts))
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,307 @@
+import http.cookiejar
+import json
+import os
+import re
+import string
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from cancellation import CancelToken
+from upload_monitor import port_open, read_network_events
+
+
+SCRIPT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_script.json")
+
+# Resources the SPA loads for itself, never part of the device API
+STATIC_TYPES = ("Script", "Stylesheet", "Image", "Font", "Media", "Manifest")
+# Request headers worth replaying, the browser adds the rest on its own
+KEPT_HEADERS = ("content-type", "authorization", "x-")
+
+
+class ReplayDiverged(Exception):
+    """The device answered differently than during the recording"""
+
+    def __init__(self, step, reason):
+        super().__init__(f"HTTP replay diverged at step {step}: {reason}")
+        self.step = step
+        self.reason = reason
+
+
+class NetworkRecorder:
+    """
+    Collects the CDP network traffic of one Selenium run as a list of requests
+    with their status and, for JSON answers, their body. Drains the same
+    performance log as UploadMonitor, so it is passed to it as recorder.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.requests = []
+        self.upload_index = None
+        self._open = {}  # requestId -> request dict of the running request
+
+    def mark_upload(self):
+        """The next POST/PUT is the firmware upload, after it the device reboots"""
+        self.poll()
+        self.upload_index = len(self.requests)
+
+    def poll(self):
+        """Read new Network events into the recording, returns them"""
+        events = read_network_events(self.driver)
+        for event in events:
+            self._handle(event["method"], event.get("params", {}))
+        return events
+
+    def _handle(self, method, params):
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            if "redirectResponse" in params and request_id in self._open:
+                # Same requestId continues with the redirect target
+                self._open.pop(request_id)["status"] = params["redirectResponse"].get("status")
+            request = params.get("request", {})
+            entry = {
+                "method": request.get("method", "GET"),
+                "url": request.get("url", ""),
+                "headers": request.get("headers", {}),
+                "body": request.get("postData"),
+                "has_body": request.get("hasPostData", False),
+                "type": params.get("type", ""),
+                "status": None,
+                "mime": "",
+                "response": None,
+            }
+            self.requests.append(entry)
+            self._open[request_id] = entry
+        elif method == "Network.responseReceived" and request_id in self._open:
+            response = params.get("response", {})
+            self._open[request_id]["status"] = response.get("status")
+            self._open[request_id]["mime"] = response.get("mimeType", "")
+        elif method == "Network.loadingFinished" and request_id in self._open:
+            entry = self._open.pop(request_id)
+            if "json" in entry["mime"]:
+                try:
+                    reply = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+                    entry["response"] = reply.get("body")
+                except Exception:
+                    pass
+        elif method == "Network.loadingFailed" and request_id in self._open:
+            self._open.pop(request_id)["status"] = "failed"
+
+
+def _flatten(value, prefix=""):
+    """{"a_b": "x"} for {"a": {"b": "x"}}, strings only"""
+    items = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            items.update(_flatten(item, f"{prefix}_{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            items.update(_flatten(item, f"{prefix}_{index}"))
+    elif isinstance(value, str):
+        items[prefix] = value
+    return items
+
+
+def _response_values(step_index, body):
+    """Template variables ({r<step>_<key>: value}) from a JSON answer, e.g. a session token"""
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        return {}
+    name = re.compile(r"\W")
+    return {name.sub("_", f"r{step_index}_{key}"): value for key, value in _flatten(data).items()}
+
+
+def derive_script(recorder, base_url, params, firmware_path=None):
+    """
+    Parameterised request sequence from a recording. params ({name: value}, e.g.
+    serial_number, username, password) are replaced by $name, strings of earlier
+    JSON answers (tokens) by $r<step>_<key>. Static assets and failed requests are dropped.
+    """
+    origin = urllib.parse.urlsplit(base_url)
+    steps = []
+    tokens = {}  # value -> variable name, from earlier JSON answers
+    firmware_name = os.path.basename(firmware_path) if firmware_path else None
+
+    def parameterise(text, include_credentials=True):
+        text = text.replace("$", "$$")
+        for value, name in sorted(tokens.items(), key=lambda item: -len(item[0])):
+            text = text.replace(value, "${" + name + "}")
+        for name, value in sorted(params.items(), key=lambda item: -len(str(item[1]))):
+            if value and (include_credentials or name == "serial_number"):
+                text = text.replace(str(value), "${" + name + "}")
+        return text
+
+    for index, request in enumerate(recorder.requests):
+        url = urllib.parse.urlsplit(request["url"])
+        if url.netloc != origin.netloc or request["type"] in STATIC_TYPES:
+            continue
+        upload = (recorder.upload_index is not None and index >= recorder.upload_index
+                  and request["method"] in ("POST", "PUT")
+                  and not any(step["upload"] for step in steps))
+        if request["status"] in (None, "failed") and not upload:
+            continue
+        path = parameterise(url.path + (f"?{url.query}" if url.query else ""), include_credentials=False)
+        if not upload and steps and request["method"] == "GET" and steps[-1]["method"] == "GET" \
+                and steps[-1]["path"] == path:
+            # Polling (e.g. config.json while the device reboots) is replayed once
+            continue
+
+        headers = {key: parameterise(value) for key, value in request["headers"].items()
+                   if key.lower().startswith(KEPT_HEADERS)}
+        step = {
+            "method": request["method"],
+            "path": path,
+            "headers": headers,
+            "body": None,
+            "body_type": "none",
+            # A device that drops the upload connection to reboot has no status to compare
+            "status": request["status"] if request["status"] != "failed" else None,
+            "upload": upload,
+        }
+        content_type = headers.get("Content-Type", headers.get("content-type", ""))
+        if upload:
+            headers.pop("Content-Type", None)
+            headers.pop("content-type", None)
+            if content_type.startswith("multipart/form-data"):
+                field = re.search(r'name="([^"]+)"; filename=', request["body"] or "")
+                step["body_type"] = "multipart"
+                step["file_field"] = field.group(1) if field else "file"
+                step["file_name"] = firmware_name
+            else:
+                step["body_type"] = "firmware"
+        elif request["body"] is not None:
+            step["body"] = parameterise(request["body"])
+            step["body_type"] = "text"
+        steps.append(step)
+
+        if request["response"]:
+            for name, value in _response_values(len(steps) - 1, request["response"]).items():
+                if len(value) >= 8:
+                    tokens.setdefault(value, name)
+
+    return {
+        "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "params": sorted(params),
+        "steps": steps,
+    }
+
+
+def save_script(script, path=SCRIPT_FILE):
+    with open(path, "w") as f:
+        json.dump(script, f, indent=2)
+
+
+def load_script(path=SCRIPT_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Redirects are recorded as steps of their own, the status is compared as is"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpReplay:
+    """
+    Runs a derived script against one DUT with plain HTTP (cookies are kept
+    per run). Any status other than the recorded one raises ReplayDiverged,
+    so the caller can fall back to the browser.
+    """
+
+    def __init__(self, script, request_timeout=10):
+        self.script = script
+        self.request_timeout = request_timeout
+        self.replays = 0
+        self.divergences = 0
+
+    def run(self, base_url, params, firmware_path, cancel_token=None, reboot_timeout=60, progress_callback=None):
+        cancel_token = cancel_token or CancelToken()
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        variables = dict(params)
+        self.replays += 1
+        try:
+            for index, step in enumerate(self.script["steps"]):
+                cancel_token.check()
+                status, body = self._send(opener, base_url, step, variables, firmware_path, index)
+                if step["status"] is not None and status != step["status"]:
+                    raise ReplayDiverged(index, f"{step['method']} {step['path']} answered {status}, "
+                                                f"recorded {step['status']}")
+                variables.update(_response_values(index, body))
+                if step["upload"]:
+                    if progress_callback:
+                        progress_callback("Replay: firmware uploaded, waiting for the reboot")
+                    self._wait_reboot(base_url, cancel_token, reboot_timeout, index)
+            return opener
+        except ReplayDiverged:
+            self.divergences += 1
+            raise
+
+    def _send(self, opener, base_url, step, variables, firmware_path, index):
+        try:
+            path = string.Template(step["path"]).substitute(variables)
+            headers = {key: string.Template(value).substitute(variables) for key, value in step["headers"].items()}
+            data = None
+            if step["body_type"] == "text":
+                data = string.Template(step["body"]).substitute(variables).encode()
+        except KeyError as e:
+            raise ReplayDiverged(index, f"no value for {e}")
+        if step["body_type"] == "firmware":
+            with open(firmware_path, "rb") as f:
+                data = f.read()
+            headers["Content-Type"] = "application/octet-stream"
+        elif step["body_type"] == "multipart":
+            boundary = uuid.uuid4().hex
+            with open(firmware_path, "rb") as f:
+                content = f.read()
+            name = step.get("file_name") or os.path.basename(firmware_path)
+            data = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{step['file_field']}\"; "
+                    f"filename=\"{name}\"\r\nContent-Type: application/octet-stream\r\n\r\n").encode() \
+                + content + f"\r\n--{boundary}--\r\n".encode()
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+
+        request = urllib.request.Request(base_url + path, data=data, headers=headers, method=step["method"])
+        try:
+            with opener.open(request, timeout=self.request_timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            # Also 3xx, redirects are not followed
+            return e.code, e.read()
+        except OSError as e:
+            if step["upload"]:
+                # Device may drop the connection once the upload is in
+                return step["status"], b""
+            raise ReplayDiverged(index, f"{step['method']} {path} failed: {e}")
+
+    def _wait_reboot(self, base_url, cancel_token, timeout, index, poll_interval=0.2):
+        """Server goes away (two missed probes) and answers HTTP again"""
+        url = urllib.parse.urlsplit(base_url)
+        start = time.monotonic()
+        missed = 0
+        went_down = False
+        while time.monotonic() - start < timeout:
+            if not went_down:
+                missed = 0 if port_open(url.hostname, url.port or 80, timeout=poll_interval) else missed + 1
+                went_down = missed >= 2
+            else:
+                try:
+                    urllib.request.urlopen(base_url + "/", timeout=poll_interval * 5).read()
+                    return
+                except urllib.error.HTTPError:
+                    return
+                except OSError:
+                    pass
+            cancel_token.sleep(poll_interval)
+        raise ReplayDiverged(index, f"device did not reboot within {timeout} s")
+
+
+def read_json(opener, base_url, path, timeout=5):
+    """GET a JSON document with the replay session (cookies)"""
+    with opener.open(base_url + path, timeout=timeout) as response:
+        return json.loads(response.read())
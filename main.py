@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import json
@@ -7,27 +8,55 @@ import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                              QMessageBox, QScrollArea, QFileDialog, QComboBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 
-
-class AutomationThread(QThread):
-    """Thread for running automate_device"""
-    finished = pyqtSignal(str, bool, str)  # serial_number, success, message
+import page_actions
+from upload_monitor import UploadMonitor, enable_network_events
+from browser_cache import profile_dir_for, add_cache_arguments, clear_device_session, no_cache_url
+from station_config import load_station_config
+from process_watchdog import BrowserWatchdog
+from stage_timings import TimingHistory
+from notifications import NotificationPanel
+from cancellation import CancelToken, Cancelled
+
+
+# Stages of the firmware-only flow, (default, floor) in seconds like stage_timings.DEFAULT_TIMEOUTS.
+# first_login includes the SPA start right after boot, which is why its default is much longer.
+FIRMWARE_TIMEOUTS = {
+    "readiness": (30, 5),
+    "page_load": (5, 2),
+    "first_login": (60, 10),
+    "open_system": (10, 3),
+    "upload_total": (60, 20),
+    "login": (10, 3),
+    "verify": (5, 2),
+}
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stage_timings_firmware.json")
+
+
+class AutomationSignals(QObject):
+    """Signals shared by every AutomationJob, created and connected once per app"""
+    finished = pyqtSignal(str, bool, str)  # DUT name, success, message
     progress = pyqtSignal(str)  # progress message
-    # bootloader_status = pyqtSignal(int, bool)  # True = success, False = fail
-    serial_number_verify_status = pyqtSignal(int,str)
+    serial_number_verify_status = pyqtSignal(int, str)
     firmware_verify_status = pyqtSignal(int, bool)  # True = match, False = mismatch
+    stage_timing = pyqtSignal(int, str, float)  # cycle_number, stage, seconds
+
 
+class AutomationJob(QRunnable):
+    """One DUT run of automate_device on the shared QThreadPool"""
 
-    def __init__(self, firmware_version,  firmware_path,  driver_path, chromefortestbinary_path, cycle_number, serial_port, row_index):
+    def __init__(self, signals, cancel_token, firmware_version, firmware_path, driver_path, chromefortestbinary_path, cycle_number, serial_port, row_index, profile_dir=None, watchdog=None, timeouts=None):
         super().__init__()
+        self.signals = signals
+        self.cancel_token = cancel_token
         self.firmware_version = firmware_version
         self.firmware_path = firmware_path
         self.driver_path = driver_path
@@ -35,40 +64,71 @@ class AutomationThread(QThread):
         self.cycle_number = cycle_number
         self.serial_port = serial_port
         self.row_index = row_index
+        self.profile_dir = profile_dir
+        self.watchdog = watchdog
+        self.timeouts = timeouts
 
-    
     def run(self):
-        """Run the automation in a separate thread"""
+        """Run the automation on a pool thread"""
+        signals = self.signals
+        name = f"DUT {self.cycle_number}"
         try:
-            # DON'T send serial data here anymore - it's now handled inside automate_device
-            self.progress.emit(f"Starting automation for DUT {self.cycle_number}...")
-            
-            # Run automation (serial commands are now sent inside this function)
+            signals.progress.emit(f"Starting automation for {name}...")
             automate_device(
                 firmware_version=self.firmware_version,
                 firmware_path=self.firmware_path,
                 driver_path=self.driver_path,
                 chromefortestbinary_path=self.chromefortestbinary_path,
-                serial_number_verify_callback=lambda serial_number:self.serial_number_verify_status.emit(self.row_index,serial_number),
-                firmware_verify_callback=lambda ok: self.firmware_verify_status.emit(self.row_index, ok),
-                serial_port=self.serial_port,  # Pass serial_port
-                cycle_number=self.cycle_number  # Pass cycle_number
+                serial_number_verify_callback=lambda serial_number: signals.serial_number_verify_status.emit(self.row_index, serial_number),
+                firmware_verify_callback=lambda ok: signals.firmware_verify_status.emit(self.row_index, ok),
+                serial_port=self.serial_port,
+                cycle_number=self.cycle_number,
+                profile_dir=self.profile_dir,
+                progress_callback=signals.progress.emit,
+                watchdog=self.watchdog,
+                timeouts=self.timeouts,
+                stage_callback=lambda stage, seconds: signals.stage_timing.emit(self.cycle_number, stage, seconds),
+                cancel_token=self.cancel_token
             )
-            
-            self.finished.emit(f"DUT {self.cycle_number}", True, "Successfully processed")
-            
+            signals.finished.emit(name, True, "Successfully processed")
+        except Cancelled:
+            signals.finished.emit(name, False, "Cancelled by operator")
         except Exception as e:
-            self.finished.emit(self.cycle_number, False, str(e))
+            signals.finished.emit(name, False, str(e))
+
 
 class SerialNumberApp(QMainWindow):
     def __init__(self):
         super().__init__()
+
+        # Driver / browser paths from station_config.json (discovered and cached)
+        self.station_config = load_station_config()
+
+        # Kills browser trees that outlive their DUT job or grow too big, and leftovers of earlier runs
+        self.watchdog = BrowserWatchdog()
+        self.watchdog.reap_orphans(self.browser_executables())
+        self.watchdog.start()
+
+        # Measured stage durations per slot replace the fixed waits once there is enough history
+        self.timing_history = TimingHistory(path=HISTORY_FILE)
+
+        # One long-lived worker, jobs are queued on it instead of a new QThread per DUT
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.automation_signals = AutomationSignals()
+        self.automation_signals.progress.connect(self.on_automation_progress)
+        self.automation_signals.finished.connect(self.on_automation_finished)
+        self.automation_signals.serial_number_verify_status.connect(self.update_serial_number_verify_status)
+        self.automation_signals.firmware_verify_status.connect(self.update_firmware_verify_status)
+        self.automation_signals.stage_timing.connect(self.on_stage_timing)
         
         # Initialize serial port as None
         self.serial_port = None
-        self.current_thread = None
+        self.cancel_token = None
         self.automation_queue = []
         self.is_processing = False
+        self.batch_results = []  # (DUT name, success, message) of the running batch
+        self.batch_start = time.monotonic()
 
         self.serial_inputs = []
         self.serial_verify_indicators = []
@@ -271,27 +331,31 @@ class SerialNumberApp(QMainWindow):
         self.status_label.setStyleSheet("font-size: 11px; color: #666; padding: 5px;")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(self.status_label)
+
+        # Failures and input errors are listed here instead of modal dialogs, the queue never waits
+        self.notifications = NotificationPanel()
+        main_layout.addWidget(self.notifications)
     
     
     def save_serial_numbers(self):
         firmware_version = self.input_firmware_version.text().strip()
 
         if not firmware_version:
-            QMessageBox.warning(self, "No input firmware version", "Please enter firmware version!")
+            self.notifications.failure("Please enter firmware version!")
             return
 
         host_id_low = self.input_host_id_low.text().strip()
         host_id_high = self.input_host_id_high.text().strip()
       
         if not host_id_low.isdigit() or not host_id_high.isdigit():
-            QMessageBox.warning(self, "Invalid Input", "Please enter correct host ID number!")
+            self.notifications.failure("Please enter correct host ID number!")
             return
 
         host_id_low = int(host_id_low)
         host_id_high = int(host_id_high)
 
         if host_id_high < host_id_low:
-            QMessageBox.warning(self, "Invalid Input", "Host ID high must be greater than or equal to Host ID low!")
+            self.notifications.failure("Host ID high must be greater than or equal to Host ID low!")
             return
 
         total_dut = (host_id_high - host_id_low) + 1
@@ -307,7 +371,8 @@ class SerialNumberApp(QMainWindow):
         print(f"Host id high = {self.saved_data['host_id_high']}")
         print(f"Total DUT: {self.saved_data['total_dut']}")
 
-        QMessageBox.information(self, "Begin upload", f"Firmware version saved: {firmware_version}\nHost id low: {host_id_low}\nHost id high: {host_id_high}\nTotal number of DUT: {total_dut}")
+        self.notifications.info(f"Begin upload: firmware version {firmware_version}, host id {host_id_low}-{host_id_high}, "
+                                f"{total_dut} DUT(s)")
         
         self.upload_package()
     
@@ -358,9 +423,12 @@ class SerialNumberApp(QMainWindow):
 
         # Validate that paths are selected
         if not firmware:
-            QMessageBox.warning(self, "Missing File", "Please select a firmware file!")
+            self.notifications.failure("Please select a firmware file!")
             return
         
+        # Shared browser cache for the device UI, keyed by firmware version
+        profile_dir = profile_dir_for(self.saved_data['firmware_version'])
+
         # Build automation queue
         self.automation_queue = []
         cycle_number = 0x01
@@ -370,10 +438,13 @@ class SerialNumberApp(QMainWindow):
                 'cycle_number': cycle_number,
                 'firmware': firmware,
                 'firmware_version': self.saved_data['firmware_version'],
-                'serial_number': None  # ← will be filled later by API
+                'serial_number': None,  # ← will be filled later by API
+                'profile_dir': profile_dir
             })
             cycle_number += 1
 
+        self.batch_results = []
+        self.batch_start = time.monotonic()
         self.process_next_in_queue()
 
     def update_serial_number_verify_status(self,row,serial_number):
@@ -403,9 +474,16 @@ class SerialNumberApp(QMainWindow):
             print("\n" + "=" * 50)
             print("All automation tasks completed!")
             print("=" * 50)
-            self.status_label.setText("✓ All tasks completed")
-            self.status_label.setStyleSheet("font-size: 11px; color: #4CAF50; padding: 5px;")
+            summary, passed = self.notifications.batch_summary(self.batch_results, time.monotonic() - self.batch_start)
+            print(summary)
+            if passed:
+                self.status_label.setText(f"✓ {summary}")
+                self.status_label.setStyleSheet("font-size: 11px; color: #4CAF50; padding: 5px;")
+            else:
+                self.status_label.setText(f"⚠ {summary}")
+                self.status_label.setStyleSheet("font-size: 11px; color: #f44336; padding: 5px;")
             self.is_processing = False
+            self.timing_history.save()
             return
         
         # Get next task
@@ -426,32 +504,35 @@ class SerialNumberApp(QMainWindow):
         self.status_label.setText(f"⏳ Processing DUT {task['cycle_number']}...")
         self.status_label.setStyleSheet("font-size: 11px; color: #2196F3; padding: 5px;")
         
-        # Create and start thread
-        self.current_thread = AutomationThread(
+        # Queue the job on the worker pool, with a fresh cancellation token
+        self.cancel_token = CancelToken()
+        self.thread_pool.start(AutomationJob(
+            signals=self.automation_signals,
+            cancel_token=self.cancel_token,
             firmware_version=task['firmware_version'],
             firmware_path=task['firmware'],
-            driver_path=r"D:\MULTIPROGRAMMER\chromedriver-win64\chromedriver-win64\chromedriver.exe",
-            chromefortestbinary_path = r"D:\MULTIPROGRAMMER\chrome-win64\chrome-win64\chrome.exe",
+            driver_path=self.station_config["driver_path"],
+            chromefortestbinary_path=self.station_config["chrome_path"],
             cycle_number=task['cycle_number'],
             serial_port=self.serial_port,
-            row_index=task['cycle_number'] - 1 
-        )
-        
-        # Connect signals
-        self.current_thread.progress.connect(self.on_automation_progress)
-        self.current_thread.finished.connect(self.on_automation_finished)
-        self.current_thread.serial_number_verify_status.connect(self.update_serial_number_verify_status)
-        self.current_thread.firmware_verify_status.connect(self.update_firmware_verify_status)
-        
-        # Start thread
-        self.current_thread.start()
+            row_index=task['cycle_number'] - 1,
+            profile_dir=task['profile_dir'],
+            watchdog=self.watchdog,
+            timeouts=self.timing_history.timeouts_for(task['cycle_number'], defaults=FIRMWARE_TIMEOUTS)
+        ))
     
     def on_automation_progress(self, message):
         """Handle progress updates from automation thread"""
         print(message)
     
+    def on_stage_timing(self, cycle_number, stage, seconds):
+        """Record a measured stage duration for timeout calibration"""
+        print(f"DUT {cycle_number} stage {stage}: {seconds:.2f} s")
+        self.timing_history.record(stage, cycle_number, seconds)
+
     def on_automation_finished(self, serial_number, success, message):
         """Handle automation thread completion"""
+        self.batch_results.append((serial_number, success, message))
         if success:
             print(f"{serial_number} Successfully processed")
             self.status_label.setText(f"Completed {serial_number}")
@@ -460,19 +541,18 @@ class SerialNumberApp(QMainWindow):
             print(f"Error processing {serial_number}: {message}")
             self.status_label.setText(f"Failed {serial_number}")
             self.status_label.setStyleSheet("font-size: 11px; color: #f44336; padding: 5px;")
-            QMessageBox.warning(
-                self,
-                "Processing Error",
-                f"Failed to process {serial_number}\n\nError: {message}"
-            )
+            self.notifications.failure(f"Failed {serial_number}: {message}")
         
         # Process next item in queue
         self.process_next_in_queue()
     
+    def browser_executables(self):
+        return [self.station_config["driver_path"], self.station_config["chrome_path"]]
+
     def closeEvent(self, event):
         """Handle window close event"""
-        # Wait for current thread to finish
-        if self.current_thread and self.current_thread.isRunning():
+        # Cancel the running job and wait for the worker to wind down
+        if self.is_processing:
             reply = QMessageBox.question(
                 self,
                 "Task Running",
@@ -484,8 +564,15 @@ class SerialNumberApp(QMainWindow):
                 event.ignore()
                 return
             
-            self.current_thread.terminate()
-            self.current_thread.wait()
+            self.automation_queue = []
+            if self.cancel_token:
+                self.cancel_token.cancel()
+        self.thread_pool.waitForDone(5000)
+
+        # Nothing started by this app may survive it
+        self.watchdog.stop()
+        self.timing_history.save()
+        self.watchdog.reap_orphans(self.browser_executables())
         
         # Close serial port
         if self.serial_port and self.serial_port.is_open:
@@ -495,7 +582,7 @@ class SerialNumberApp(QMainWindow):
         event.accept()
 
 
-def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
+def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30, cancel_token=None):
     """
     Wait for the device's web server to be ready by attempting TCP connection
     Returns True if device is ready, False if timeout
@@ -515,7 +602,11 @@ def wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
         except:
             pass
 
-        time.sleep(0.5)  # Check every 0.5 seconds
+        # Check every 0.5 seconds
+        if cancel_token:
+            cancel_token.sleep(0.5)
+        else:
+            time.sleep(0.5)
     return False
 
 
@@ -526,22 +617,49 @@ def automate_device(
         chromefortestbinary_path,
         serial_number_verify_callback,
         firmware_verify_callback,
-        serial_port,cycle_number
+        serial_port,cycle_number,
+        profile_dir=None,
+        progress_callback=None,
+        watchdog=None,
+        timeouts=None,
+        stage_callback=None,
+        cancel_token=None
         ):
     driver = None
+    watched_pid = None
+
+    # Every wait below goes through the token so closing the app returns quickly
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    def quit_driver():
+        if driver is not None:
+            driver.quit()
+
+    # Calibrated timeouts from TimingHistory, hard-coded defaults for anything missing
+    timeouts = dict(timeouts or {})
+    for stage, (default, _floor) in FIRMWARE_TIMEOUTS.items():
+        timeouts.setdefault(stage, default)
+
+    def report_stage(stage, started):
+        cancel_token.check()
+        if stage_callback:
+            stage_callback(stage, time.monotonic() - started)
 
     try:
         data_bytes_before_firmware = bytes([0x41, 0x01, 0xFF, 0x0D])
         serial_port.write(data_bytes_before_firmware)
-        time.sleep(2)
+        cancel_token.sleep(2)
 
         data_service = [0x41, 0x01, cycle_number+8, 0x0D]
         data_bytes_service = bytes(data_service)
         serial_port.write(data_bytes_service)
         
         # CRITICAL FIX: Wait for device web server to actually be ready
-        if not wait_for_device_ready(ip="192.168.0.100", port=80, timeout=30):
+        stage_start = time.monotonic()
+        if not wait_for_device_ready(ip="192.168.0.100", port=80, timeout=timeouts["readiness"], cancel_token=cancel_token):
             raise Exception("Device web server did not become ready in time")
+        report_stage("readiness", stage_start)
 
         # Now that device is confirmed ready, start browser
         options = Options()
@@ -551,50 +669,65 @@ def automate_device(
         options.add_argument('--no-sandbox')
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-extensions')
+        enable_network_events(options)
+        if profile_dir:
+            add_cache_arguments(options, profile_dir)
 
         service = Service(driver_path)
         driver = webdriver.Chrome(service=service, options=options)
+        if watchdog:
+            watched_pid = watchdog.track(service.process.pid, label=f"DUT {cycle_number}")
+        # Quitting the browser aborts whatever WebDriver call is blocking
+        cancel_token.on_cancel(quit_driver)
+        if profile_dir:
+            clear_device_session(driver)
 
         # Navigate to factory config page
+        stage_start = time.monotonic()
         driver.get("http://192.168.0.100/#/login")
         
         # Wait for page to be fully loaded
-        WebDriverWait(driver, 5).until(
+        WebDriverWait(driver, timeouts["page_load"]).until(
             lambda d: d.execute_script("return document.readyState") == "complete"
         )
-
-        WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Username"]'))
-        )
-        
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Username"]').send_keys("admin")
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Password"]').send_keys("admin")
-        time.sleep(0.5)
-        driver.find_element(By.XPATH, '//span[text()="Login"]').click()
-        time.sleep(0.5)
-        driver.find_element(By.XPATH, '//div[text()="System"]').click()
-        time.sleep(0.5)
+        report_stage("page_load", stage_start)
+
+        # One script round trip per step, waits happen inside the page
+        stage_start = time.monotonic()
+        page_actions.login(driver, "admin", "admin", timeout=timeouts["first_login"])
+        report_stage("first_login", stage_start)
+        stage_start = time.monotonic()
+        page_actions.open_system_page(driver, timeout=timeouts["open_system"])
+        report_stage("open_system", stage_start)
         file_input = driver.find_element(By.CSS_SELECTOR, 'input[type="file"]')
         file_input.send_keys(firmware_path)  
-        time.sleep(0.5)
-        driver.find_element(By.XPATH, '//span[text()="Upload"]').click()
-        time.sleep(0.5)
+        cancel_token.sleep(0.5)
 
-        WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Username"]'))
-        )
+        # Follow upload -> flash write -> reboot through CDP instead of a blind 60 s wait
+        upload_monitor = UploadMonitor(driver, ip="192.168.0.100", progress_callback=progress_callback, cancel_token=cancel_token)
+        upload_monitor.arm()
+        stage_start = time.monotonic()
+        driver.find_element(By.XPATH, '//span[text()="Upload"]').click()
+        upload_monitor.wait(timeout=timeouts["upload_total"])
+        report_stage("upload_total", stage_start)
         
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Username"]').send_keys("admin")
-        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Password"]').send_keys("admin")
-        time.sleep(0.5)
-        driver.find_element(By.XPATH, '//span[text()="Login"]').click()
-        time.sleep(3)
+        stage_start = time.monotonic()
+        page_actions.login(driver, "admin", "admin", timeout=timeouts["login"])
+        report_stage("login", stage_start)
         try:
-            driver.get("http://192.168.0.100/config.json")
-            time.sleep(0.5)
-            
-            json_text = driver.find_element(By.TAG_NAME, "body").text
-            data = json.loads(json_text)
+            # Read config.json as soon as the session allows it instead of a fixed 3 s sleep
+            stage_start = time.monotonic()
+            while True:
+                try:
+                    driver.get(no_cache_url("http://192.168.0.100/config.json"))
+                    json_text = driver.find_element(By.TAG_NAME, "body").text
+                    data = json.loads(json_text)
+                    break
+                except Exception:
+                    if (time.monotonic() - stage_start) > timeouts["verify"]:
+                        raise
+                    cancel_token.sleep(0.25)
+            report_stage("verify", stage_start)
             serial_number_from_device = data["deviceInfo"]["serialNumber"]
             firmware_from_device = data["deviceInfo"]["firmwareVersion"]
 
@@ -605,22 +738,31 @@ def automate_device(
             serial_number_verify_callback(serial_number_from_device)
             fw_match = (firmware_from_device == firmware_version)
             firmware_verify_callback(fw_match)
+            if not fw_match:
+                raise Exception(f"Firmware version mismatch, device reports {firmware_from_device}")
             
         except Exception as e:
-            print(f"Failed to verify serial number: {e}")
+            print(f"Failed to verify the device: {e}")
             firmware_verify_callback(False)
+            raise
         
 
     except Exception as e:
         print(f"Automation error: {e}")
         firmware_verify_callback(False)
+        if cancel_token.is_cancelled():
+            raise Cancelled("Cancelled by operator") from e
+        raise
     
     finally:
+        cancel_token.remove_callback(quit_driver)
         if driver is not None:
             try:
                 driver.quit()
-            except:
-                pass
+            except Exception as e:
+                print(f"driver.quit() failed: {e}")
+        if watched_pid:
+            watchdog.release(watched_pid)
 
 
 
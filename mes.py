@@ -0,0 +1,309 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+QUEUE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mes_queue.sqlite")
+
+
+class MesQueue:
+    """
+    Durable FIFO of MES records in a local SQLite file, survives MES outages and restarts.
+    Records the MES rejected are kept in a dead letter table instead of blocking the queue.
+    """
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters (id INTEGER PRIMARY KEY, body TEXT NOT NULL, "
+            "error TEXT NOT NULL, failed_at REAL NOT NULL)")
+        self._db.commit()
+
+    def put(self, record):
+        """Queue a copy of record with a record_id, the MES deduplicates resent records on it"""
+        record = dict(record)
+        record.setdefault("record_id", str(uuid.uuid4()))
+        with self._lock:
+            self._db.execute("INSERT INTO records (body) VALUES (?)", (json.dumps(record),))
+            self._db.commit()
+
+    def peek(self, limit):
+        """Oldest records as [(id, record)], they stay queued until removed"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, body FROM records ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(body)) for row_id, body in rows]
+
+    def remove(self, ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM records WHERE id = ?", [(row_id,) for row_id in ids])
+            self._db.commit()
+
+    def dead_letter(self, ids, error):
+        """Move records out of the queue into the dead letter table"""
+        with self._lock, self._db:
+            for row_id in ids:
+                self._db.execute(
+                    "INSERT INTO dead_letters (id, body, error, failed_at) "
+                    "SELECT id, body, ?, ? FROM records WHERE id = ?", (error, time.time(), row_id))
+                self._db.execute("DELETE FROM records WHERE id = ?", (row_id,))
+
+    def dead_letters(self, limit=100):
+        """Rejected records as [(record, error)], oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT body, error FROM dead_letters ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(json.loads(body), error) for body, error in rows]
+
+    def dead_letter_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class MesUploader:
+    """
+    Store-and-forward upload of DUT results to the MES.
+    submit() only writes the record to the local queue, a background thread
+    POSTs the queue in batches over one kept-alive connection and backs off
+    while the MES is down. Nothing is lost when the station is closed mid-outage.
+    A record the MES rejects with a 4xx goes to the dead letter table, the rest move on.
+    """
+
+    def __init__(self, url, queue=None, batch_size=50, interval=1.0, timeout=10,
+                 min_backoff=1.0, max_backoff=60.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.scheme = parsed.scheme or "http"
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or "/"
+        self.queue = queue if queue is not None else MesQueue()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.last_error = None
+        self._connection = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def backlog(self):
+        return len(self.queue)
+
+    @property
+    def rejected(self):
+        """Number of records the MES refused, kept in the queue's dead letter table"""
+        return self.queue.dead_letter_count()
+
+    def submit(self, record):
+        self.queue.put(record)
+        self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain_timeout=5.0):
+        """Try to send what is queued for up to drain_timeout seconds, the rest stays on disk"""
+        deadline = time.monotonic() + drain_timeout
+        while self.backlog and self.last_error is None and time.monotonic() < deadline:
+            self._wake.set()
+            time.sleep(0.1)
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+        self._close_connection()
+
+    def _open_connection(self):
+        if self._connection is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self._connection = cls(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _post(self, batch):
+        """POST [(id, record)], returns the response (raises on connection errors)"""
+        body = json.dumps({"records": [record for _, record in batch]}).encode()
+        connection = self._open_connection()
+        try:
+            connection.request("POST", self.path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # A dropped keep-alive connection is reopened on the next attempt
+            self._close_connection()
+            raise
+        return response
+
+    def _send(self, batch):
+        response = self._post(batch)
+        if response.status < 300:
+            self.queue.remove([row_id for row_id, _ in batch])
+            self.sent += len(batch)
+            return
+        error = f"MES answered {response.status} {response.reason}"
+        # 5xx, timeouts and rate limits pass, any other 4xx comes again for the same records
+        if response.status >= 500 or response.status in (408, 429):
+            raise Exception(error)
+        if len(batch) > 1:
+            # Find the rejected records, the others still go through
+            for item in batch:
+                self._send([item])
+            return
+        row_id, record = batch[0]
+        print(f"MES rejected {record.get('serial_number')} ({error}), moved to dead letters")
+        self.queue.dead_letter([row_id], error)
+
+    def send_batch(self):
+        """POST the oldest batch, returns the number of records taken off the queue (raises on failure)"""
+        batch = self.queue.peek(self.batch_size)
+        if not batch:
+            return 0
+        self._send(batch)
+        return len(batch)
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            try:
+                sent = self.send_batch()
+            except Exception as e:
+                if self.last_error is None:
+                    print(f"MES upload failed, retrying with backoff: {e}")
+                self.last_error = str(e)
+                self._stop.wait(backoff * random.uniform(0.8, 1.2))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            if self.last_error is not None:
+                print(f"MES reachable again, backlog {self.backlog}")
+            self.last_error = None
+            backoff = self.min_backoff
+            if sent < self.batch_size:
+                # Queue drained, wait for the next record (or poll, in case another process filled it)
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+
+class StandInMes:
+    """Local HTTP MES for the simulator and for trying outages: collects batches, fails on request"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+        self.record_ids = set()
+        self.requests = 0
+        self.fail_next = 0
+        self.down = False
+
+    def receive(self, records):
+        """HTTP status for a batch, records already received (same record_id) are not stored twice"""
+        with self.lock:
+            self.requests += 1
+            if self.down or self.fail_next > 0:
+                self.fail_next = max(0, self.fail_next - 1)
+                return 503
+            if any(not record.get("serial_number") or not record.get("record_id") for record in records):
+                return 422
+            for record in records:
+                if record["record_id"] not in self.record_ids:
+                    self.record_ids.add(record["record_id"])
+                    self.records.append(record)
+            return 200
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mes = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            records = json.loads(self.rfile.read(length))["records"]
+        except (ValueError, KeyError):
+            self._reply(400, {"error": "bad request"})
+            return
+        status = self.mes.receive(records)
+        if status == 200:
+            self._reply(200, {"accepted": len(records)})
+        elif status == 422:
+            self._reply(422, {"error": "record without serial_number or record_id"})
+        else:
+            self._reply(503, {"error": "MES unavailable"})
+
+    def do_GET(self):
+        with self.mes.lock:
+            self._reply(200, {"records": len(self.mes.records), "requests": self.mes.requests})
+
+    def _reply(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stand_in(mes, host="127.0.0.1", port=0):
+    handler = type("StandInMesHandler", (_Handler,), {"mes": mes})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Stand-in MES listening on http://{host}:{server.server_address[1]}/results")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in MES that collects DUT results")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--outage", type=float, nargs=2, metavar=("AFTER", "SECONDS"),
+                        help="answer 503 for SECONDS, starting AFTER seconds")
+    args = parser.parse_args()
+
+    mes = StandInMes()
+    server = start_stand_in(mes, args.host, args.port)
+    started = time.monotonic()
+    try:
+        while True:
+            time.sleep(5)
+            if args.outage:
+                elapsed = time.monotonic() - started
+                mes.down = args.outage[0] <= elapsed < args.outage[0] + args.outage[1]
+            with mes.lock:
+                print(f"records={len(mes.records)} requests={mes.requests}{' (down)' if mes.down else ''}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import bisect
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from mux import describe_frame
+from stage_timings import STAGE_ORDER
+
+
+DEFAULT_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, labels=(), function=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.function = function  # called at scrape time, returns {labels: value}
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def render(self):
+        values = self.function() if self.function else self.values
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        entry = self.values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[index] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, entry in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                bucket_labels = _labels(self.label_names + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _labels(self.label_names + ("le",), labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{inf_labels} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {entry[-2]:.3f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {entry[-1]}")
+        return lines
+
+
+def browser_process_stats():
+    """{(process name,): (count, rss bytes)} of chrome and chromedriver, needs psutil"""
+    stats = {}
+    if psutil is None:
+        return stats
+    for process in psutil.process_iter(["name", "memory_info"]):
+        name = (process.info.get("name") or "").lower()
+        if name.startswith("chromedriver"):
+            key = "chromedriver"
+        elif name.startswith("chrome"):
+            key = "chrome"
+        else:
+            continue
+        count, rss = stats.get(key, (0, 0))
+        memory = process.info.get("memory_info")
+        stats[key] = (count + 1, rss + (memory.rss if memory else 0))
+    return stats
+
+
+class StationMetrics:
+    """
+    Prometheus metrics of this station, fed from the AutomationSignals
+    and the mux listener, served on http://127.0.0.1:<port>/metrics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.completions = deque()  # finish timestamps for DUTs per hour
+        self.completed_stages = {}  # slot -> completed stages of the running job
+
+        self.duts = Counter("dut_processed_total", "DUTs processed by result", ["result"])
+        self.stage_duration = Histogram("dut_stage_duration_seconds", "Duration of each DUT stage", ["stage"])
+        self.stage_failures = Counter("dut_stage_failures_total", "DUT failures by stage and slot", ["stage", "slot"])
+        self.mux_commands = Counter("mux_commands_total", "Frames written to the mux", ["command"])
+        self.browser_leaks = Counter("browser_leaks_total", "Browser process trees killed by the watchdog", ["reason"])
+        self.duts_per_hour = Gauge("dut_throughput_per_hour", "DUTs finished in the last hour",
+                                   function=self._duts_per_hour)
+        self.processes = Gauge("browser_processes", "Running browser processes", ["process"],
+                               function=lambda: {(k,): v[0] for k, v in browser_process_stats().items()})
+        self.process_rss = Gauge("browser_rss_bytes", "Resident memory of browser processes", ["process"],
+                                 function=lambda: {(k,): v[1] for k, v in browser_process_stats().items()})
+        self.metrics = [self.duts, self.duts_per_hour, self.stage_duration, self.stage_failures,
+                        self.mux_commands, self.browser_leaks]
+        if psutil is not None:
+            self.metrics += [self.processes, self.process_rss]
+
+    def _duts_per_hour(self):
+        cutoff = time.monotonic() - 3600
+        while self.completions and self.completions[0] < cutoff:
+            self.completions.popleft()
+        return {(): len(self.completions)}
+
+    def job_started(self, slot):
+        with self.lock:
+            self.completed_stages[slot] = set()
+
+    def on_stage_timing(self, slot, stage, seconds):
+        with self.lock:
+            self.stage_duration.observe(seconds, stage)
+            self.completed_stages.setdefault(slot, set()).add(stage)
+
+    def on_finished(self, slot, success):
+        with self.lock:
+            self.duts.inc("pass" if success else "fail")
+            self.completions.append(time.monotonic())
+            if not success:
+                done = self.completed_stages.get(slot, set())
+                failed_stage = next((stage for stage in STAGE_ORDER if stage not in done), "unknown")
+                self.stage_failures.inc(failed_stage, slot)
+
+    def on_mux_frame(self, direction, data):
+        if direction != "tx":
+            return
+        command, _slot = describe_frame(data)
+        with self.lock:
+            self.mux_commands.inc(command)
+
+    def on_browser_leak(self, reason):
+        with self.lock:
+            self.browser_leaks.inc(reason)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in self.metrics:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
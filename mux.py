@@ -0,0 +1,100 @@
+import threading
+
+
+RESET_CHANNEL = 0xFF
+SLOT_COUNT = 8
+
+# Frames the fixture sends on its own: 0x42 <event> <argument> 0x0D
+EVENT_HEADER = 0x42
+EVENTS = {
+    0x01: "lid_closed",
+    0x02: "lid_opened",
+    0x03: "start_button",
+}
+
+
+def select_frame(channel):
+    """Mux frame that routes the given channel (0xFF = all off)"""
+    return bytes([0x41, 0x01, channel, 0x0D])
+
+
+def describe_frame(data, slots=SLOT_COUNT):
+    """('reset' | 'bootloader' | 'service' | 'other', slot or None) for a mux frame"""
+    data = bytes(data)
+    if len(data) != 4 or data[0] != 0x41 or data[3] != 0x0D:
+        return "other", None
+    channel = data[2]
+    if channel == RESET_CHANNEL:
+        return "reset", None
+    if 1 <= channel <= slots:
+        return "bootloader", channel
+    if slots < channel <= 2 * slots:
+        return "service", channel - slots
+    return "other", None
+
+
+def event_frame(name, argument=0):
+    """Event frame as the fixture sends it (used by the simulator)"""
+    code = next(code for code, event in EVENTS.items() if event == name)
+    return bytes([EVENT_HEADER, code, argument, 0x0D])
+
+
+class MuxEventDecoder:
+    """Splits bytes read from the mux into event names, anything else is skipped"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        events = []
+        while len(self.buffer) >= 4:
+            if self.buffer[0] != EVENT_HEADER:
+                del self.buffer[0]
+                continue
+            if self.buffer[3] != 0x0D:
+                del self.buffer[0]
+                continue
+            code = self.buffer[1]
+            del self.buffer[:4]
+            events.append(EVENTS.get(code, f"unknown_{code:02x}"))
+        return events
+
+
+class MuxPort:
+    """
+    Wraps the mux serial port (pyserial or FakeMux).
+    Every write/read is passed to the listeners as (direction, data)
+    with direction "tx" or "rx", everything else goes to the wrapped port.
+    """
+
+    def __init__(self, port, listeners=None):
+        self.port = port
+        self.listeners = list(listeners or [])
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, direction, data):
+        for listener in self.listeners:
+            try:
+                listener(direction, data)
+            except Exception as e:
+                print(f"Mux listener failed: {e}")
+
+    def write(self, data):
+        data = bytes(data)
+        with self._lock:
+            written = self.port.write(data)
+        self._notify("tx", data)
+        return written
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        if data:
+            self._notify("rx", data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
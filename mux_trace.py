@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from mux import describe_frame
+
+
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+
+
+class MuxTrace:
+    """
+    MuxPort listener that records every write and read with a monotonic
+    timestamp in a ring buffer. flush() appends what was recorded since the
+    last flush to a JSONL file, one {"t", "dir", "data"} object per frame.
+    """
+
+    def __init__(self, size=20000):
+        self.frames = deque(maxlen=size)
+        self.started = time.monotonic()
+        self.started_wall = time.time()
+        self.flushed = 0  # frames recorded before the last flush (including dropped ones)
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, direction, data):
+        with self._lock:
+            self.frames.append((time.monotonic(), direction, bytes(data)))
+            self.recorded += 1
+
+    def snapshot(self):
+        """[(seconds since start, direction, bytes)] of the buffered frames"""
+        with self._lock:
+            return [(t - self.started, direction, data) for t, direction, data in self.frames]
+
+    def flush(self, path=None):
+        """Append the frames recorded since the last flush, returns the path (None if nothing new)"""
+        with self._lock:
+            new = min(self.recorded - self.flushed, len(self.frames))
+            frames = list(self.frames)[len(self.frames) - new:]
+            dropped = self.recorded - self.flushed - new
+            self.flushed = self.recorded
+        if not frames:
+            return None
+        path = path or os.path.join(TRACE_DIR, time.strftime("mux_%Y%m%d_%H%M%S.jsonl",
+                                                             time.localtime(self.started_wall)))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new_file = not os.path.exists(path)
+        with open(path, "a") as f:
+            if new_file:
+                f.write(json.dumps({"started": self.started_wall}) + "\n")
+            if dropped:
+                print(f"Mux trace ring buffer overflowed, {dropped} frame(s) lost")
+            for t, direction, data in frames:
+                f.write(json.dumps({"t": round(t - self.started, 6), "dir": direction, "data": data.hex()}) + "\n")
+        return path
+
+
+def load_trace(path):
+    """[(seconds since start, direction, bytes)] of a JSONL trace"""
+    frames = []
+    with open(path) as f:
+        for line in f:
+            item = json.loads(line)
+            if "t" in item:
+                frames.append((item["t"], item["dir"], bytes.fromhex(item["data"])))
+    return frames
+
+
+def settle_gaps(frames):
+    """[(t, kind, slot, seconds until the next write)] of every mux select in a trace"""
+    writes = [(t, data) for t, direction, data in frames if direction == "tx"]
+    gaps = []
+    for (t, data), (next_t, _) in zip(writes, writes[1:]):
+        kind, slot = describe_frame(data)
+        gaps.append((t, kind, slot, next_t - t))
+    return gaps
+
+
+def replay(frames, port, speed=1.0, cancel_token=None):
+    """
+    Write the recorded tx frames to port (e.g. a FakeMux with a settle time)
+    at their recorded offsets divided by speed. Returns the frames as written
+    [(offset, bytes)], so the replayed timing can be compared to the trace.
+    """
+    written = []
+    start = time.monotonic()
+    first = next((t for t, direction, _ in frames if direction == "tx"), 0.0)
+    for t, direction, data in frames:
+        if direction != "tx":
+            continue
+        delay = (t - first) / speed - (time.monotonic() - start)
+        if delay > 0:
+            if cancel_token is not None:
+                cancel_token.sleep(delay)
+            else:
+                time.sleep(delay)
+        port.write(data)
+        written.append((time.monotonic() - start, data))
+    return written
+
+
+def print_trace(frames):
+    previous = None
+    for t, direction, data in frames:
+        kind, slot = describe_frame(data) if direction == "tx" else ("", None)
+        gap = f"+{(t - previous) * 1000:7.1f} ms" if previous is not None else " " * 11
+        print(f"{t:10.3f} {gap} {direction} {data.hex(' ')}  {kind}{f' slot {slot}' if slot else ''}")
+        previous = t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or replay a recorded mux trace")
+    parser.add_argument("trace", help="JSONL trace from traces/")
+    parser.add_argument("--replay", action="store_true", help="replay the writes against the simulator's fake mux")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 2 halves every delay")
+    parser.add_argument("--settle", type=float, default=0.05, help="relay settle time of the fake mux in seconds")
+    args = parser.parse_args()
+
+    frames = load_trace(args.trace)
+    if not args.replay:
+        print_trace(frames)
+        gaps = [gap for _, kind, _, gap in settle_gaps(frames) if kind in ("bootloader", "service")]
+        if gaps:
+            print(f"{len(gaps)} select(s), shortest gap to the next write {min(gaps) * 1000:.1f} ms")
+        return
+
+    from simulator import Simulator
+
+    simulator = Simulator(settle=args.settle)
+    started = time.monotonic()
+    written = replay(frames, simulator.mux, speed=args.speed)
+    elapsed = time.monotonic() - started
+    print(f"Replayed {len(written)} write(s) in {elapsed:.3f} s at speed {args.speed}")
+    print(f"{simulator.mux.unsettled_switches} switch(es) before the previous one settled "
+          f"({args.settle * 1000:.0f} ms settle time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import time
+
+from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QPushButton, QListWidget, QListWidgetItem, QCheckBox)
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QColor
+
+
+class NotificationPanel(QWidget):
+    """Non-modal list of batch notifications so failures never stall the queue"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 0, 10, 0)
+
+        header_layout = QHBoxLayout()
+        header = QLabel("Notifications")
+        header.setStyleSheet("font-size: 12px; font-weight: bold;")
+
+        # Optional beep + flash on failure for unattended runs
+        self.alert_checkbox = QCheckBox("Alert on failure")
+        self.alert_checkbox.setChecked(True)
+
+        clear_btn = QPushButton("Clear")
+        clear_btn.setMaximumWidth(60)
+        clear_btn.clicked.connect(self.clear)
+
+        header_layout.addWidget(header)
+        header_layout.addStretch()
+        header_layout.addWidget(self.alert_checkbox)
+        header_layout.addWidget(clear_btn)
+
+        self.list_widget = QListWidget()
+        self.list_widget.setMaximumHeight(120)
+        self.list_widget.setStyleSheet("font-size: 11px;")
+
+        layout.addLayout(header_layout)
+        layout.addWidget(self.list_widget)
+
+    def add(self, message, color="#333"):
+        item = QListWidgetItem(f"{time.strftime('%H:%M:%S')}  {message}")
+        item.setForeground(QColor(color))
+        self.list_widget.addItem(item)
+        self.list_widget.scrollToBottom()
+
+    def info(self, message):
+        self.add(message, "#2196F3")
+
+    def failure(self, message):
+        self.add(message, "#f44336")
+        if self.alert_checkbox.isChecked():
+            QApplication.beep()
+            self.list_widget.setStyleSheet("font-size: 11px; background-color: #FFEBEE;")
+            QTimer.singleShot(1500, lambda: self.list_widget.setStyleSheet("font-size: 11px;"))
+
+    def batch_summary(self, results, elapsed):
+        """Post the summary of a finished batch, results are (name, success, message). Returns (summary, all passed)"""
+        failed = [name for name, success, _ in results if not success]
+        summary = f"Batch done in {elapsed:.0f} s: {len(results) - len(failed)} passed, {len(failed)} failed"
+        if failed:
+            summary += f" ({', '.join(failed)})"
+            self.failure(summary)
+        else:
+            self.add(summary, "#4CAF50")
+        return summary, not failed
+
+    def clear(self):
+        self.list_widget.clear()
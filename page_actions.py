@@ -0,0 +1,227 @@
+import time
+
+
+# Helpers shared by every page action. Selectors starting with "xpath:" are
+# resolved with document.evaluate, everything else is a CSS selector.
+_PRELUDE = r"""
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+
+function find(selector) {
+    if (selector.startsWith('xpath:')) {
+        return document.evaluate(selector.slice(6), document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return document.querySelector(selector);
+}
+
+function waitFor(selector, timeoutMs, gone) {
+    return new Promise((resolve, reject) => {
+        const check = () => { const el = find(selector); return gone ? !el : el; };
+        const found = check();
+        if (found) { resolve(found); return; }
+        const observer = new MutationObserver(() => {
+            const el = check();
+            if (el) { observer.disconnect(); clearTimeout(timer); resolve(el); }
+        });
+        const timer = setTimeout(() => {
+            observer.disconnect();
+            reject(new Error((gone ? 'still present: ' : 'not found: ') + selector));
+        }, timeoutMs);
+        observer.observe(document, {childList: true, subtree: true, attributes: true});
+    });
+}
+
+function setValue(el, value) {
+    // Go through the native setter so Vue/React see the change
+    const proto = Object.getPrototypeOf(el);
+    const setter = Object.getOwnPropertyDescriptor(proto, 'value').set;
+    setter.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+
+function finish(step, result) {
+    result.step = step;
+    result.elapsed_ms = performance.now() - started;
+    done(result);
+}
+"""
+
+_LOGIN = _PRELUDE + r"""
+const args = arguments[0];
+(async () => {
+    const user = await waitFor('input[aria-label="Username"]', args.timeout_ms);
+    setValue(user, args.username);
+    setValue(find('input[aria-label="Password"]'), args.password);
+    find('xpath://span[text()="Login"]').click();
+    await waitFor('input[aria-label="Username"]', args.timeout_ms, true);
+    finish('login', {ok: true});
+})().catch(e => finish('login', {ok: false, error: e.message}));
+"""
+
+_OPEN_SYSTEM = _PRELUDE + r"""
+const args = arguments[0];
+(async () => {
+    (await waitFor('xpath://div[text()="System"]', args.timeout_ms)).click();
+    await waitFor('input[type="file"]', args.timeout_ms);
+    finish('open_system', {ok: true});
+})().catch(e => finish('open_system', {ok: false, error: e.message}));
+"""
+
+_SET_SERIAL = _PRELUDE + r"""
+const args = arguments[0];
+(async () => {
+    const input = await waitFor('input[name="serialnumber"]', args.timeout_ms);
+    setValue(input, args.serial_number);
+    const submit = find('input[type="submit"][value="Update"]');
+    if (!submit) throw new Error('not found: Update button');
+    const value = input.value;
+    const action = new URL(submit.form ? submit.form.action : location.href, location.href).href;
+    // Answer once the save is through: the form post unloads the page, a script
+    // handled form shows up as a finished request to the form's action
+    await new Promise((resolve, reject) => {
+        const timer = setTimeout(() => reject(new Error('no answer to the serial number update')),
+                                 args.timeout_ms);
+        const observer = new PerformanceObserver(list => {
+            if (list.getEntries().some(e => e.name === action && e.responseEnd > 0)) {
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve();
+            }
+        });
+        observer.observe({type: 'resource'});
+        window.addEventListener('pagehide', () => {
+            clearTimeout(timer);
+            finish('set_serial', {ok: true, value: value, reloaded: true});
+        }, {once: true});
+        submit.click();
+    });
+    finish('set_serial', {ok: true, value: value, reloaded: false});
+})().catch(e => finish('set_serial', {ok: false, error: e.message}));
+"""
+
+
+def _run(driver, script, timeout, **args):
+    """Run one page action in a single round trip, raise if it failed in the page"""
+    args["timeout_ms"] = int(timeout * 1000)
+    driver.set_script_timeout(timeout + 5)
+    result = driver.execute_async_script(script, args)
+    if not result or not result.get("ok"):
+        step = result.get("step") if result else "?"
+        error = result.get("error") if result else "no result"
+        raise Exception(f"Page action '{step}' failed: {error}")
+    return result
+
+
+def login(driver, username="admin", password="admin", timeout=10):
+    """Fill credentials, submit and wait until the login form is gone"""
+    return _run(driver, _LOGIN, timeout, username=username, password=password)
+
+
+def open_system_page(driver, timeout=10):
+    """Open the System page and wait for the firmware file input"""
+    return _run(driver, _OPEN_SYSTEM, timeout)
+
+
+def set_serial_number(driver, serial_number, timeout=10):
+    """Set the serial number on /factoryconfig, submit the form and wait until the save went through"""
+    from selenium.common.exceptions import JavascriptException, WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    page = driver.find_element(By.TAG_NAME, "html")
+    try:
+        result = _run(driver, _SET_SERIAL, timeout, serial_number=serial_number)
+    except (JavascriptException, WebDriverException) as e:
+        # The form post can unload the page before the answer reaches WebDriver
+        if "unloaded" not in str(e):
+            raise
+        result = {"ok": True, "step": "set_serial", "reloaded": True}
+    if result.get("reloaded"):
+        # Nothing of the old page may be used, e.g. its "Exit to bootloader" button
+        WebDriverWait(driver, timeout).until(EC.staleness_of(page))
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+    return result
+
+
+def benchmark(driver, base_url, rounds=10):
+    """
+    Compare the old find_element based steps against the single round trip ones.
+    Every round starts from a fresh, logged out page load. Login and System are
+    timed separately, both approaches wait for the same end condition and no
+    fixed sleeps are counted. Returns the average latency in ms per step and approach.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from browser_cache import clear_device_session
+
+    def fresh_login_page():
+        # A new fragment alone does not reload the SPA, and the session would still be logged in
+        clear_device_session(driver, base_url)
+        driver.get(f"{base_url}/#/login")
+        driver.refresh()
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Username"]'))
+        )
+
+    def timed(step, name, action):
+        start = time.perf_counter()
+        action()
+        results[step][name].append((time.perf_counter() - start) * 1000)
+
+    def old_login():
+        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Username"]').send_keys("admin")
+        driver.find_element(By.CSS_SELECTOR, 'input[aria-label="Password"]').send_keys("admin")
+        driver.find_element(By.XPATH, '//span[text()="Login"]').click()
+        WebDriverWait(driver, 10).until(
+            EC.invisibility_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Username"]'))
+        )
+
+    def old_open_system():
+        WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, '//div[text()="System"]'))
+        ).click()
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'input[type="file"]'))
+        )
+
+    results = {step: {"find_element": [], "page_action": []} for step in ("login", "open_system")}
+    for _ in range(rounds):
+        fresh_login_page()
+        timed("login", "find_element", old_login)
+        timed("open_system", "find_element", old_open_system)
+
+        fresh_login_page()
+        timed("login", "page_action", lambda: login(driver))
+        timed("open_system", "page_action", lambda: open_system_page(driver))
+
+    averages = {}
+    for step, approaches in results.items():
+        averages[step] = {name: sum(values) / len(values) for name, values in approaches.items()}
+        print(f"{step}: " + ", ".join(f"{name} {value:.1f} ms" for name, value in averages[step].items()))
+    return averages
+
+
+if __name__ == "__main__":
+    import sys
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    if len(sys.argv) < 4:
+        print("Usage: python page_actions.py <chromedriver> <chrome> <base_url> [rounds]")
+        sys.exit(1)
+
+    options = Options()
+    options.binary_location = sys.argv[2]
+    options.page_load_strategy = 'eager'
+    bench_driver = webdriver.Chrome(service=Service(sys.argv[1]), options=options)
+    try:
+        benchmark(bench_driver, sys.argv[3], rounds=int(sys.argv[4]) if len(sys.argv) > 4 else 10)
+    finally:
+        bench_driver.quit()
@@ -0,0 +1,36 @@
+from cancellation import CancelToken, Cancelled, run_cancellable
+from fixture import probe_address, program_bootloader
+
+
+def target_connected(result):
+    """ST-LINK_CLI -c SWD output of a slot with an MCU behind it"""
+    return "Device ID" in (result.stdout or "")
+
+
+def stlink_probe(stlink_cli, timeout=5, probe=""):
+    """Probe callable: connect to the SWD target without touching its flash (probe selects the ST-LINK)"""
+    connect = " ".join(filter(None, ["-c", probe_address(probe), "SWD"]))
+
+    def probe_target(cancel_token):
+        return run_cancellable(f'"{stlink_cli}" {connect}', cancel_token, timeout=timeout, shell=True)
+    return probe_target
+
+
+def probe_slots(serial_port, slots, probe, cancel_token=None, settle=1.0):
+    """
+    {slot: present} for the given slots. Routes SWD to each slot the same
+    way as the bootloader stage (reset, settle, select, settle) and connects
+    with probe(cancel_token), a few seconds per slot instead of waiting
+    for a web server timeout on an empty one.
+    """
+    cancel_token = cancel_token or CancelToken()
+    present = {}
+    for slot in slots:
+        try:
+            present[slot] = target_connected(program_bootloader(serial_port, slot, probe, cancel_token, settle))
+        except Cancelled:
+            raise
+        except Exception as e:
+            print(f"Presence probe of slot {slot} failed: {e}")
+            present[slot] = False
+    return present
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+BROWSER_NAMES = ("chrome", "chromedriver")
+
+
+def _tree(pid):
+    """psutil processes of pid and all its children, [] when it is gone"""
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def _kill(processes):
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(processes, timeout=3)
+
+
+def _tree_rss(processes):
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+class BrowserWatchdog:
+    """
+    Tracks the chromedriver -> chrome process tree of every DUT job.
+    Trees that are still alive grace seconds after their job released them,
+    or that grow above memory_cap_mb, are killed and counted as leaks.
+    reap_orphans() kills leftovers of earlier runs started from our driver/browser.
+    Does nothing without psutil.
+    """
+
+    def __init__(self, memory_cap_mb=1500, grace=5.0, interval=5.0, on_leak=None):
+        self.memory_cap = memory_cap_mb * 1024 * 1024
+        self.grace = grace
+        self.interval = interval
+        self.on_leak = on_leak  # called with the leak reason
+        self.trees = {}  # root pid -> {"label", "started", "released", "children"}
+        self.leaks = {}  # reason -> count
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return psutil is not None
+
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, kill_all=True):
+        """Stop watching, by default killing every tree still tracked"""
+        self._stop.set()
+        if kill_all and self.enabled:
+            with self._lock:
+                pids = list(self.trees)
+            for pid in pids:
+                self._kill_tree(pid, "shutdown")
+
+    def track(self, pid, label=""):
+        """Watch the tree under pid (driver.service.process.pid) for a DUT job"""
+        if not self.enabled or not pid:
+            return pid
+        with self._lock:
+            self.trees[pid] = {"label": label, "started": time.monotonic(), "released": None,
+                               "children": set()}
+        self._snapshot(pid)
+        return pid
+
+    def release(self, pid):
+        """The job is done with this tree, it must be gone within the grace period"""
+        with self._lock:
+            if pid in self.trees:
+                self.trees[pid]["released"] = time.monotonic()
+
+    def _snapshot(self, pid):
+        # Remember the children, chrome survives as an orphan when chromedriver dies first
+        children = {process.pid for process in _tree(pid)[1:]}
+        with self._lock:
+            if pid in self.trees:
+                self.trees[pid]["children"] |= children
+
+    def _processes(self, pid, info):
+        processes = _tree(pid)
+        known = {process.pid for process in processes}
+        for child in info["children"] - known:
+            processes.extend(_tree(child))
+        return processes
+
+    def _kill_tree(self, pid, reason):
+        with self._lock:
+            info = self.trees.pop(pid, None)
+        if info is None:
+            return
+        processes = self._processes(pid, info)
+        if not processes:
+            return
+        print(f"Watchdog: killing {len(processes)} browser process(es) of {info['label'] or pid} ({reason})")
+        self._count_leak(reason)
+        _kill(processes)
+
+    def _count_leak(self, reason):
+        with self._lock:
+            self.leaks[reason] = self.leaks.get(reason, 0) + 1
+        if self.on_leak:
+            self.on_leak(reason)
+
+    def check(self):
+        """One watchdog pass over all tracked trees"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self.trees.items())
+        for pid, info in items:
+            if info["released"] is None:
+                self._snapshot(pid)
+            processes = self._processes(pid, info)
+            if not processes:
+                with self._lock:
+                    self.trees.pop(pid, None)
+            elif info["released"] is not None and now - info["released"] > self.grace:
+                self._kill_tree(pid, "outlived_job")
+            elif _tree_rss(processes) > self.memory_cap:
+                self._kill_tree(pid, "memory_cap")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Watchdog check failed: {e}")
+
+    def reap_orphans(self, executables):
+        """Kill browser processes started from one of our executables that no job tracks"""
+        if not self.enabled:
+            return 0
+        paths = {os.path.normcase(os.path.abspath(path)) for path in executables if path}
+        roots = set(os.path.dirname(path) for path in paths)
+        with self._lock:
+            tracked = set(self.trees)
+            for info in self.trees.values():
+                tracked |= info["children"]
+
+        orphans = []
+        for process in psutil.process_iter(["name", "exe"]):
+            name = (process.info.get("name") or "").lower()
+            if not name.startswith(BROWSER_NAMES) or process.pid in tracked:
+                continue
+            exe = process.info.get("exe")
+            if exe and os.path.dirname(os.path.normcase(exe)) in roots:
+                orphans.append(process)
+
+        if orphans:
+            print(f"Watchdog: reaping {len(orphans)} orphaned browser process(es)")
+            for _ in orphans:
+                self._count_leak("orphan")
+            _kill(orphans)
+        return len(orphans)
+
+    def stats(self):
+        """{"tracked": trees alive, "rss": their memory, "oldest": age in s, "leaks": {reason: count}}"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self.trees.items())
+            leaks = dict(self.leaks)
+        rss = sum(_tree_rss(self._processes(pid, info)) for pid, info in items) if self.enabled else 0
+        oldest = max((now - info["started"] for _, info in items), default=0.0)
+        return {"tracked": len(items), "rss": rss, "oldest": oldest, "leaks": leaks}
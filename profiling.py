@@ -0,0 +1,231 @@
+import cProfile
+import glob
+import html
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from PyQt6.QtCore import QObject, QTimer
+
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+
+def _frame_stack(frame):
+    """Folded stack of a frame, root first: 'file:function;file:function;...'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval, cheap enough to leave on for a batch"""
+
+    def __init__(self, thread_ident, interval=0.005):
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is not None:
+                self.samples[_frame_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def write_folded(samples, path):
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def read_folded(path):
+    samples = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                samples[stack] += int(count)
+    return samples
+
+
+def write_flamegraph_svg(samples, path, width=1200, row_height=16):
+    """Minimal flamegraph of folded stacks, no external tools needed"""
+    tree = {}
+    for stack, count in samples.items():
+        node = tree
+        for name in stack.split(";"):
+            entry = node.setdefault(name, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    total = sum(samples.values()) or 1
+    rects = []
+
+    def walk(node, x, depth):
+        for name, (count, children) in sorted(node.items()):
+            w = width * count / total
+            if w >= 0.5:
+                rects.append((x, depth, w, name, count))
+                walk(children, x, depth + 1)
+            x += w
+
+    walk(tree, 0.0, 0)
+    depth = max((r[1] for r in rects), default=0) + 1
+    height = depth * row_height
+
+    with open(path, "w") as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'font-family="monospace" font-size="11">\n')
+        for x, level, w, name, count in rects:
+            y = height - (level + 1) * row_height
+            hue = 20 + (sum(map(ord, name)) % 40)
+            label = html.escape(name) if w > len(name) * 7 else ""
+            f.write(f'<g><title>{html.escape(name)} ({count} samples, {100.0 * count / total:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+                    f'fill="hsl({hue},90%,60%)"/>'
+                    f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{label}</text></g>\n')
+        f.write("</svg>\n")
+
+
+class JobProfiler:
+    """
+    Profiles each DUT job. mode "cprofile" saves <job>.prof,
+    mode "sample" saves <job>.folded from a stack sampler.
+    Each batch gets its own subdirectory of output_dir, merge() combines
+    the batch into merged.prof / merged.folded / flamegraph.svg there.
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR, mode="sample"):
+        self.output_dir = output_dir
+        self.mode = mode
+        self.batch_dir = None
+        self._batches = 0
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _current_batch_dir(self):
+        """Subdirectory of the running batch, created by its first job"""
+        with self._lock:
+            if self.batch_dir is None:
+                self._batches += 1
+                name = f"batch_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._batches}"
+                self.batch_dir = os.path.join(self.output_dir, name)
+                os.makedirs(self.batch_dir, exist_ok=True)
+            return self.batch_dir
+
+    def run(self, name, function):
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+        safe_name = f"{time.strftime('%Y%m%d_%H%M%S')}_{safe_name}"
+        batch_dir = self._current_batch_dir()
+
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(function)
+            finally:
+                profile.dump_stats(os.path.join(batch_dir, f"{safe_name}.prof"))
+
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            return function()
+        finally:
+            sampler.stop()
+            write_folded(sampler.samples, os.path.join(batch_dir, f"{safe_name}.folded"))
+
+    def merge(self):
+        """Merge the per-DUT profiles of the batch that just ended, the next job starts a new batch"""
+        with self._lock:
+            batch_dir, self.batch_dir = self.batch_dir, None
+        if batch_dir is None:
+            return
+
+        prof_files = [p for p in glob.glob(os.path.join(batch_dir, "*.prof"))
+                      if not p.endswith("merged.prof")]
+        if prof_files:
+            stats = pstats.Stats(*prof_files)
+            stats.dump_stats(os.path.join(batch_dir, "merged.prof"))
+
+        folded = Counter()
+        folded_files = [p for p in glob.glob(os.path.join(batch_dir, "*.folded"))
+                        if not p.endswith("merged.folded")]
+        for path in folded_files:
+            folded.update(read_folded(path))
+        if folded:
+            write_folded(folded, os.path.join(batch_dir, "merged.folded"))
+            write_flamegraph_svg(folded, os.path.join(batch_dir, "flamegraph.svg"))
+        print(f"Merged {len(prof_files)} cProfile and {len(folded_files)} sampled profiles into {batch_dir}")
+
+
+class EventLoopLagMonitor(QObject):
+    """
+    Heartbeat QTimer on the Qt main thread plus a watchdog thread.
+    When the heartbeat is late, the watchdog grabs the main thread stack
+    so the blocking handler (slow slot, stylesheet churn, blocking I/O) shows up in the log.
+    """
+
+    def __init__(self, interval_ms=50, threshold_ms=200, log_path=None, parent=None):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000.0
+        self.threshold = threshold_ms / 1000.0
+        self.log_path = log_path or os.path.join(PROFILE_DIR, "event_loop_lag.log")
+        self.main_ident = threading.get_ident()
+        self.stalls = []
+        self.max_lag = 0.0
+        self._last_beat = time.monotonic()
+        self._stall_stack = None
+        self._stop = threading.Event()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._beat)
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        self._last_beat = time.monotonic()
+        self.timer.start()
+        self._watchdog.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._stop.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = now - self._last_beat - self.interval
+        self._last_beat = now
+        self.max_lag = max(self.max_lag, lag)
+
+        if lag > self.threshold:
+            stack = self._stall_stack or "(stack not captured)"
+            self._stall_stack = None
+            self.stalls.append((time.time(), lag, stack))
+            print(f"Qt main thread blocked for {lag * 1000:.0f} ms")
+            with open(self.log_path, "a") as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} blocked {lag * 1000:.0f} ms\n{stack}\n")
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue > self.threshold and self._stall_stack is None:
+                frame = sys._current_frames().get(self.main_ident)
+                if frame is not None:
+                    self._stall_stack = "".join(traceback.format_stack(frame))
@@ -0,0 +1,64 @@
+import re
+import threading
+
+import serial
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+DEFAULT_SERIAL_PATTERN = r"^[A-Za-z0-9_-]{4,32}$"
+
+
+def validate_serial(text, pattern=DEFAULT_SERIAL_PATTERN):
+    """Scanned text stripped of whitespace and control characters, or None if it is not a serial number"""
+    value = "".join(c for c in text if c.isprintable()).strip()
+    if not value or not re.match(pattern, value):
+        return None
+    return value
+
+
+class SerialScanner(QObject):
+    """
+    Barcode scanner on its own COM port (not the mux).
+    Every CR/LF terminated line is emitted as scanned(text) on the Qt thread.
+    """
+
+    scanned = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, port, baudrate=9600, parent=None):
+        super().__init__(parent)
+        self.port = port
+        self.baudrate = baudrate
+        self._stop = threading.Event()
+        self._serial = None
+        self._thread = None
+
+    def start(self):
+        self._serial = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=0.2)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        if self._serial and self._serial.is_open:
+            self._serial.close()
+
+    def _run(self):
+        buffer = bytearray()
+        while not self._stop.is_set():
+            try:
+                data = self._serial.read(64)
+            except serial.SerialException as e:
+                self.error.emit(f"Scanner {self.port} failed: {e}")
+                return
+            buffer.extend(data)
+            while True:
+                end = next((i for i, b in enumerate(buffer) if b in (0x0A, 0x0D)), None)
+                if end is None:
+                    break
+                line = buffer[:end].decode(errors="replace")
+                del buffer[:end + 1]
+                if line.strip():
+                    self.scanned.emit(line)
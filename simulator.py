@@ -0,0 +1,529 @@
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cancellation import CancelToken, Deadline
+from evidence import capture_failure
+from mux import SLOT_COUNT, event_frame
+from stage_timings import DUT_BUDGET
+
+
+# Image the virtual DUTs are flashed with, the fake device does not look at it
+SIM_FIRMWARE = b"firmware"
+
+# Pages of the fake device. They only contain what automate_device touches.
+FACTORYCONFIG_PAGE = """<!DOCTYPE html>
+<html><body>
+<form method="post" action="/factoryconfig">
+  <input name="serialnumber" value="{serial}">
+  <input type="submit" value="Update">
+</form>
+<button onclick="location.href='/bootloader'">Exit to bootloader</button>
+</body></html>
+"""
+
+BOOTLOADER_PAGE = """<!DOCTYPE html>
+<html><body>
+<input type="file" id="Upload-FW">
+<div class="fws-btn fws-btn-upload" onclick="upload()">Upload</div>
+<script>
+function waitForReboot() {
+    setTimeout(() => fetch('/config.json', {cache: 'no-store'})
+        .then(r => { if (r.ok) location.href = '/#/login'; else waitForReboot(); })
+        .catch(waitForReboot), 500);
+}
+function upload() {
+    const file = document.getElementById('Upload-FW').files[0];
+    fetch('/upload', {method: 'POST', body: file}).finally(waitForReboot);
+}
+</script>
+</body></html>
+"""
+
+SPA_PAGE = """<!DOCTYPE html>
+<html><body><div id="app"></div>
+<script>
+const app = document.getElementById('app');
+function showLogin() {
+    app.innerHTML = '<input aria-label="Username"><input aria-label="Password" type="password">' +
+                    '<button><span>Login</span></button>';
+    app.querySelector('button').onclick = () =>
+        fetch('/login', {method: 'POST'}).then(() => { location.hash = '#/home'; showHome(); });
+}
+function showHome() {
+    app.innerHTML = '<div>System</div>';
+    app.querySelector('div').onclick = showSystem;
+}
+function showSystem() {
+    app.innerHTML = '<input type="file"><button><span>Upload</span></button>';
+    app.querySelector('button').onclick = () => {
+        const file = app.querySelector('input').files[0];
+        fetch('/upload', {method: 'POST', body: file}).finally(() => setTimeout(waitForReboot, 500));
+    };
+}
+function waitForReboot() {
+    fetch('/config.json', {cache: 'no-store'}).then(r => { if (r.ok) { location.hash = '#/login'; showLogin(); } else setTimeout(waitForReboot, 500); })
+        .catch(() => setTimeout(waitForReboot, 500));
+}
+showLogin();
+</script>
+</body></html>
+"""
+
+
+class SimulatedSlot:
+    """One fixture position of the simulator"""
+
+    def __init__(self, present=True, boot_latency=1.0, program_latency=2.0,
+                 flash_latency=1.0, reboot_latency=3.0, failure_rate=0.0):
+        self.present = present
+        self.boot_latency = boot_latency
+        self.program_latency = program_latency
+        self.flash_latency = flash_latency
+        self.reboot_latency = reboot_latency
+        self.failure_rate = failure_rate
+        self.serial_number = ""
+        self.firmware_version = "bootloader"
+
+    def roll_failure(self):
+        return random.random() < self.failure_rate
+
+
+class FakeDevice:
+    """
+    The device behind 192.168.0.100, served on localhost.
+    Which slot answers depends on the service channel the FakeMux selected.
+    """
+
+    def __init__(self, slots, host="127.0.0.1", port=0, firmware_version="sim-1.0"):
+        self.slots = slots
+        self.host = host
+        self.port = port
+        self.new_firmware_version = firmware_version
+        self.active_slot = None
+        self.server = None
+        self.lock = threading.Lock()
+        self._generation = 0
+        self.boot_count = 0  # web server starts, lets a client see a reboot it was too slow to catch
+
+    def _make_handler(self):
+        device = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, body, content_type="text/html", status=200):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _active_slot(self):
+                """Slot behind the service channel, or None after answering 503 (power off raced the request)"""
+                slot = device.slots.get(device.active_slot)
+                if slot is None:
+                    self._send("no slot powered", "text/plain", 503)
+                return slot
+
+            def do_GET(self):
+                slot = self._active_slot()
+                if slot is None:
+                    return
+                path = self.path.split("?")[0]
+                if path == "/factoryconfig":
+                    self._send(FACTORYCONFIG_PAGE.format(serial=slot.serial_number))
+                elif path == "/bootloader":
+                    self._send(BOOTLOADER_PAGE)
+                elif path == "/config.json":
+                    self._send(json.dumps({"deviceInfo": {
+                        "serialNumber": slot.serial_number,
+                        "firmwareVersion": slot.firmware_version,
+                    }, "bootCount": device.boot_count}), "application/json")
+                elif path in ("/", "/index.html"):
+                    self._send(SPA_PAGE)
+                else:
+                    self._send("not found", "text/plain", 404)
+
+            def do_POST(self):
+                slot = self._active_slot()
+                if slot is None:
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/factoryconfig":
+                    form = urllib.parse.parse_qs(body.decode())
+                    serial_number = form.get("serialnumber", [""])[0]
+                    # A failing slot keeps a corrupted serial number
+                    slot.serial_number = serial_number[:-1] if slot.roll_failure() else serial_number
+                    self.send_response(303)
+                    self.send_header("Location", "/factoryconfig")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif self.path == "/upload":
+                    self._send("ok", "text/plain")
+                    device.reboot(slot, slot.flash_latency, slot.reboot_latency, new_firmware=True)
+                elif self.path == "/login":
+                    self._send("{}", "application/json")
+                else:
+                    self._send("not found", "text/plain", 404)
+
+        return Handler
+
+    def _start_server(self):
+        ThreadingHTTPServer.allow_reuse_address = True
+        server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        server.daemon_threads = True
+        self.port = server.server_address[1]
+        self.boot_count += 1
+        # Short poll, a mux write that powers the slot off waits for the shutdown
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        self.server = server
+
+    def _stop_server(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def reserve_port(self):
+        """Pick the port once, so automate_device knows where to look"""
+        if not self.port:
+            self._start_server()
+            self._stop_server()
+        return self.port
+
+    def power_on(self, slot_number):
+        """Service channel selected - the slot boots after its boot latency"""
+        with self.lock:
+            self._generation += 1
+            generation = self._generation
+            self.active_slot = slot_number
+            self._stop_server()
+        slot = self.slots[slot_number]
+        if not slot.present:
+            return
+
+        def boot():
+            time.sleep(slot.boot_latency)
+            with self.lock:
+                if generation == self._generation:
+                    self._start_server()
+
+        threading.Thread(target=boot, daemon=True).start()
+
+    def power_off(self, slots=None):
+        """Power off the running slot, only if it is one of slots (the ones on the calling mux)"""
+        with self.lock:
+            if slots is not None and self.active_slot not in slots:
+                return
+            self._generation += 1
+            self.active_slot = None
+            self._stop_server()
+
+    def reboot(self, slot, flash_latency, reboot_latency, new_firmware=False):
+        with self.lock:
+            generation = self._generation
+
+        def run():
+            time.sleep(flash_latency)
+            with self.lock:
+                if generation != self._generation:
+                    return
+                self._stop_server()
+            time.sleep(reboot_latency)
+            with self.lock:
+                if generation != self._generation:
+                    return
+                if new_firmware:
+                    slot.firmware_version = self.new_firmware_version
+                self._start_server()
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+class FakeMux:
+    """Stand-in for the pyserial port of the hardware multiplexer"""
+
+    def __init__(self, device, slots=8, settle=0.0, first_slot=1, dut_count=None, port="SIM"):
+        self.device = device
+        self.slots = slots  # channels per side, SWD 1..slots and service slots+1..2*slots
+        self.settle = settle  # relay switching time, SWD is not routed before it passed
+        # Station slots wired to this mux, channel n is slot first_slot + n - 1
+        self.first_slot = first_slot
+        self.owned = range(first_slot, first_slot + (dut_count or slots))
+        self.is_open = True
+        self.port = port
+        self.bootloader_slot = None
+        self.switched_at = 0.0
+        self.unsettled_switches = 0
+        self.frames = []
+        self._incoming = bytearray()
+        self._incoming_lock = threading.Lock()
+
+    def write(self, data):
+        data = bytes(data)
+        self.frames.append((time.monotonic(), data))
+        if len(data) != 4 or data[0] != 0x41 or data[3] != 0x0D:
+            return len(data)
+
+        now = time.monotonic()
+        if now - self.switched_at < self.settle:
+            self.unsettled_switches += 1
+        self.switched_at = now
+        channel = data[2]
+        if channel == 0xFF:
+            self.bootloader_slot = None
+            self.device.power_off(self.owned)
+        elif 1 <= channel <= self.slots:
+            slot = self.first_slot + channel - 1
+            self.bootloader_slot = slot if slot in self.owned else None
+            self.device.power_off(self.owned)
+        elif self.slots < channel <= 2 * self.slots:
+            self.bootloader_slot = None
+            slot = self.first_slot + channel - self.slots - 1
+            if slot in self.owned:
+                self.device.power_on(slot)
+        return len(data)
+
+    def routed_slot(self):
+        """Slot SWD is routed to, None while the relays are still settling"""
+        if time.monotonic() - self.switched_at < self.settle:
+            return None
+        return self.bootloader_slot
+
+    def feed(self, data):
+        """Queue bytes the fake mux will 'send' to the app"""
+        with self._incoming_lock:
+            self._incoming.extend(data)
+
+    def script(self, events):
+        """Play [(delay seconds, event name)] as fixture events, e.g. [(5, "lid_closed")]"""
+        for delay, name in events:
+            timer = threading.Timer(delay, self.feed, args=(event_frame(name),))
+            timer.daemon = True
+            timer.start()
+
+    @property
+    def in_waiting(self):
+        with self._incoming_lock:
+            return len(self._incoming)
+
+    def read(self, size=1):
+        with self._incoming_lock:
+            data = bytes(self._incoming[:size])
+            del self._incoming[:size]
+        return data
+
+    def reset_input_buffer(self):
+        with self._incoming_lock:
+            self._incoming.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeProgrammer:
+    """Replaces flash.bat / ST-LINK_CLI, programs whichever slot the mux routed SWD to"""
+
+    def __init__(self, mux, slots):
+        self.mux = mux
+        self.slots = slots
+
+    def __call__(self, bootloader_path, cancel_token=None):
+        cancel_token = cancel_token or CancelToken()
+        slot_number = self.mux.routed_slot()
+        slot = self.slots.get(slot_number)
+
+        if slot is None or not slot.present:
+            cancel_token.sleep(0.5)
+            return subprocess.CompletedProcess("sim", 1, "Unable to connect to ST-LINK target!\n", "")
+
+        cancel_token.sleep(slot.program_latency)
+        if slot.roll_failure():
+            return subprocess.CompletedProcess("sim", 1, "Flash memory erased.\nProgramming Failed\n", "")
+
+        slot.firmware_version = "bootloader"
+        return subprocess.CompletedProcess(
+            "sim", 0,
+            f"Flash memory erased.\nProgramming Complete.\nVerification...OK\nFile: {bootloader_path}\n", "")
+
+    def probe(self, cancel_token=None):
+        """ST-LINK_CLI -c SWD on the routed slot"""
+        cancel_token = cancel_token or CancelToken()
+        slot = self.slots.get(self.mux.routed_slot())
+        cancel_token.sleep(0.1)
+        if slot is None or not slot.present:
+            return subprocess.CompletedProcess("sim", 1, "Unable to connect to ST-LINK target!\n", "")
+        return subprocess.CompletedProcess("sim", 0, "Connected via SWD.\nDevice ID:0x413\n", "")
+
+
+class Simulator:
+    """Virtual mux, programmer and device web server for running the GUI without hardware"""
+
+    def __init__(self, slot_count=8, failure_rate=0.0, latency_scale=1.0, empty_slots=(),
+                 firmware_version="sim-1.0", settle=0.0, mux_count=1):
+        self.slots = {}
+        for slot_number in range(1, slot_count + 1):
+            self.slots[slot_number] = SimulatedSlot(
+                present=slot_number not in empty_slots,
+                boot_latency=1.0 * latency_scale * random.uniform(0.8, 1.2),
+                program_latency=2.0 * latency_scale * random.uniform(0.8, 1.2),
+                flash_latency=1.0 * latency_scale,
+                reboot_latency=3.0 * latency_scale * random.uniform(0.8, 1.2),
+                failure_rate=failure_rate,
+            )
+        self.device = FakeDevice(self.slots, firmware_version=firmware_version)
+        self.device.reserve_port()
+        if mux_count == 1:
+            self.muxes = [FakeMux(self.device, slots=slot_count, settle=settle)]
+        else:
+            # Several 8 channel muxes, each with its own ST-LINK, sharing the device IP
+            per_mux = -(-slot_count // mux_count)
+            self.muxes = [
+                FakeMux(self.device, slots=SLOT_COUNT, settle=settle, first_slot=i * per_mux + 1,
+                        dut_count=min(per_mux, slot_count - i * per_mux), port=f"SIM{i + 1}")
+                for i in range(mux_count)
+            ]
+        self.programmers = [FakeProgrammer(mux, self.slots) for mux in self.muxes]
+        self.mux = self.muxes[0]
+        self.programmer = self.programmers[0]
+
+    def firmware_file(self):
+        """Path of SIM_FIRMWARE on disk, for callers that upload a firmware file (the async core)"""
+        path = os.path.join(tempfile.gettempdir(), "sim_firmware.acfr")
+        with open(path, "wb") as f:
+            f.write(SIM_FIRMWARE)
+        return path
+
+    def fixture_groups(self):
+        """station_config "fixture" entries of the virtual muxes, probe n is the ST-LINK of mux n + 1"""
+        if len(self.muxes) == 1:
+            return []
+        return [{"name": f"mux{i + 1}", "mux_port": mux.port, "probe": str(i), "slots": list(mux.owned)}
+                for i, mux in enumerate(self.muxes)]
+
+    def programmer_for(self, probe):
+        return self.programmers[int(probe or 0)]
+
+    def automate_kwargs(self):
+        """Extra automate_device arguments that point it at the simulator"""
+        return {
+            "device_ip": self.device.host,
+            "device_port": self.device.port,
+            "programmer": self.programmer,
+        }
+
+
+def automate_device_without_browser(serial_number,
+                                    bootloader_path,
+                                    bootloader_callback,
+                                    serial_verify_callback,
+                                    serial_port,
+                                    cycle_number,
+                                    programmer,
+                                    device_ip="127.0.0.1",
+                                    device_port=80,
+                                    stage_callback=None,
+                                    cancel_token=None,
+                                    budget=DUT_BUDGET,
+                                    evidence_callback=None,
+                                    bootloader_result=None,
+                                    **kwargs):
+    """
+    Same steps and callbacks as automate_device, with plain HTTP instead of Chrome.
+    Lets the GUI and queue be load-tested with hundreds of virtual DUTs.
+    """
+    cancel_token = cancel_token or CancelToken()
+    deadline = Deadline(budget, cancel_token)
+    result = None
+    base_url = f"http://{device_ip}:{device_port}"
+
+    def report_stage(stage, started):
+        cancel_token.check()
+        if stage_callback:
+            stage_callback(stage, time.monotonic() - started)
+
+    def boot_count():
+        return json.loads(urllib.request.urlopen(base_url + "/config.json", timeout=5).read())["bootCount"]
+
+    def wait_up(timeout, booted_from=None):
+        """Poll until the device answers, with booted_from only once it booted again since"""
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            try:
+                info = json.loads(urllib.request.urlopen(base_url + "/config.json", timeout=0.5).read())
+                if booted_from is None or info["bootCount"] != booted_from:
+                    return True
+            except OSError:
+                pass
+            cancel_token.sleep(0.1)
+        return False
+
+    try:
+        if bootloader_result is not None:
+            result = bootloader_result
+        else:
+            serial_port.write(bytes([0x41, 0x01, 0xFF, 0x0D]))
+            serial_port.write(bytes([0x41, 0x01, cycle_number, 0x0D]))
+            stage_start = deadline.enter("bootloader")
+            result = programmer(bootloader_path, cancel_token)
+        boot_ok = "Programming Complete" in result.stdout and "Verification...OK" in result.stdout
+        bootloader_callback(boot_ok)
+        if not boot_ok:
+            raise Exception("Bootloader upload failed")
+        if bootloader_result is None:
+            report_stage("bootloader", stage_start)
+
+        serial_port.write(bytes([0x41, 0x01, 0xFF, 0x0D]))
+        serial_port.write(bytes([0x41, 0x01, cycle_number + 8, 0x0D]))
+
+        stage_start = deadline.enter("readiness")
+        if not wait_up(deadline.cap(30)):
+            raise Exception("Device web server did not become ready in time")
+        report_stage("readiness", stage_start)
+
+        stage_start = deadline.enter("set_serial")
+        data = urllib.parse.urlencode({"serialnumber": serial_number}).encode()
+        urllib.request.urlopen(base_url + "/factoryconfig", data=data, timeout=5).read()
+        report_stage("set_serial", stage_start)
+
+        stage_start = deadline.enter("upload_total")
+        booted_from = boot_count()
+        urllib.request.urlopen(base_url + "/upload", data=SIM_FIRMWARE, timeout=5).read()
+        # A reboot can be shorter than any poll interval, the boot counter still shows it
+        if not wait_up(deadline.cap(60), booted_from):
+            raise Exception("Device did not come back after firmware upload")
+        report_stage("upload_total", stage_start)
+
+        stage_start = deadline.enter("verify")
+        info = json.loads(urllib.request.urlopen(base_url + "/config.json", timeout=5).read())
+        report_stage("verify", stage_start)
+
+        sn_match = info["deviceInfo"]["serialNumber"] == serial_number
+        serial_verify_callback(sn_match)
+        if not sn_match:
+            raise Exception(f"Serial number mismatch, device reports {info['deviceInfo']['serialNumber']}")
+
+    except Exception as e:
+        serial_verify_callback(False)
+        evidence = None
+        if evidence_callback and (deadline.is_over() or not cancel_token.is_cancelled()):
+            evidence = evidence_callback(f"{serial_number}_slot{cycle_number}", capture_failure(e, programmer_output=result))
+        if deadline.is_over():
+            error = deadline.exceeded()
+            error.evidence = evidence
+            raise error from e
+        e.evidence = evidence
+        raise
+
+    finally:
+        deadline.stop()
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+
+from stage_timings import percentile
+
+
+HEALTH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slot_health.json")
+
+
+class SlotHealth:
+    """
+    Outcome per fixture slot across batches, kept in a JSON file.
+    A slot is flagged when its recent failure rate, or its recent median of
+    a stage against the other slots, drifts beyond the thresholds.
+    Flagged slots are quarantined until the operator releases them.
+    """
+
+    def __init__(self, path=HEALTH_FILE, window=20, min_samples=5,
+                 max_failure_rate=0.3, max_latency_ratio=1.5):
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.max_latency_ratio = max_latency_ratio
+        self._lock = threading.Lock()
+        self._results = {}  # slot (str) -> [1 pass / 0 fail], newest last
+        self._quarantined = {}  # slot (str) -> reason
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._results = data.get("results", {})
+            self._quarantined = data.get("quarantined", {})
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable slot health: {e}")
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"results": self._results, "quarantined": self._quarantined})
+        try:
+            with open(self.path, "w") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to save slot health: {e}")
+
+    def record(self, slot, success):
+        with self._lock:
+            values = self._results.setdefault(str(slot), [])
+            values.append(1 if success else 0)
+            del values[:-self.window]
+
+    def failure_rate(self, slot):
+        """Failure rate of the last window results, None with too few results"""
+        with self._lock:
+            values = list(self._results.get(str(slot), []))
+        if len(values) < self.min_samples:
+            return None
+        return 1.0 - sum(values) / len(values)
+
+    def latency_drift(self, timing_history, slot, stages):
+        """(stage, ratio) of the stage whose recent median is furthest above the other slots, or None"""
+        worst = None
+        for stage in stages:
+            recent = timing_history.samples(stage, slot)[-self.window:]
+            others = [v for other in timing_history.slots(stage) if other != slot
+                      for v in timing_history.samples(stage, other)[-self.window:]]
+            if len(recent) < self.min_samples or len(others) < self.min_samples:
+                continue
+            baseline = percentile(others, 50)
+            if baseline <= 0:
+                continue
+            ratio = percentile(recent, 50) / baseline
+            if worst is None or ratio > worst[1]:
+                worst = (stage, ratio)
+        return worst
+
+    def check(self, slot, timing_history=None, stages=()):
+        """Reason the slot is unhealthy (and quarantine it), or None"""
+        reason = None
+        rate = self.failure_rate(slot)
+        if rate is not None and rate > self.max_failure_rate:
+            reason = f"{rate:.0%} failures in the last {self.window} DUTs"
+        elif timing_history is not None:
+            drift = self.latency_drift(timing_history, slot, stages)
+            if drift and drift[1] > self.max_latency_ratio:
+                reason = f"{drift[0]} {drift[1]:.1f}x slower than the other slots"
+        if reason:
+            with self._lock:
+                self._quarantined[str(slot)] = reason
+        return reason
+
+    def quarantined(self):
+        """{slot: reason} of all quarantined slots"""
+        with self._lock:
+            return {int(slot): reason for slot, reason in self._quarantined.items()}
+
+    def release(self, slot=None, timing_history=None):
+        """Release one slot (or all) after the fixture was repaired, its history starts over"""
+        with self._lock:
+            slots = [str(slot)] if slot is not None else list(self._quarantined)
+            for key in slots:
+                self._quarantined.pop(key, None)
+                self._results.pop(key, None)
+        if timing_history is not None:
+            for key in slots:
+                timing_history.forget(key)
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stage_timings.json")
+
+# Stages of one DUT in the order automate_device reports them
+STAGE_ORDER = (
+    "bootloader",
+    "readiness",
+    "http_replay",
+    "browser_start",
+    "page_load",
+    "set_serial",
+    "exit_to_bootloader",
+    "upload",
+    "flash",
+    "reboot",
+    "login_page",
+    "login",
+    "verify",
+)
+
+# stage: (default timeout, safety floor) in seconds
+# The default is used until enough history exists, the floor is never undercut.
+DEFAULT_TIMEOUTS = {
+    "bootloader": (60, 15),
+    "readiness": (30, 5),
+    "page_load": (5, 2),
+    "set_serial": (10, 3),
+    "exit_to_bootloader": (10, 3),
+    "upload_total": (60, 20),
+    "login": (10, 3),
+    "verify": (5, 2),
+}
+
+# Time budget of a whole DUT job in seconds, shared by all stages (cancellation.Deadline)
+DUT_BUDGET = 180
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class TimingHistory:
+    """
+    Real stage durations per slot, kept across runs in a JSON file.
+    Used to replace the hard-coded waits with p99 based timeouts.
+    """
+
+    def __init__(self, path=HISTORY_FILE, max_samples=500, min_samples=20,
+                 pct=99, margin=1.25, pad=1.0):
+        self.path = path
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.pct = pct
+        self.margin = margin
+        self.pad = pad
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> slot (str) -> [seconds]
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._samples = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable timing history: {e}")
+            self._samples = {}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._samples)
+        try:
+            with open(self.path, "w") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to save timing history: {e}")
+
+    def record(self, stage, slot, seconds):
+        with self._lock:
+            values = self._samples.setdefault(stage, {}).setdefault(str(slot), [])
+            values.append(round(seconds, 3))
+            del values[:-self.max_samples]
+
+    def samples(self, stage, slot=None):
+        """Samples of one slot, or of all slots when slot is None"""
+        with self._lock:
+            per_slot = self._samples.get(stage, {})
+            if slot is not None:
+                return list(per_slot.get(str(slot), []))
+            return [v for values in per_slot.values() for v in values]
+
+    def slots(self, stage):
+        """Slots with samples of this stage"""
+        with self._lock:
+            return [int(slot) for slot in self._samples.get(stage, {})]
+
+    def forget(self, slot):
+        """Drop all samples of a slot, e.g. after its fixture channel was repaired"""
+        with self._lock:
+            for per_slot in self._samples.values():
+                per_slot.pop(str(slot), None)
+
+    def timeout_for(self, stage, slot, default, floor):
+        """
+        p99 * margin + pad of this slot's history (all slots if the slot is new),
+        never below the floor. Falls back to the default without enough history.
+        """
+        values = self.samples(stage, slot)
+        if len(values) < self.min_samples:
+            values = self.samples(stage)
+        if len(values) < self.min_samples:
+            return default
+        return max(floor, percentile(values, self.pct) * self.margin + self.pad)
+
+    def timeouts_for(self, slot, defaults=DEFAULT_TIMEOUTS):
+        """All stage timeouts for one slot"""
+        return {
+            stage: self.timeout_for(stage, slot, default, floor)
+            for stage, (default, floor) in defaults.items()
+        }
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+
+
+class StationAgent:
+    """
+    Station side of coordinator.py: lease jobs, run them, report results.
+    run_job(job) returns (success, message) and is called once per DUT.
+    """
+
+    def __init__(self, coordinator_url, station_id, run_job=None, max_jobs=8,
+                 artifact_dir=None, idle_wait=2.0):
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.station_id = station_id
+        self.run_job = run_job
+        self.max_jobs = max_jobs
+        self.idle_wait = idle_wait
+        self.artifact_dir = artifact_dir or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "artifacts")
+        self.artifacts = {}
+        self.lease_timeout = None
+        self.stopped = False
+
+    def _post(self, path, data):
+        request = urllib.request.Request(
+            self.coordinator_url + path,
+            data=json.dumps(data).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+
+    def register(self):
+        reply = self._post("/register", {"station_id": self.station_id})
+        self.artifacts = reply.get("artifacts", {})
+        self.lease_timeout = reply.get("lease_timeout")
+        return reply
+
+    def artifact_path(self, name):
+        """Local copy of a coordinator artifact, downloaded only when the hash changed"""
+        if not name:
+            return None
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        path = os.path.join(self.artifact_dir, name)
+        expected = self.artifacts.get(name)
+
+        if os.path.exists(path) and expected:
+            with open(path, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() == expected:
+                    return path
+
+        with urllib.request.urlopen(f"{self.coordinator_url}/artifact/{name}", timeout=60) as response:
+            data = response.read()
+        if expected and hashlib.sha256(data).hexdigest() != expected:
+            raise Exception(f"Artifact {name} failed checksum")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def lease(self, max_jobs=None):
+        reply = self._post("/lease", {
+            "station_id": self.station_id,
+            "max_jobs": max_jobs or self.max_jobs,
+        })
+        return reply.get("jobs", []), reply.get("done", False)
+
+    def renew(self, jobs):
+        """Extend the leases of jobs still being worked on, returns the job ids the station lost"""
+        if not jobs:
+            return []
+        reply = self._post("/renew", {
+            "station_id": self.station_id,
+            "job_ids": [job["job_id"] for job in list(jobs)],
+        })
+        return reply.get("lost", [])
+
+    def report(self, job, success, message="", duration=None):
+        reply = self._post("/result", {
+            "station_id": self.station_id,
+            "job_id": job["job_id"],
+            "success": success,
+            "message": message,
+            "duration": duration,
+        })
+        if not reply.get("ok"):
+            raise Exception(f"Coordinator rejected the result of job {job['job_id']}: {reply.get('error')}")
+        return reply
+
+    def _keep_leases(self, jobs, finished):
+        """Renew the leases of jobs until finished is set, every third of the lease timeout"""
+        interval = (self.lease_timeout or 600) / 3
+        while not finished.wait(interval):
+            try:
+                lost = self.renew(jobs)
+            except Exception as e:
+                print(f"Station {self.station_id}: lease renewal failed, {e}")
+                continue
+            for job_id in lost:
+                print(f"Station {self.station_id}: lease of job {job_id} was lost")
+
+    def run(self):
+        """Lease / run / report until the coordinator has no work left"""
+        self.register()
+        while not self.stopped:
+            jobs, done = self.lease()
+            if not jobs:
+                if done:
+                    break
+                time.sleep(self.idle_wait)
+                continue
+
+            open_jobs = list(jobs)
+            finished = threading.Event()
+            threading.Thread(target=self._keep_leases, args=(open_jobs, finished), daemon=True).start()
+            try:
+                for job in jobs:
+                    start = time.monotonic()
+                    try:
+                        success, message = self.run_job(job)
+                    except Exception as e:
+                        success, message = False, str(e)
+                    open_jobs.remove(job)
+                    try:
+                        self.report(job, success, message, time.monotonic() - start)
+                    except Exception as e:
+                        print(f"Station {self.station_id}: {e}")
+            finally:
+                finished.set()
+
+        print(f"Station {self.station_id} finished")
+
+
+def simulated_job_runner(cycle_time=1.0, failure_rate=0.0, jitter=0.2):
+    """run_job for a simulated station: sleeps for one cycle and fails at random"""
+    def run_job(job):
+        time.sleep(cycle_time * random.uniform(1 - jitter, 1 + jitter))
+        if random.random() < failure_rate:
+            return False, "Simulated failure"
+        return True, "Successfully processed"
+    return run_job
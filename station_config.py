@@ -0,0 +1,190 @@
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from stage_timings import DUT_BUDGET
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(BASE_DIR, "station_config.json")
+CACHE_FILE = os.path.join(BASE_DIR, "station_config.cache.json")
+
+# Old fixed install location, still searched so existing stations keep working
+LEGACY_ROOT = r"D:\MULTIPROGRAMMER"
+
+DEFAULT_CONFIG = {
+    "install_root": "",
+    "bat_file": "",
+    "driver_path": "",
+    "chrome_path": "",
+    "stlink_cli": "",
+    "mux_port": "",
+    "mux_port_hint": "USB",
+    "device_ip": "192.168.0.100",
+    "dut_budget": DUT_BUDGET,
+    "scanner_port": "",
+    "serial_pattern": "",
+    "banks": 1,
+    "auto_start": False,
+    "skip_quarantined": False,
+    "mes_url": "",
+    "http_script": "",
+    "fixture": [],
+    "async_core": False,
+    "batch_order": "dut",
+}
+
+# key -> glob patterns relative to each search root
+SEARCH_PATTERNS = {
+    "bat_file": ["flash.bat"],
+    "driver_path": ["chromedriver-win64/*/chromedriver.exe", "chromedriver-win64/chromedriver.exe",
+                    "chromedriver*/chromedriver", "chromedriver.exe", "chromedriver"],
+    "chrome_path": ["chrome-win64/*/chrome.exe", "chrome-win64/chrome.exe", "chrome*/chrome", "chrome.exe"],
+    "stlink_cli": ["STMicroelectronics/STM32 ST-LINK Utility/ST-LINK Utility/ST-LINK_CLI.exe",
+                   "ST-LINK Utility/ST-LINK_CLI.exe", "ST-LINK_CLI.exe"],
+}
+EXECUTABLE_NAMES = {
+    "driver_path": "chromedriver",
+    "stlink_cli": "ST-LINK_CLI",
+}
+
+
+def _search_roots(config):
+    roots = [config.get("install_root"), BASE_DIR, LEGACY_ROOT,
+             os.environ.get("ProgramFiles(x86)"), os.environ.get("ProgramFiles")]
+    return [root for root in roots if root and os.path.isdir(root)]
+
+
+def _discover(key, config):
+    for root in _search_roots(config):
+        for pattern in SEARCH_PATTERNS[key]:
+            matches = sorted(glob.glob(os.path.join(root, pattern)))
+            if matches:
+                return os.path.normpath(matches[-1])
+    name = EXECUTABLE_NAMES.get(key)
+    return shutil.which(name) if name else None
+
+
+def _version(key, path):
+    """Version string of the driver/browser, or None"""
+    if key == "chrome_path":
+        # chrome.exe --version prints nothing on Windows, the install dir has a <version>.manifest
+        for manifest in glob.glob(os.path.join(os.path.dirname(path), "*.manifest")):
+            match = re.match(r"(\d+\.\d+\.\d+\.\d+)\.manifest$", os.path.basename(manifest))
+            if match:
+                return match.group(1)
+    if key in ("chrome_path", "driver_path"):
+        try:
+            output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+        match = re.search(r"(\d+\.\d+\.\d+\.\d+)", output)
+        return match.group(1) if match else None
+    return None
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def _discover_mux_port(hint):
+    try:
+        import serial.tools.list_ports
+    except ImportError:
+        return ""
+    for port in serial.tools.list_ports.comports():
+        if hint and hint.lower() in f"{port.description} {port.hwid}".lower():
+            return port.device
+    return ""
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_station_config(config_path=CONFIG_FILE, cache_path=CACHE_FILE, refresh=False):
+    """
+    Station paths from station_config.json, missing entries are auto-discovered.
+    The resolved paths and versions are cached together with the mtimes of the
+    config file and every resolved file, so later launches skip discovery and
+    the --version calls unless something on disk changed.
+    """
+    config = dict(DEFAULT_CONFIG)
+    config.update(_load_json(config_path) or {})
+    config_stamp = _file_stamp(config_path)
+
+    cache = None if refresh else _load_json(cache_path)
+    if cache and cache.get("config_stamp") == config_stamp:
+        resolved = cache.get("resolved", {})
+        stamps = cache.get("stamps", {})
+        if all(_file_stamp(resolved[key]) == stamps.get(key) for key in SEARCH_PATTERNS if resolved.get(key)):
+            return {**DEFAULT_CONFIG, **resolved}
+
+    resolved = dict(config)
+    stamps = {}
+    versions = {}
+    for key in SEARCH_PATTERNS:
+        path = config.get(key)
+        if not path or not os.path.isfile(path):
+            path = _discover(key, config)
+            if config.get(key):
+                print(f"Configured {key} not found, discovered {path}")
+        resolved[key] = path or ""
+        if path:
+            stamps[key] = _file_stamp(path)
+            versions[key] = _version(key, path)
+    resolved["versions"] = versions
+
+    if not resolved.get("mux_port"):
+        resolved["mux_port"] = _discover_mux_port(config.get("mux_port_hint"))
+
+    check_versions(resolved)
+
+    try:
+        with open(cache_path, "w") as f:
+            json.dump({"config_stamp": config_stamp, "stamps": stamps, "resolved": resolved}, f, indent=2)
+    except OSError as e:
+        print(f"Could not write {cache_path}: {e}")
+    return resolved
+
+
+def check_versions(resolved):
+    """Warn when chromedriver and Chrome for Testing have different major versions"""
+    versions = resolved.get("versions", {})
+    driver, chrome = versions.get("driver_path"), versions.get("chrome_path")
+    if driver and chrome and driver.split(".")[0] != chrome.split(".")[0]:
+        print(f"Warning: chromedriver {driver} does not match Chrome {chrome}")
+        return False
+    return True
+
+
+def write_default_config(path=CONFIG_FILE):
+    """Write a config file with the discovered paths filled in, as a starting point for a station"""
+    resolved = load_station_config(path, refresh=True)
+    with open(path, "w") as f:
+        json.dump({key: resolved.get(key, value) for key, value in DEFAULT_CONFIG.items()}, f, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or create the station configuration")
+    parser.add_argument("--write", action="store_true", help="write station_config.json from the discovered paths")
+    parser.add_argument("--refresh", action="store_true", help="ignore the discovery cache")
+    args = parser.parse_args()
+
+    if args.write:
+        print(f"Wrote {write_default_config()}")
+    print(json.dumps(load_station_config(refresh=args.refresh), indent=2))
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import dut_machine
+from simulator import Simulator
+
+
+# The batch takes several budgets, each DUT's own work fits in one
+BUDGET = 2
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    simulator = Simulator(latency_scale=0.1)
+    yield simulator
+    simulator.device.power_off()
+
+
+@pytest.fixture(scope="module")
+def transitions(simulator):
+    """All 8 slots through one AsyncCore, the transitions per slot"""
+    lock = threading.Lock()
+    transitions = {}
+
+    def on_transition(job, state, previous, seconds, detail):
+        with lock:
+            transitions.setdefault(job.slot, []).append((state, previous, seconds, detail))
+
+    core = dut_machine.AsyncCore(on_transition, host=simulator.device.host, port=simulator.device.port, settle=0)
+    try:
+        firmware = simulator.firmware_file()
+        futures = [
+            core.submit(dut_machine.DutJob(f"SN{slot:06d}", slot, firmware, simulator.mux,
+                                           lambda token: simulator.programmer("boot.bin", token), budget=BUDGET))
+            for slot in range(1, 9)
+        ]
+        for future in futures:
+            future.result(timeout=60)
+    finally:
+        core.stop()
+    return transitions
+
+
+def test_all_slots_pass_on_the_simulator(simulator, transitions):
+    for slot in range(1, 9):
+        states = [state for state, _, _, _ in transitions[slot]]
+        assert states == [dut_machine.MUX_SELECT, dut_machine.BOOTLOADER, dut_machine.WAIT_DEVICE,
+                          dut_machine.SERVICE_SELECT, dut_machine.READY, dut_machine.INJECT_SN,
+                          dut_machine.UPLOAD, dut_machine.REBOOT, dut_machine.VERIFY, dut_machine.DONE], \
+            transitions[slot][-1][3]
+        assert simulator.slots[slot].serial_number == f"SN{slot:06d}"
+
+
+def test_waiting_for_the_device_does_not_count(transitions):
+    # The last slot finished long after one budget, only the stages it held the mux or device for counted
+    assert sum(seconds for _, _, seconds, _ in transitions[8]) > BUDGET
+    for slot in range(1, 9):
+        bootloader = next(seconds for _, previous, seconds, _ in transitions[slot]
+                          if previous == dut_machine.BOOTLOADER)
+        # Programming takes 0.2 s +-20%, the wait for the device is timed under WAIT_DEVICE
+        assert bootloader < 0.5
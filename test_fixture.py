@@ -0,0 +1,34 @@
+import pytest
+
+from fixture import Fixture, FixtureGroup
+from mux import select_frame
+
+
+class RecordingPort:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(bytes(data)[2])
+        return len(data)
+
+
+def test_groups_on_separate_muxes_run_in_parallel():
+    left, right = RecordingPort(), RecordingPort()
+    fixture = Fixture([FixtureGroup("left", left, [1, 2]), FixtureGroup("right", right, [3, 4], "1")])
+
+    assert fixture.parallel
+    fixture.port_for(4).write(select_frame(4))
+    assert right.frames == [2]
+    assert fixture.probe_for(3) == "1"
+
+
+def test_groups_sharing_a_mux_are_rejected():
+    port = RecordingPort()
+    with pytest.raises(ValueError, match="share a mux port"):
+        Fixture([FixtureGroup("left", port, [1, 2]), FixtureGroup("right", port, [3, 4])])
+
+
+def test_slot_in_two_groups_is_rejected():
+    with pytest.raises(ValueError, match="more than one"):
+        Fixture([FixtureGroup("left", RecordingPort(), [1, 2]), FixtureGroup("right", RecordingPort(), [2, 3])])
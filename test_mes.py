@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+from mes import MesQueue, MesUploader, StandInMes, start_stand_in
+
+
+def wait_until(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def mes():
+    stand_in = StandInMes()
+    server = start_stand_in(stand_in)
+    stand_in.url = f"http://127.0.0.1:{server.server_address[1]}/results"
+    yield stand_in
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "mes_queue.sqlite")
+
+
+def make_uploader(mes, queue):
+    return MesUploader(mes.url, queue=queue, batch_size=2, interval=0.05, timeout=2,
+                       min_backoff=0.05, max_backoff=0.2)
+
+
+def records(count, first=1):
+    return [{"serial_number": f"SN{n:06d}", "success": True} for n in range(first, first + count)]
+
+
+def without_ids(received):
+    return [{key: value for key, value in record.items() if key != "record_id"} for record in received]
+
+
+def test_records_wait_in_the_queue_during_an_outage(mes, queue_path):
+    mes.down = True
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    try:
+        for record in records(3):
+            uploader.submit(record)
+        assert wait_until(lambda: mes.requests >= 2)
+        assert mes.records == []
+        assert uploader.backlog == 3
+        assert uploader.last_error is not None
+
+        mes.down = False
+        assert wait_until(lambda: uploader.backlog == 0)
+        assert without_ids(mes.records) == records(3)
+        assert uploader.last_error is None
+    finally:
+        uploader.stop(drain_timeout=0)
+        uploader.queue.close()
+
+
+def test_failed_batches_are_retried(mes, queue_path):
+    mes.fail_next = 2
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    try:
+        uploader.submit(records(1)[0])
+        assert wait_until(lambda: uploader.sent == 1)
+        assert without_ids(mes.records) == records(1)
+        assert mes.requests == 3
+    finally:
+        uploader.stop(drain_timeout=0)
+        uploader.queue.close()
+
+
+def test_stop_keeps_unsent_records_on_disk(mes, queue_path):
+    mes.down = True
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    for record in records(5):
+        uploader.submit(record)
+    assert wait_until(lambda: uploader.last_error is not None)
+
+    started = time.monotonic()
+    uploader.stop(drain_timeout=5.0)
+    # Stop does not wait out the drain timeout while the MES is down
+    assert time.monotonic() - started < 5.0
+    uploader.queue.close()
+
+    queue = MesQueue(queue_path)
+    try:
+        assert without_ids(record for _, record in queue.peek(10)) == records(5)
+    finally:
+        queue.close()
+
+
+def test_queue_survives_a_restart_and_drains_after_recovery(mes, queue_path):
+    mes.down = True
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    for record in records(3):
+        uploader.submit(record)
+    assert wait_until(lambda: mes.requests >= 1)
+    uploader.stop(drain_timeout=0)
+    uploader.queue.close()
+
+    # Station restarts after the MES is back, the old records go out first
+    mes.down = False
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    try:
+        uploader.submit(records(1, first=4)[0])
+        assert wait_until(lambda: uploader.backlog == 0)
+        assert without_ids(mes.records) == records(4)
+    finally:
+        uploader.stop(drain_timeout=0)
+        uploader.queue.close()
+
+
+def test_rejected_record_goes_to_dead_letters(mes, queue_path):
+    uploader = make_uploader(mes, MesQueue(queue_path))
+    uploader.start()
+    try:
+        uploader.submit(records(1)[0])
+        uploader.submit({"serial_number": "", "success": False})
+        uploader.submit(records(1, first=2)[0])
+        assert wait_until(lambda: uploader.backlog == 0)
+        assert without_ids(mes.records) == records(2)
+        assert uploader.rejected == 1
+        [(record, error)] = uploader.queue.dead_letters()
+        assert record["serial_number"] == ""
+        assert "422" in error
+        assert uploader.last_error is None
+    finally:
+        uploader.stop(drain_timeout=0)
+        uploader.queue.close()
+
+
+def test_resent_record_is_stored_once(mes, queue_path):
+    queue = MesQueue(queue_path)
+    queue.put(records(1)[0])
+    # The MES stored the first upload but its answer never arrived
+    [(_, record)] = queue.peek(1)
+    assert mes.receive([record]) == 200
+
+    uploader = make_uploader(mes, queue)
+    uploader.start()
+    try:
+        assert wait_until(lambda: uploader.backlog == 0)
+        assert without_ids(mes.records) == records(1)
+        assert mes.records[0]["record_id"] == record["record_id"]
+    finally:
+        uploader.stop(drain_timeout=0)
+        uploader.queue.close()
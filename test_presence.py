@@ -0,0 +1,106 @@
+import subprocess
+
+import pytest
+
+from cancellation import CancelToken, Cancelled
+from mux import RESET_CHANNEL
+from presence import probe_slots
+
+
+class ScriptedMux:
+    """Mux port that records every frame and keeps track of the routed SWD channel"""
+
+    def __init__(self, log):
+        self.log = log
+        self.routed = None
+
+    def write(self, data):
+        data = bytes(data)
+        self.log.append(("frame", data[2]))
+        self.routed = None if data[2] == RESET_CHANNEL else data[2]
+        return len(data)
+
+
+class RecordingToken(CancelToken):
+    """CancelToken whose settle waits are logged instead of slept"""
+
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+
+    def sleep(self, seconds):
+        self.log.append(("settle", seconds))
+        super().sleep(0)
+
+
+def scripted_probe(mux, log, script):
+    """probe(cancel_token) answering from script {slot: stdout or exception} for the routed slot"""
+    def probe(cancel_token):
+        log.append(("probe", mux.routed))
+        answer = script.get(mux.routed, "Unable to connect to ST-LINK target!\n")
+        if isinstance(answer, Exception):
+            raise answer
+        return subprocess.CompletedProcess("ST-LINK_CLI", 0, answer, "")
+    return probe
+
+
+@pytest.fixture
+def log():
+    return []
+
+
+@pytest.fixture
+def mux(log):
+    return ScriptedMux(log)
+
+
+def test_present_and_absent_slots(mux, log):
+    probe = scripted_probe(mux, log, {1: "Connected via SWD.\nDevice ID:0x413\n"})
+
+    present = probe_slots(mux, [1, 2], probe, RecordingToken(log), settle=1.0)
+
+    assert present == {1: True, 2: False}
+
+
+def test_probe_error_counts_as_absent(mux, log):
+    probe = scripted_probe(mux, log, {1: OSError("ST-LINK not found"), 2: "Device ID:0x413\n"})
+
+    assert probe_slots(mux, [1, 2], probe, RecordingToken(log), settle=0) == {1: False, 2: True}
+    assert mux.routed is None
+
+
+def test_slots_not_asked_for_are_skipped(mux, log):
+    probe = scripted_probe(mux, log, {slot: "Device ID:0x413\n" for slot in range(1, 9)})
+
+    present = probe_slots(mux, [3, 6], probe, RecordingToken(log), settle=0)
+
+    assert present == {3: True, 6: True}
+    assert [entry[1] for entry in log if entry[0] == "probe"] == [3, 6]
+
+
+def test_settles_after_reset_and_select(mux, log):
+    probe = scripted_probe(mux, log, {})
+
+    probe_slots(mux, [4], probe, RecordingToken(log), settle=1.0)
+
+    assert log == [
+        ("frame", RESET_CHANNEL),
+        ("settle", 1.0),
+        ("frame", 4),
+        ("settle", 1.0),
+        ("probe", 4),
+        ("frame", RESET_CHANNEL),
+    ]
+
+
+def test_cancel_stops_the_probe_and_resets_the_mux(mux, log):
+    token = RecordingToken(log)
+
+    def probe(cancel_token):
+        token.cancel()
+        cancel_token.check()
+
+    with pytest.raises(Cancelled):
+        probe_slots(mux, [1, 2], probe, token, settle=0)
+    assert log[-1] == ("frame", RESET_CHANNEL)
+    assert ("frame", 2) not in log
@@ -0,0 +1,102 @@
+import time
+from collections import deque
+
+from stage_timings import STAGE_ORDER
+
+
+class ThroughputTracker:
+    """
+    Live batch statistics, updated incrementally from the stage timing
+    and finished events so every update is O(1) regardless of batch size.
+    """
+
+    def __init__(self, window=20):
+        self.cycle_times = deque(maxlen=window)  # rolling window of DUT cycle times
+        self.cycle_sum = 0.0
+        self.stage_totals = {}  # stage -> [sum, count] for this batch
+        self.active = {}  # slot -> (current stage, started at, job started at)
+        self.finished = 0
+        self.failed = 0
+
+    def reset(self):
+        self.cycle_times.clear()
+        self.cycle_sum = 0.0
+        self.stage_totals = {}
+        self.active = {}
+        self.finished = 0
+        self.failed = 0
+
+    def job_started(self, slot):
+        now = time.monotonic()
+        self.active[slot] = (STAGE_ORDER[0], now, now)
+
+    def stage_done(self, slot, stage, seconds):
+        totals = self.stage_totals.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+        if slot in self.active and stage in STAGE_ORDER:
+            index = STAGE_ORDER.index(stage)
+            next_stage = STAGE_ORDER[index + 1] if index + 1 < len(STAGE_ORDER) else "finishing"
+            self.active[slot] = (next_stage, time.monotonic(), self.active[slot][2])
+
+    def job_finished(self, slot, success):
+        entry = self.active.pop(slot, None)
+        self.finished += 1
+        if not success:
+            self.failed += 1
+        if entry is None:
+            return
+        if len(self.cycle_times) == self.cycle_times.maxlen:
+            self.cycle_sum -= self.cycle_times[0]
+        cycle = time.monotonic() - entry[2]
+        self.cycle_times.append(cycle)
+        self.cycle_sum += cycle
+
+    @property
+    def avg_cycle(self):
+        """Rolling average cycle time in seconds, None before the first DUT"""
+        if not self.cycle_times:
+            return None
+        return self.cycle_sum / len(self.cycle_times)
+
+    @property
+    def duts_per_hour(self):
+        avg = self.avg_cycle
+        return 3600.0 / avg if avg else None
+
+    def eta(self, remaining):
+        """Seconds until the queue is done: remaining DUTs plus what is left of the running ones"""
+        avg = self.avg_cycle
+        if avg is None:
+            return None
+        now = time.monotonic()
+        running = sum(max(0.0, avg - (now - job_start)) for _, _, job_start in self.active.values())
+        return remaining * avg + running
+
+    def current_stages(self):
+        """[(slot, stage, seconds in stage)] of the running DUTs"""
+        now = time.monotonic()
+        return [(slot, stage, now - since) for slot, (stage, since, _) in sorted(self.active.items())]
+
+    def slowest_stage(self):
+        """(stage, average seconds) with the highest average this batch, or None"""
+        candidates = dict(self.stage_totals)
+        if "upload" in candidates:
+            # upload_total is the sum of the upload monitor stages, only count it on its own
+            candidates.pop("upload_total", None)
+        if not candidates:
+            return None
+        stage, (total, count) = max(candidates.items(), key=lambda item: item[1][0] / item[1][1])
+        return stage, total / count
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
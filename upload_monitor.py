@@ -0,0 +1,174 @@
+import json
+import socket
+import time
+
+from selenium.webdriver.common.by import By
+
+
+def enable_network_events(options):
+    """Ask chromedriver to record CDP Network.* events in the performance log, and the console log"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL", "browser": "ALL"})
+
+
+def port_open(ip, port, timeout=0.5):
+    """Single quick TCP probe, True if the device accepts the connection"""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def read_network_events(driver):
+    """CDP Network.* events logged since the last call, [] without a performance log"""
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return []
+
+    events = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        if message.get("method", "").startswith("Network."):
+            events.append(message)
+    return events
+
+
+class UploadMonitor:
+    """
+    Follow a firmware upload through CDP network events instead of a blind wait.
+
+    Stages:
+        upload     - upload request is being sent to the device
+        flash      - device answered, it is writing flash (web server still up)
+        reboot     - web server went away, waiting for it to come back
+        login_page - web server is back, waiting for the login page
+    """
+
+    def __init__(self, driver, ip="192.168.0.100", port=80, progress_callback=None,
+                 login_selector='input[aria-label="Username"]', cancel_token=None, recorder=None):
+        self.driver = driver
+        self.recorder = recorder
+        self.cancel_token = cancel_token
+        self.ip = ip
+        self.port = port
+        self.progress_callback = progress_callback
+        self.login_selector = login_selector
+        self.stage = None
+        self.timings = {}
+        self._upload_request_id = None
+
+    def _report(self, message):
+        if self.progress_callback:
+            self.progress_callback(message)
+        else:
+            print(message)
+
+    def _network_events(self):
+        # Without a performance log this is empty and only TCP probing is left
+        if self.recorder is not None:
+            # The recorder drains the same log, it hands on what it read
+            return self.recorder.poll()
+        return read_network_events(self.driver)
+
+    def arm(self):
+        """Call right before clicking Upload - drops events from the page load"""
+        self._network_events()
+        self.stage = "upload"
+        self._stage_start = time.monotonic()
+        self._start = self._stage_start
+
+    def _next_stage(self, stage):
+        now = time.monotonic()
+        self.timings[self.stage] = now - self._stage_start
+        self._report(f"Stage '{self.stage}' took {self.timings[self.stage]:.1f} s -> {stage}")
+        self.stage = stage
+        self._stage_start = now
+
+    def _handle_event(self, event):
+        method = event["method"]
+        params = event.get("params", {})
+
+        if method == "Network.requestWillBeSent":
+            request = params.get("request", {})
+            if self._upload_request_id is None and request.get("method") in ("POST", "PUT"):
+                self._upload_request_id = params.get("requestId")
+                self._report(f"Upload request started: {request.get('url')}")
+            return
+
+        if params.get("requestId") != self._upload_request_id:
+            return
+
+        if method in ("Network.responseReceived", "Network.loadingFinished"):
+            if self.stage == "upload":
+                status = params.get("response", {}).get("status")
+                self._report(f"Upload request finished (HTTP {status})")
+                self._next_stage("flash")
+        elif method == "Network.loadingFailed":
+            if self.stage == "upload":
+                # Device dropped the connection while answering - it is already rebooting
+                self._report(f"Upload request ended: {params.get('errorText')}")
+                self._next_stage("flash")
+
+    def _login_page_shown(self):
+        try:
+            return bool(self.driver.find_elements(By.CSS_SELECTOR, self.login_selector))
+        except Exception:
+            return False
+
+    def wait(self, timeout=60, poll_interval=0.2, login_grace=2.0):
+        """
+        Block until the device has rebooted and the login page is shown again.
+        Returns the stage timings in seconds, raises on timeout.
+        """
+        if self.stage is None:
+            self.arm()
+
+        reconnect_time = None
+        missed_probes = 0
+
+        while (time.monotonic() - self._start) < timeout:
+            for event in self._network_events():
+                self._handle_event(event)
+
+            if self.stage in ("upload", "flash"):
+                # Two missed probes in a row, a busy server can miss one
+                missed_probes = 0 if port_open(self.ip, self.port, timeout=poll_interval) else missed_probes + 1
+                if missed_probes >= 2:
+                    if self.stage == "upload":
+                        self._next_stage("flash")
+                    self._next_stage("reboot")
+                elif self.stage == "flash" and self._login_page_shown():
+                    # Reboot was faster than our probe interval
+                    self._next_stage("reboot")
+                    self._next_stage("login_page")
+
+            elif self.stage == "reboot":
+                if port_open(self.ip, self.port, timeout=poll_interval):
+                    self._next_stage("login_page")
+                    reconnect_time = time.monotonic()
+
+            if self.stage == "login_page":
+                if self._login_page_shown():
+                    self.timings["login_page"] = time.monotonic() - self._stage_start
+                    self.timings["total"] = time.monotonic() - self._start
+                    self._report(
+                        "Upload timings: " + ", ".join(f"{k}={v:.1f}s" for k, v in self.timings.items())
+                    )
+                    return self.timings
+
+                # SPA did not redirect by itself - ask for the login page directly
+                if reconnect_time is not None and (time.monotonic() - reconnect_time) > login_grace:
+                    host = self.ip if self.port == 80 else f"{self.ip}:{self.port}"
+                    self.driver.get(f"http://{host}/#/login")
+                    reconnect_time = None
+
+            if self.cancel_token:
+                self.cancel_token.sleep(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+        raise Exception(f"Upload/reboot timed out in stage '{self.stage}' after {timeout} s")